@@ -35,6 +35,8 @@ plot_loss: true
 
 ### train
 per_device_train_batch_size: 4
+# batches of similar token lengths, less padding (see src/data_preprocessing/token_lengths.py)
+group_by_length: true
 gradient_accumulation_steps: 2
 learning_rate: 2.0e-4
 num_train_epochs: 10
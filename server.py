@@ -2,16 +2,199 @@
 Defines a paraphrasing API using LitServe to refine and rephrase text with a transformer model.
 """
 
+import os
+import json
+import time
 import litserve as ls
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from src.tasks import text_summarization
 from src.pydantic_models.text_summarization import TextSummarization
-from src.evaluation.evaluate_transformers import TransformersModel
+from src.utils.stream_utils import stream_json_field
+from src.utils.json_utils import get_output_summary, parse_output_summary
+from src.utils.cache_utils import SummaryCache, get_cache_key
+from src.utils.backend_utils import get_worker_threads
+from src.utils.timing_utils import PhaseTimer, RequestTimer, get_phase
+from src.utils.metrics_utils import (
+    RECEIVED_AT_KEY, MetricsRegistry, ReceivedAtMiddleware, get_observations
+)
+
+CACHE_STATS_PATH = os.path.join("models", "cache", "summary_cache_stats.json")
+METRICS_PATH = os.path.join("models", "cache", "request_metrics.json")
+BASE_MODEL_ID = "Qwen/Qwen2.5-0.5B-Instruct"
+LORA_PATH = "/teamspace/studios/this_studio/Text-Summarization/models/finetuned"
+
+
+def read_cache_stats() -> dict:
+    """Returns the summary cache counters written by `SummaryCacheLogger`."""
+    if not os.path.exists(CACHE_STATS_PATH):
+        return {}
+    with open(CACHE_STATS_PATH, mode="r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class SummaryCacheLogger(ls.Logger):
+    """
+    Aggregates the summary cache counters logged by every worker and serves
+    them at `/cache_stats`.
+    """
+
+    def __init__(self):
+        """Initializes the logger, clears the previous run and mounts the `/cache_stats` endpoint."""
+        super().__init__()
+        self.workers = {}
+        if os.path.exists(CACHE_STATS_PATH):
+            os.remove(CACHE_STATS_PATH)
+        stats_app = FastAPI()
+        stats_app.get("/")(read_cache_stats)
+        self.mount("/cache_stats", stats_app)
+
+    def process(self, key, value):
+        """
+        Stores the latest counters of a worker and writes the totals to `CACHE_STATS_PATH`.
+        Args:
+            key (str): The log key, only "summary_cache" entries are processed.
+            value (dict): The `SummaryCache.stats()` of a worker and its pid.
+        """
+        if key != "summary_cache":
+            return
+        self.workers[value["worker"]] = value
+
+        totals = {
+            name: sum(stats[name] for stats in self.workers.values())
+            for name in ("memory_hits", "disk_hits", "misses", "evictions", "memory_entries")
+        }
+        lookups = totals["memory_hits"] + totals["disk_hits"] + totals["misses"]
+        totals["hit_rate"] = (totals["memory_hits"] + totals["disk_hits"]) / lookups if lookups else 0.0
+        totals["workers"] = len(self.workers)
+
+        os.makedirs(os.path.dirname(CACHE_STATS_PATH), exist_ok=True)
+        with open(CACHE_STATS_PATH, mode="w", encoding="utf-8") as f:
+            json.dump(totals, f)
+
+
+def read_metrics() -> PlainTextResponse:
+    """Returns the request histograms written by `MetricsLogger` in the Prometheus format."""
+    registry = MetricsRegistry()
+    if os.path.exists(METRICS_PATH):
+        with open(METRICS_PATH, mode="r", encoding="utf-8") as f:
+            registry = MetricsRegistry.from_dict(json.load(f))
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+class MetricsLogger(ls.Logger):
+    """
+    Aggregates the request measurements logged by every worker into histograms
+    and serves them at `/metrics`.
+    """
+
+    def __init__(self):
+        """Initializes the logger, clears the previous run and mounts the `/metrics` endpoint."""
+        super().__init__()
+        self.registry = MetricsRegistry()
+        if os.path.exists(METRICS_PATH):
+            os.remove(METRICS_PATH)
+        metrics_app = FastAPI()
+        metrics_app.get("/")(read_metrics)
+        self.mount("/metrics", metrics_app)
+
+    def process(self, key, value):
+        """
+        Adds the observations of a request to the histograms and writes them to `METRICS_PATH`.
+        Args:
+            key (str): The log key, only "request_metrics" entries are processed.
+            value (list): The `[name, label, value]` observations of a request.
+        """
+        if key != "request_metrics":
+            return
+        self.registry.observe_all(value)
+
+        os.makedirs(os.path.dirname(METRICS_PATH), exist_ok=True)
+        # written to a temporary file first, the endpoint never reads a partial file
+        with open(f"{METRICS_PATH}.tmp", mode="w", encoding="utf-8") as f:
+            json.dump(self.registry.to_dict(), f)
+        os.replace(f"{METRICS_PATH}.tmp", METRICS_PATH)
+
 
 class SummarizationLitAPI(ls.LitAPI):
     """
     Provides paraphrasing functionality using a transformer-based model.
     """
 
+    def __init__(
+            self, max_batch_size: int = 1, batch_timeout: float = 0.0,
+            prefix_cache: bool = True, merged_model_path: str = "",
+            backend: str = "default", num_threads: int = 0, num_interop_threads: int = 0,
+            summary_cache_size: int = 1024, summary_cache_ttl: float = 86400.0,
+            summary_cache_path: str = "", assisted_decoding: str = "none",
+            draft_model_id: str = "", max_new_tokens: int = 2000,
+            budget_ratio: float = 0.5, max_time: float = 0.0,
+            shared_weights_path: str = "", warmup: bool = True, metrics: bool = False, **kwargs
+    ):
+        """
+        Initializes the API with the dynamic batching configuration.
+        Args:
+            max_batch_size (int, optional): The maximum number of requests LitServe
+                collects into one `predict` call. Defaults to 1 (no batching).
+            batch_timeout (float, optional): The maximum time in seconds to wait
+                for a batch to fill up before running it. Defaults to 0.0.
+            prefix_cache (bool, optional): If True, the KV cache of the static system
+                message and schema is computed once and reused. Defaults to True.
+            merged_model_path (str, optional): The path of a checkpoint exported with
+                `src.inference.merge_adapter`. If set, it is loaded directly and the
+                LoRA adapter is not applied at startup. Defaults to "".
+            backend (str, optional): The `TransformersModel` inference backend, e.g.
+                "cpu_int8" or "cpu_bf16" for CPU-only boxes. Defaults to "default".
+            num_threads (int, optional): The number of torch intra-op threads,
+                0 keeps the torch default. Defaults to 0.
+            num_interop_threads (int, optional): The number of torch inter-op threads,
+                0 keeps the torch default. Defaults to 0.
+            summary_cache_size (int, optional): The number of summaries kept in the in-memory
+                LRU cache, 0 disables the cache. Defaults to 1024.
+            summary_cache_ttl (float, optional): The number of seconds a cached summary
+                stays valid. Defaults to one day.
+            summary_cache_path (str, optional): The path of a SQLite database used as an
+                on-disk cache tier that survives restarts. Defaults to "" (memory only).
+            assisted_decoding (str, optional): "none", "prompt_lookup" or "draft_model",
+                see `TransformersModel.set_assisted_decoding`. Defaults to "none".
+            draft_model_id (str, optional): The draft model of the "draft_model" mode.
+            max_new_tokens (int, optional): The hard upper limit of generated tokens. Defaults to 2000.
+            budget_ratio (float, optional): The maximum summary length as a fraction of the
+                text length, 0 always allows `max_new_tokens`. Defaults to 0.5.
+            max_time (float, optional): The maximum number of seconds of a generation,
+                0 means no limit. Defaults to 0.0.
+            shared_weights_path (str, optional): The directory of a model exported with
+                `src.inference.shared_weights`. Its weights are memory-mapped, so all the
+                workers share one copy. It takes precedence over `merged_model_path`.
+                Defaults to "".
+            warmup (bool, optional): If True, every worker runs one short generation
+                before serving. Defaults to True.
+            metrics (bool, optional): If True, the stages, token counts and timings of every
+                request are logged for `MetricsLogger`. Defaults to False.
+            **kwargs: Extra keyword arguments forwarded to `ls.LitAPI`.
+        """
+
+        super().__init__(max_batch_size=max_batch_size, batch_timeout=batch_timeout, **kwargs)
+        self.prefix_cache = prefix_cache
+        self.merged_model_path = merged_model_path
+        self.backend = backend
+        self.num_threads = num_threads
+        self.num_interop_threads = num_interop_threads
+        self.summary_cache_size = summary_cache_size
+        self.summary_cache_ttl = summary_cache_ttl
+        self.summary_cache_path = summary_cache_path
+        self.assisted_decoding = assisted_decoding
+        self.draft_model_id = draft_model_id
+        self.max_new_tokens = max_new_tokens
+        self.budget_ratio = budget_ratio
+        self.max_time = max_time
+        self.shared_weights_path = shared_weights_path
+        self.warmup = warmup
+        self.metrics = metrics
+        # the queue waits of the requests decoded since the last `predict` call
+        self.queue_waits = []
+
     def setup(self, device):
         """
         Sets up the model with the specified device and loads the adapter.
@@ -20,13 +203,95 @@ class SummarizationLitAPI(ls.LitAPI):
         Attributes:
             model (TransformersModel): An instance of the TransformersModel initialized 
             with the specified base model ID and temperature. The adapter is loaded 
-            from the specified path.
+            from the specified path, unless a merged checkpoint is used.
+        """
+
+        timer = PhaseTimer()
+        with timer.phase("imports"):
+            # imported here, only the inference workers need torch and transformers
+            from src.evaluation.evaluate_transformers import TransformersModel
+
+        base_model_id = BASE_MODEL_ID
+        lora_path = LORA_PATH
+        model_kwargs = {
+            "temp": 0.2,
+            "num_threads": self.num_threads or None,
+            "num_interop_threads": self.num_interop_threads or None,
+            "startup_timer": timer,
+        }
+        if self.shared_weights_path:
+            self.model = TransformersModel(
+                self.shared_weights_path, backend=self.backend, shared_weights=True, **model_kwargs
+            )
+        elif self.merged_model_path:
+            # the LoRA weights are already folded in, no PEFT layers at inference
+            self.model = TransformersModel(
+                self.merged_model_path, backend=self.backend, **model_kwargs
+            )
+        elif self.backend == "cpu_int8":
+            # adapters cannot be applied to quantized layers, merge first
+            self.model = TransformersModel(base_model_id, backend="cpu_fp32", **model_kwargs)
+            self.model.merge_adapter(lora_path)
+            self.model.quantize()
+        else:
+            self.model = TransformersModel(base_model_id, backend=self.backend, **model_kwargs)
+            self.model.load_adapter(lora_path)
+        self.model.set_generation_limits(
+            max_new_tokens=self.max_new_tokens,
+            budget_ratio=self.budget_ratio,
+            max_time=self.max_time or None,
+        )
+        if self.assisted_decoding != "none":
+            self.model.set_assisted_decoding(self.assisted_decoding, draft_model_id=self.draft_model_id)
+        if self.prefix_cache:
+            with timer.phase("prefix"):
+                self.model.set_prefix_cache(text_summarization.get_prefix_ids(self.model.tokenizer))
+        if self.warmup:
+            self.model.warmup()
+
+        self.summary_cache = None
+        if self.summary_cache_size > 0:
+            self.summary_cache = SummaryCache(
+                max_entries=self.summary_cache_size,
+                ttl=self.summary_cache_ttl,
+                db_path=self.summary_cache_path or None,
+            )
+            # everything besides the text that changes the generated summary
+            self.cache_config = {
+                **self.model.get_generation_config(),
+                "prompt": text_summarization.get_message(""),
+            }
+        print(timer.report(f"Worker {os.getpid()} startup"))
+
+    def get_cached(self, texts: list) -> tuple:
+        """
+        Looks up the summaries of the given texts in the summary cache.
+        Args:
+            texts (list): The input texts.
+        Returns:
+            tuple: The cache keys and the cached outputs (None for every miss).
+        """
+
+        if self.summary_cache is None:
+            return [None] * len(texts), [None] * len(texts)
+
+        keys = [get_cache_key(t, self.cache_config) for t in texts]
+        outputs = [self.summary_cache.get(key) for key in keys]
+        self.log("summary_cache", {"worker": os.getpid(), **self.summary_cache.stats()})
+        return keys, outputs
+
+    def put_cached(self, key: str, output: str):
+        """
+        Caches the output of a text if it is a complete, valid JSON summary.
+        An output cut by `max_new_tokens` or `max_time` would otherwise be served
+        again for the same text until it expires.
+        Args:
+            key (str): The cache key returned by `get_cached`.
+            output (str): The raw response of the model.
         """
 
-        base_model_id = "Qwen/Qwen2.5-0.5B-Instruct"
-        lora_path = "/teamspace/studios/this_studio/Text-Summarization/models/finetuned"
-        self.model = TransformersModel(base_model_id, temp=0.2)
-        self.model.load_adapter(lora_path)
+        if self.summary_cache is not None and parse_output_summary(output) is not None:
+            self.summary_cache.put(key, output)
 
     def decode_request(self, request):
         """
@@ -38,19 +303,72 @@ class SummarizationLitAPI(ls.LitAPI):
              Returns an empty string if the key is not present.
         """
 
+        self.record_queue_wait(request)
         return request.get("prompt", "")
 
+    def record_queue_wait(self, request: dict):
+        """Records how long a request stamped by `ReceivedAtMiddleware` waited for its batch."""
+
+        received_at = request.get(RECEIVED_AT_KEY)
+        if self.metrics and received_at is not None:
+            self.queue_waits.append(time.time() - received_at)
+
+    def start_request_timer(self, batch_size: int):
+        """
+        Starts timing a `predict` call when the metrics are enabled.
+        Args:
+            batch_size (int): The number of requests of the call.
+        Returns:
+            RequestTimer: The timer, also set on the model, or None without metrics.
+        """
+
+        timer = RequestTimer() if self.metrics else None
+        self.model.request_timer = timer
+        if timer is not None:
+            timer.record("batch_size", batch_size)
+        return timer
+
+    def log_request_timer(self, timer: RequestTimer):
+        """Logs the measurements of a `predict` call and of the queue waits of its requests."""
+
+        if timer is None:
+            return
+        queue_waits, self.queue_waits = self.queue_waits, []
+        self.log("request_metrics", get_observations(timer, queue_waits))
+
     def predict(self, text):
         """
         Predicts the output based on the given text input.
+        When batching is enabled, LitServe passes the prompts collected within
+        the batching window as a list, and they are summarized with one
+        batched `generate` call.
         Args:
-            text (str): The input text to be processed.
+            text (str | list): The input text to be processed, or a list of texts.
         Returns:
-            Any: The prediction result generated by the model.
+            Any: The prediction result generated by the model, or a list of
+            results in the same order as the input texts.
         """
 
-        message = text_summarization.get_message(text)
-        return self.model.create(message)
+        texts = text if isinstance(text, list) else [text]
+        timer = self.start_request_timer(len(texts))
+        # cache hits skip the chat template, tokenization and generation entirely
+        with get_phase(timer, "get_cached"):
+            keys, outputs = self.get_cached(texts)
+        missing = [i for i, output in enumerate(outputs) if output is None]
+
+        if missing:
+            # the static prompt prefix is tokenized once and reused for every request,
+            # so the message, chat template and tokenization are a single stage
+            with get_phase(timer, "get_input_ids"):
+                input_ids = [
+                    text_summarization.get_input_ids(self.model.tokenizer, texts[i]) for i in missing
+                ]
+            for i, output in zip(missing, self.model.create_from_ids(input_ids)):
+                outputs[i] = output
+                self.put_cached(keys[i], output)
+
+        self.log_request_timer(timer)
+        return outputs if isinstance(text, list) else outputs[0]
 
     def encode_response(self, output):
         """
@@ -60,10 +378,234 @@ class SummarizationLitAPI(ls.LitAPI):
         Returns:
             dict: A dictionary containing the encoded output with the key 'output'.
         """
+        start = time.perf_counter()
         result = TextSummarization(summarized_text=output)
+        if self.metrics:
+            self.log("request_metrics", [["stage_seconds", "encode_response", time.perf_counter() - start]])
 
         return {"output": result.model_dump()}
 
+
+class SummarizationBatchLitAPI(SummarizationLitAPI):
+    """
+    Summarizes a list of documents per request at `/summarize_batch`.
+    The documents are generated in length-sorted batches by one `predict` call,
+    without the HTTP, JSON and validation round trip of one `/predict` call each.
+    """
+
+    def __init__(self, summarize_batch_size: int = 8, max_documents: int = 1024, **kwargs):
+        """
+        Initializes the API at the "/summarize_batch" path, one request per `predict` call.
+        Args:
+            summarize_batch_size (int, optional): The number of documents per `generate`
+                call. Defaults to 8.
+            max_documents (int, optional): The maximum number of documents of a request.
+                Defaults to 1024.
+            **kwargs: Extra keyword arguments forwarded to `SummarizationLitAPI`.
+        """
+
+        super().__init__(api_path="/summarize_batch", **kwargs)
+        self.summarize_batch_size = summarize_batch_size
+        self.max_documents = max_documents
+
+    def setup(self, device):
+        """Sets up the model, then the length-sorted batch summarizer around it."""
+
+        super().setup(device)
+        # imported here, like the model, only the inference workers need torch
+        from src.inference.batch_summarizer import BatchSummarizer
+
+        self.summarizer = BatchSummarizer(self.model, batch_size=self.summarize_batch_size)
+
+    def decode_request(self, request):
+        """
+        Extracts the documents of the request.
+        Args:
+            request (dict): `{"documents": [...]}`, every document being a text or
+                an `{"id": ..., "text": ...}` dictionary.
+        Returns:
+            list: The `{id, text}` documents, a text gets its position as id.
+        Raises:
+            HTTPException: 400 if the documents are missing, malformed or too many.
+        """
+
+        self.record_queue_wait(request)
+        documents = request.get("documents")
+        if not isinstance(documents, list) or not documents:
+            raise HTTPException(status_code=400, detail='"documents" must be a non-empty list.')
+        if len(documents) > self.max_documents:
+            raise HTTPException(
+                status_code=400, detail=f"At most {self.max_documents} documents per request."
+            )
+
+        decoded = []
+        for i, document in enumerate(documents):
+            if isinstance(document, str):
+                document = {"id": i, "text": document}
+            if not isinstance(document, dict) or not isinstance(document.get("text"), str):
+                raise HTTPException(status_code=400, detail=f"Document {i} has no text.")
+            decoded.append({"id": document.get("id", i), "text": document["text"]})
+        return decoded
+
+    def predict(self, documents):
+        """
+        Summarizes the documents, the cached ones are not generated again.
+        Args:
+            documents (list): The `{id, text}` documents.
+        Returns:
+            list: The raw response of every document, in the same order.
+        """
+
+        texts = [document["text"] for document in documents]
+        timer = self.start_request_timer(len(texts))
+        with get_phase(timer, "get_cached"):
+            keys, outputs = self.get_cached(texts)
+        missing = [i for i, output in enumerate(outputs) if output is None]
+
+        for i, output in zip(missing, self.summarizer.summarize([texts[i] for i in missing])):
+            outputs[i] = output
+            self.put_cached(keys[i], output)
+
+        self.log_request_timer(timer)
+        return [{"id": document["id"], "response": output} for document, output in zip(documents, outputs)]
+
+    def encode_response(self, output):
+        """
+        Encodes the summaries without validating every one of them.
+        Args:
+            output (list): The `{id, response}` of every document.
+        Returns:
+            dict: `{"outputs": [{"id": ..., "summarized_text": ...}, ...]}`.
+        """
+        return {
+            "outputs": [
+                {"id": result["id"], "summarized_text": get_output_summary(result["response"])}
+                for result in output
+            ]
+        }
+
+
+class SummarizationStreamLitAPI(SummarizationLitAPI):
+    """
+    Streams the summary tokens to the client as soon as they are generated.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Initializes the API in LitServe streaming mode, one request per `predict` call.
+        Args:
+            **kwargs: Extra keyword arguments forwarded to `SummarizationLitAPI`.
+        """
+
+        super().__init__(stream=True, **kwargs)
+
+    def predict(self, text):
+        """
+        Streams the summary of the given text.
+        The model answers with a fenced JSON block, so the `summarized_text` value
+        is extracted incrementally from the generated chunks.
+        Args:
+            text (str): The input text to be processed.
+        Yields:
+            str: The next characters of the summary.
+        """
+
+        timer = self.start_request_timer(1)
+        with get_phase(timer, "get_cached"):
+            keys, outputs = self.get_cached([text])
+        if outputs[0] is not None:
+            self.log_request_timer(timer)
+            yield from stream_json_field([outputs[0]], "summarized_text")
+            return
+
+        with get_phase(timer, "get_input_ids"):
+            input_ids = text_summarization.get_input_ids(self.model.tokenizer, text)
+        raw_chunks = []
+
+        def record(chunks):
+            """Keeps a copy of the raw chunks so the full output can be cached."""
+            for chunk in chunks:
+                raw_chunks.append(chunk)
+                yield chunk
+
+        yield from stream_json_field(record(self.model.create_stream(input_ids)), "summarized_text")
+        self.put_cached(keys[0], "".join(raw_chunks))
+        self.log_request_timer(timer)
+
+    def encode_response(self, output):
+        """
+        Encodes every streamed chunk into a dictionary format.
+        The chunks are not validated individually; concatenating the
+        `summarized_text` values of all chunks gives the full summary.
+        Args:
+            output (Iterator[str]): The stream of summary chunks.
+        Yields:
+            dict: A dictionary containing the chunk with the key 'output'.
+        """
+
+        for chunk in output:
+            yield {"output": {"summarized_text": chunk}}
+
+
 if __name__ == "__main__":
-    server = ls.LitServer(SummarizationLitAPI())
-    server.run()
\ No newline at end of file
+    # before reading the configuration, the workers inherit the environment
+    load_dotenv(dotenv_path=".env", override=True, verbose=True)
+    workers = int(os.getenv("WORKERS", "1"))
+    batch_endpoint = os.getenv("BATCH_ENDPOINT", "0") == "1"
+    # LitServe starts `workers` processes for every mounted API
+    num_processes = workers * (2 if batch_endpoint else 1)
+    shared_weights_path = os.getenv("SHARED_WEIGHTS_PATH", "")
+    if shared_weights_path:
+        # imported here, torch is only needed by the parent process for the export
+        from src.inference.shared_weights import export_shared_weights, has_shared_weights
+    if shared_weights_path and not has_shared_weights(shared_weights_path):
+        # exported once here, before the workers start and map it
+        merged_model_path = os.getenv("MERGED_MODEL_PATH", "")
+        export_shared_weights(
+            merged_model_path or BASE_MODEL_ID, shared_weights_path,
+            adapter_id="" if merged_model_path else LORA_PATH,
+        )
+    api_kwargs = {
+        "prefix_cache": os.getenv("PREFIX_CACHE", "1") == "1",
+        "merged_model_path": os.getenv("MERGED_MODEL_PATH", ""),
+        "shared_weights_path": shared_weights_path,
+        "backend": os.getenv("BACKEND", "default"),
+        # the cores are split between the worker processes of all APIs unless the thread counts are set
+        "num_threads": int(os.getenv("NUM_THREADS", "0")) or (
+            get_worker_threads(num_processes) if num_processes > 1 else 0
+        ),
+        "num_interop_threads": int(os.getenv("NUM_INTEROP_THREADS", "0")) or (1 if num_processes > 1 else 0),
+        "summary_cache_size": int(os.getenv("SUMMARY_CACHE_SIZE", "1024")),
+        "summary_cache_ttl": float(os.getenv("SUMMARY_CACHE_TTL", "86400")),
+        "summary_cache_path": os.getenv("SUMMARY_CACHE_PATH", ""),
+        "assisted_decoding": os.getenv("ASSISTED_DECODING", "none"),
+        "draft_model_id": os.getenv("DRAFT_MODEL_ID", ""),
+        "max_new_tokens": int(os.getenv("MAX_NEW_TOKENS", "2000")),
+        "budget_ratio": float(os.getenv("BUDGET_RATIO", "0.5")),
+        "max_time": float(os.getenv("MAX_TIME", "60")),
+        "warmup": os.getenv("WARMUP", "1") == "1",
+        "metrics": os.getenv("METRICS", "1") == "1",
+    }
+    if os.getenv("STREAM", "0") == "1":
+        api = SummarizationStreamLitAPI(**api_kwargs)
+    else:
+        api = SummarizationLitAPI(
+            max_batch_size=int(os.getenv("MAX_BATCH_SIZE", "1")),
+            batch_timeout=float(os.getenv("BATCH_TIMEOUT", "0.05")),
+            **api_kwargs,
+        )
+    apis = [api]
+    if batch_endpoint:
+        # its workers load their own model, see SHARED_WEIGHTS_PATH to share the weights
+        apis.append(SummarizationBatchLitAPI(
+            summarize_batch_size=int(os.getenv("SUMMARIZE_BATCH_SIZE", "8")),
+            max_documents=int(os.getenv("MAX_DOCUMENTS", "1024")),
+            **api_kwargs,
+        ))
+    loggers, middlewares = [SummaryCacheLogger()], []
+    if api_kwargs["metrics"]:
+        loggers.append(MetricsLogger())
+        paths = ("/predict", "/summarize_batch") if batch_endpoint else ("/predict",)
+        middlewares.append((ReceivedAtMiddleware, {"paths": paths}))
+    server = ls.LitServer(apis, workers_per_device=workers, loggers=loggers, middlewares=middlewares)
+    server.run(port=int(os.getenv("PORT", "8000")))
@@ -0,0 +1,126 @@
+"""Benchmark assisted decoding: acceptance rate and speedup over plain decoding."""
+
+import os
+import time
+import torch
+from transformers.generation import candidate_generator
+from dotenv import load_dotenv
+from src.tasks import text_summarization
+from src.utils.json_utils import read_finetune_records
+from src.evaluation.evaluate_transformers import TransformersModel
+
+
+class DecodingCounter:
+    """Counts the target model forward passes and the draft tokens proposed to it."""
+
+    def __init__(self, model: TransformersModel) -> None:
+        """Registers a forward hook on the model and wraps the candidate generators."""
+        self.forward_passes = 0
+        self.proposed = 0
+        model.model.register_forward_hook(self.count_forward)
+        for generator in (
+            candidate_generator.PromptLookupCandidateGenerator,
+            candidate_generator.AssistedCandidateGenerator,
+        ):
+            generator.get_candidates = self.wrap(generator.get_candidates)
+
+    def count_forward(self, *_):
+        """Forward hook counting the target model passes."""
+        self.forward_passes += 1
+
+    def wrap(self, get_candidates):
+        """Wraps `get_candidates` to count the proposed draft tokens."""
+        def counted(generator, input_ids, **kwargs):
+            candidate_ids, candidate_logits = get_candidates(generator, input_ids, **kwargs)
+            self.proposed += candidate_ids.shape[-1] - input_ids.shape[-1]
+            return candidate_ids, candidate_logits
+        return counted
+
+    def reset(self):
+        """Resets the counters."""
+        self.forward_passes = 0
+        self.proposed = 0
+
+
+def run(model: TransformersModel, counter: DecodingCounter, texts: list) -> dict:
+    """
+    Summarizes every text and collects the decoding statistics.
+    Args:
+        model (TransformersModel): The model, with or without assisted decoding.
+        counter (DecodingCounter): The counter attached to the model.
+        texts (list): The texts to be summarized.
+    Returns:
+        dict: The outputs, generated tokens, forward passes, proposed tokens and time.
+    """
+    counter.reset()
+    outputs, generated, elapsed = [], 0, 0.0
+    for text in texts:
+        input_tokens = model.get_input_tokens_from_ids(
+            [text_summarization.get_input_ids(model.tokenizer, text)]
+        )
+        start = time.perf_counter()
+        with torch.no_grad():
+            output_ids = model.model.generate(**model.get_generate_kwargs(input_tokens))
+        elapsed += time.perf_counter() - start
+        new_tokens = output_ids[0, input_tokens.input_ids.size(-1):].tolist()
+        generated += len(new_tokens)
+        outputs.append(new_tokens)
+    return {
+        "outputs": outputs,
+        "generated": generated,
+        "forward_passes": counter.forward_passes,
+        "proposed": counter.proposed,
+        "elapsed": elapsed,
+    }
+
+
+def main():
+    """Compares plain and assisted decoding on the validation set."""
+    print("\n[INFO] Starting assisted decoding benchmark...")
+    load_dotenv(dotenv_path=".env", override=True, verbose=True)
+    model_id = os.getenv("QWEN_ID", "Qwen/Qwen2.5-0.5B-Instruct")
+    mode = os.getenv("ASSISTED_DECODING", "prompt_lookup")
+    draft_model_id = os.getenv("DRAFT_MODEL_ID", "")
+    num_assistant_tokens = int(os.getenv("NUM_ASSISTANT_TOKENS", "10"))
+    num_requests = int(os.getenv("BENCH_NUM_REQUESTS", "10"))
+    prefix_cache = os.getenv("PREFIX_CACHE", "1") == "1"
+
+    model = TransformersModel(model_id=model_id, temp=0.2)
+    model.max_new_tokens = int(os.getenv("BENCH_MAX_NEW_TOKENS", "256"))
+    # on by default like in server.py, the assisted outputs must not depend on it
+    if prefix_cache:
+        model.set_prefix_cache(text_summarization.get_prefix_ids(model.tokenizer))
+    counter = DecodingCounter(model)
+
+    texts = [
+        rec["text"] for rec in read_finetune_records(
+            "Data/datasets/llamafactory-finetune-data/val.json", limit=num_requests
+        )
+    ]
+
+    baseline = run(model, counter, texts)
+    model.set_assisted_decoding(mode, num_assistant_tokens, draft_model_id)
+    assisted = run(model, counter, texts)
+
+    # every verification pass accepts some draft tokens and adds one token of its own
+    accepted = assisted["generated"] - assisted["forward_passes"]
+    identical = sum(a == b for a, b in zip(baseline["outputs"], assisted["outputs"]))
+
+    print("\n[RESULT]:")
+    print(f"mode: {mode} ({num_assistant_tokens} tokens per step), prefix cache: {prefix_cache}")
+    print(f"plain:    {baseline['generated'] / baseline['elapsed']:8.2f} tokens/sec")
+    print(f"assisted: {assisted['generated'] / assisted['elapsed']:8.2f} tokens/sec")
+    print(f"speedup: {baseline['elapsed'] / assisted['elapsed']:.2f}x")
+    print(f"tokens per target forward pass: {assisted['generated'] / assisted['forward_passes']:.2f}")
+    if assisted["proposed"]:
+        print(f"acceptance rate: {accepted / assisted['proposed']:.2%} "
+              f"({accepted}/{assisted['proposed']} proposed tokens)")
+    print(f"identical outputs: {identical}/{len(texts)}")
+    if identical != len(texts):
+        raise RuntimeError("Assisted decoding changed the greedy outputs")
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.benchmarks.benchmark_assisted_decoding
@@ -0,0 +1,64 @@
+"""Benchmark requests/sec of TransformersModel at different batch sizes."""
+
+import os
+import time
+from dotenv import load_dotenv
+from src.tasks import text_summarization
+from src.utils.json_utils import read_finetune_records
+from src.evaluation.evaluate_transformers import TransformersModel
+
+
+def benchmark_batch_size(model: TransformersModel, texts: list, batch_size: int) -> float:
+    """
+    Summarizes all texts in batches of `batch_size` and measures the throughput.
+    Args:
+        model (TransformersModel): The model used to generate the summaries.
+        texts (list): The texts to be summarized.
+        batch_size (int): The number of texts per `create_batch` call.
+    Returns:
+        float: The number of summarized texts per second.
+    """
+    messages = [text_summarization.get_message(text) for text in texts]
+
+    start = time.perf_counter()
+    for i in range(0, len(messages), batch_size):
+        model.create_batch(messages[i:i + batch_size])
+    elapsed = time.perf_counter() - start
+
+    return len(messages) / elapsed
+
+
+def main():
+    """Runs the batching benchmark on the validation set."""
+    print("\n[INFO] Starting batching benchmark...")
+    load_dotenv(dotenv_path=".env", override=True, verbose=True)
+    model_id = os.getenv("QWEN_ID", "Qwen/Qwen2.5-0.5B-Instruct")
+    lora_path = os.getenv("LORA_PATH")
+    num_requests = int(os.getenv("BENCH_NUM_REQUESTS", "32"))
+
+    model = TransformersModel(model_id=model_id, temp=0.2)
+    if lora_path:
+        model.load_adapter(lora_path)
+
+    records = read_finetune_records(
+        "Data/datasets/llamafactory-finetune-data/val.json", limit=num_requests
+    )
+    texts = [rec["text"] for rec in records]
+
+    # warmup so that the first measured batch size does not pay for lazy initialization
+    model.create_batch([text_summarization.get_message(texts[0])])
+
+    results = {}
+    for batch_size in (1, 4, 8, 16):
+        results[batch_size] = benchmark_batch_size(model, texts, batch_size)
+        print(f"[INFO] batch_size={batch_size:<3} {results[batch_size]:.3f} requests/sec")
+
+    print("\n[RESULT]:")
+    for batch_size, rps in results.items():
+        print(f"batch_size={batch_size:<3} requests/sec={rps:.3f} speedup={rps / results[1]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.benchmarks.benchmark_batching
@@ -0,0 +1,68 @@
+"""Benchmark the size, load time and memory of regular and compact prepared records."""
+
+import os
+import time
+import tempfile
+import tracemalloc
+from src.data_preprocessing.data_preparing import DataPreparing
+from src.utils.file_utils import iter_json_lines, write_json_lines
+from src.utils.json_utils import read_finetune_records
+
+
+def benchmark_file(path: str, expand: bool = True) -> dict:
+    """
+    Loads all records of a JSON lines file into a list.
+    Args:
+        path (str): The prepared records.
+        expand (bool, optional): If False, compact records are kept compact.
+    Returns:
+        dict: The file size in MiB, the load time in seconds and the peak memory in MiB.
+    """
+    start = time.perf_counter()
+    list(iter_json_lines(path, expand=expand))
+    load_time = time.perf_counter() - start
+
+    tracemalloc.start()
+    records = list(iter_json_lines(path, expand=expand))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+
+    return {"size_mb": os.path.getsize(path) / 2 ** 20, "load_s": load_time, "memory_mb": peak / 2 ** 20}
+
+
+def main():
+    """Compares the two prepared formats on the records of the validation set."""
+    print("\n[INFO] Starting compact records benchmark...")
+    num_records = int(os.getenv("BENCH_NUM_RECORDS", "0"))
+    records = read_finetune_records(
+        "Data/datasets/llamafactory-finetune-data/val.json", limit=num_records
+    )
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for compact in (False, True):
+            preparing = DataPreparing(data_path="", save_name="", compact=compact)
+            path = os.path.join(tmp_dir, f"prepared_{compact}.jsonl")
+            write_json_lines(
+                path, preparing.prepare_records(records),
+                shared=preparing.get_shared_fields() if compact else None,
+            )
+            name = "compact" if compact else "regular"
+            results[name] = benchmark_file(path)
+            if compact:
+                results["compact_raw"] = benchmark_file(path, expand=False)
+
+    print("\n[RESULT]:")
+    baseline = results["regular"]
+    for name, result in results.items():
+        print(f"{name:<12} size={result['size_mb']:8.2f}MiB load={result['load_s'] * 1000:8.1f}ms "
+              f"memory={result['memory_mb']:8.2f}MiB "
+              f"size_saving={1 - result['size_mb'] / baseline['size_mb']:.1%} "
+              f"load_speedup={baseline['load_s'] / result['load_s']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.benchmarks.benchmark_compact_records
@@ -0,0 +1,111 @@
+"""Benchmark the CPU inference backends: memory, decoding speed and ROUGE drift.
+
+Every backend runs in its own process so that its RSS is measured in isolation.
+Use a merged checkpoint (`python -m src.inference.merge_adapter`) as QWEN_ID to
+benchmark the fine-tuned model, since adapters cannot be loaded into int8 layers.
+"""
+
+import os
+import time
+import multiprocessing as mp
+import torch
+from dotenv import load_dotenv
+from src.tasks import text_summarization
+from src.evaluation.rouge import corpus_rouge
+from src.utils.backend_utils import get_rss_mb
+from src.utils.json_utils import read_finetune_records, get_output_summary
+
+
+def run_backend(backend: str, model_id: str, texts: list, max_new_tokens: int, num_threads: int):
+    """
+    Loads the model with the given backend and summarizes all texts.
+    Args:
+        backend (str): The `TransformersModel` backend.
+        model_id (str): The model to load.
+        texts (list): The texts to be summarized.
+        max_new_tokens (int): The generation budget per text.
+        num_threads (int): The number of intra-op threads, 0 for the torch default.
+    Returns:
+        dict: The RSS after loading, the tokens/sec and the generated summaries.
+    """
+    # imported here so that the parent process does not load torch models
+    from src.evaluation.evaluate_transformers import TransformersModel
+
+    rss_before = get_rss_mb()
+    model = TransformersModel(
+        model_id=model_id, temp=0.2, backend=backend, num_threads=num_threads or None
+    )
+    rss_loaded = get_rss_mb()
+
+    predictions = []
+    generated = 0
+    elapsed = 0.0
+    for text in texts:
+        input_tokens = model.get_input_tokens_from_ids(
+            [text_summarization.get_input_ids(model.tokenizer, text)]
+        )
+        kwargs = {**model.get_generate_kwargs(input_tokens), "max_new_tokens": max_new_tokens}
+        start = time.perf_counter()
+        with torch.no_grad():
+            output_ids = model.model.generate(**kwargs)
+        elapsed += time.perf_counter() - start
+
+        new_tokens = output_ids[0, input_tokens.input_ids.size(-1):]
+        generated += len(new_tokens)
+        predictions.append(get_output_summary(
+            model.tokenizer.decode(new_tokens, skip_special_tokens=True)
+        ))
+
+    return {
+        "backend": model.backend,
+        "model_rss_mb": rss_loaded - rss_before,
+        "rss_mb": get_rss_mb(),
+        "tokens_per_sec": generated / elapsed,
+        "predictions": predictions,
+    }
+
+
+def main():
+    """Compares the fp32, bf16 and int8 CPU backends on the validation set."""
+    print("\n[INFO] Starting CPU backend benchmark...")
+    load_dotenv(dotenv_path=".env", override=True, verbose=True)
+    model_id = os.getenv("QWEN_ID", "Qwen/Qwen2.5-0.5B-Instruct")
+    num_requests = int(os.getenv("BENCH_NUM_REQUESTS", "10"))
+    max_new_tokens = int(os.getenv("BENCH_MAX_NEW_TOKENS", "256"))
+    num_threads = int(os.getenv("NUM_THREADS", "0"))
+
+    records = read_finetune_records(
+        "Data/datasets/llamafactory-finetune-data/val.json", limit=num_requests
+    )
+    texts = [rec["text"] for rec in records]
+    references = [rec["summary"] for rec in records]
+
+    results = {}
+    with mp.get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        for backend in ("cpu_fp32", "cpu_bf16", "cpu_int8"):
+            results[backend] = pool.apply(
+                run_backend, (backend, model_id, texts, max_new_tokens, num_threads)
+            )
+
+    baseline = results["cpu_fp32"]
+    baseline_rouge = corpus_rouge(baseline["predictions"], references)
+
+    print("\n[RESULT]:")
+    print(f"{'backend':<10} {'model RSS':>10} {'total RSS':>10} {'tok/s':>8} "
+          f"{'ROUGE-L':>8} {'drift':>8} {'vs fp32':>8}")
+    for name, result in results.items():
+        rouge = corpus_rouge(result["predictions"], references)
+        agreement = corpus_rouge(result["predictions"], baseline["predictions"])
+        print(
+            f"{name:<10} {result['model_rss_mb']:>8.0f}MB {result['rss_mb']:>8.0f}MB "
+            f"{result['tokens_per_sec']:>8.2f} {rouge['rougeL']:>8.4f} "
+            f"{rouge['rougeL'] - baseline_rouge['rougeL']:>+8.4f} {agreement['rougeL']:>8.4f}"
+        )
+        if result["backend"] != name:
+            print(f"  ({name} fell back to {result['backend']})")
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.benchmarks.benchmark_cpu_backends
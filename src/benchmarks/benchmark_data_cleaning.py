@@ -0,0 +1,63 @@
+"""Benchmark rows/sec of the text cleaning at different numbers of worker processes.
+
+The row-by-row `pandas.apply` implementation is kept here as the reference,
+every parallel run must produce exactly the same texts.
+"""
+
+import os
+import re
+import time
+import multiprocessing as mp
+import pandas as pd
+from src.utils.file_utils import read_file
+from src.data_preprocessing.data_cleaning import TextCleaner, clean_texts
+
+
+def reference_clean_text(cleaner: TextCleaner, text: str) -> str:
+    """The original `DataCleaning.clean_text`, without precompiled regexes or memoization."""
+    text = text.lower()
+    text = re.sub(r'\s+[a-zA-Z]\s+', ' ', text)
+    text = re.sub(r"http\S+|www\S+|https\S+", '', text, flags=re.MULTILINE)
+    text = re.sub(r'\W', ' ', text)
+    text = re.sub(r'\s+', ' ', text, flags=re.I).strip()
+    tokens = [word for word in text.split() if len(word) > 3]
+    lemma_txt = [cleaner.lemmatizer.lemmatize(word) for word in tokens]
+    return ' '.join([word for word in lemma_txt if word not in cleaner.stop_words])
+
+
+def main():
+    """Runs the cleaning benchmark on the CNN/DailyMail train set."""
+    print("\n[INFO] Starting data cleaning benchmark...")
+    path = os.getenv("BENCH_CSV", os.path.join("Data", "raw", "cnn_dailymail", "train.csv"))
+    num_rows = int(os.getenv("BENCH_NUM_ROWS", "20000"))
+    max_workers = int(os.getenv("BENCH_MAX_WORKERS", str(mp.cpu_count())))
+    chunk_size = int(os.getenv("BENCH_CHUNK_SIZE", "2000"))
+
+    df = read_file(path, print_log=True).head(num_rows)
+    texts = pd.concat([df["article"], df["highlights"]]).tolist()
+
+    cleaner = TextCleaner()
+    start = time.perf_counter()
+    expected = pd.Series(texts).apply(lambda text: reference_clean_text(cleaner, text)).tolist()
+    baseline = len(df) / (time.perf_counter() - start)
+    print(f"[INFO] reference  {baseline:.1f} rows/sec")
+
+    results = {}
+    for num_workers in range(1, max_workers + 1):
+        start = time.perf_counter()
+        cleaned = clean_texts(texts, num_workers=num_workers, chunk_size=chunk_size)
+        results[num_workers] = len(df) / (time.perf_counter() - start)
+        if cleaned != expected:
+            raise ValueError(f"Cleaned texts differ from the reference with {num_workers} workers")
+        print(f"[INFO] workers={num_workers:<3} {results[num_workers]:.1f} rows/sec")
+
+    print("\n[RESULT]:")
+    print(f"reference   rows/sec={baseline:.1f}")
+    for num_workers, rows_per_sec in results.items():
+        print(f"workers={num_workers:<3} rows/sec={rows_per_sec:.1f} speedup={rows_per_sec / baseline:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.benchmarks.benchmark_data_cleaning
@@ -0,0 +1,74 @@
+"""Benchmark write/read time and file size of the CSV, Parquet and Arrow intermediates."""
+
+import os
+import time
+import tempfile
+from src.utils.file_utils import TableWriter, read_file
+
+
+def benchmark_format(df, path: str, file_format: str, compression: str = "default") -> dict:
+    """
+    Writes the DataFrame in the given format and reads it back.
+    Args:
+        df (pd.DataFrame): The data passed between the pipeline stages.
+        path (str): The path of the file to write.
+        file_format (str): "csv", "parquet" or "arrow".
+        compression (str, optional): The compression codec, see `TableWriter`.
+    Returns:
+        dict: The write and read times in seconds and the file size in MiB.
+    """
+    start = time.perf_counter()
+    with TableWriter(path, file_format, compression) as writer:
+        writer.write(df)
+    write_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loaded = read_file(path)
+    read_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    read_file(path, memory_map=True)
+    mmap_time = time.perf_counter() - start
+
+    if len(loaded) != len(df):
+        raise ValueError(f"{file_format} read {len(loaded)} rows instead of {len(df)}")
+    return {
+        "write_s": write_time,
+        "read_s": read_time,
+        "mmap_read_s": mmap_time,
+        "size_mb": os.path.getsize(path) / 2 ** 20,
+    }
+
+
+def main():
+    """Runs the file format benchmark on the cleaned data."""
+    print("\n[INFO] Starting file format benchmark...")
+    path = os.getenv("BENCH_CSV", os.path.join("Data", "processed", "cleaned_data.csv"))
+    df = read_file(path, print_log=True)
+
+    variants = [
+        ("csv", "csv", "default"),
+        ("parquet", "parquet", "default"),
+        ("parquet_snappy", "parquet", "snappy"),
+        ("arrow", "arrow", "default"),
+        ("arrow_zstd", "arrow", "zstd"),
+    ]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, file_format, compression in variants:
+            file_path = os.path.join(tmp_dir, f"{name}.{file_format}")
+            results[name] = benchmark_format(df, file_path, file_format, compression)
+            print(f"[INFO] {name:<15} read {results[name]['read_s'] * 1000:.1f} ms")
+
+    print("\n[RESULT]:")
+    baseline = results["csv"]["read_s"]
+    for name, result in results.items():
+        print(f"{name:<15} write={result['write_s'] * 1000:8.1f}ms read={result['read_s'] * 1000:8.1f}ms "
+              f"mmap_read={result['mmap_read_s'] * 1000:8.1f}ms size={result['size_mb']:7.1f}MiB "
+              f"read_speedup={baseline / result['read_s']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.benchmarks.benchmark_file_formats
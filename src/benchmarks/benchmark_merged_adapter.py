@@ -0,0 +1,85 @@
+"""Benchmark decoding tokens/sec with an unmerged PEFT LoRA adapter and a merged checkpoint.
+
+Run it with `CUDA_VISIBLE_DEVICES=""` to measure on CPU.
+"""
+
+import os
+import time
+import torch
+from transformers import StoppingCriteriaList
+from dotenv import load_dotenv
+from src.tasks import text_summarization
+from src.utils.json_utils import read_finetune_records
+from src.evaluation.evaluate_transformers import TransformersModel
+
+
+def tokens_per_second(model: TransformersModel, texts: list, new_tokens: int) -> float:
+    """
+    Generates exactly `new_tokens` tokens for every text and measures the decoding speed.
+    Args:
+        model (TransformersModel): The model used to generate.
+        texts (list): The texts to be summarized, one request each.
+        new_tokens (int): The number of tokens generated per request.
+    Returns:
+        float: The number of generated tokens per second.
+    """
+    elapsed = 0.0
+    for text in texts:
+        input_tokens = model.get_input_tokens_from_ids(
+            [text_summarization.get_input_ids(model.tokenizer, text)]
+        )
+        kwargs = {
+            **model.get_generate_kwargs(input_tokens),
+            "max_new_tokens": new_tokens,
+            "min_new_tokens": new_tokens,
+            # generate exactly `new_tokens` tokens, even after the JSON answer is complete
+            "stopping_criteria": StoppingCriteriaList(),
+            "max_time": None,
+        }
+        start = time.perf_counter()
+        with torch.no_grad():
+            model.model.generate(**kwargs)
+        elapsed += time.perf_counter() - start
+    return len(texts) * new_tokens / elapsed
+
+
+def main():
+    """Compares the unmerged and merged adapter on the validation set."""
+    print("\n[INFO] Starting merged adapter benchmark...")
+    load_dotenv(dotenv_path=".env", override=True, verbose=True)
+    model_id = os.getenv("QWEN_ID", "Qwen/Qwen2.5-0.5B-Instruct")
+    adapter_id = os.getenv(
+        "LORA_PATH", "/teamspace/studios/this_studio/Text-Summarization/models/finetuned"
+    )
+    num_requests = int(os.getenv("BENCH_NUM_REQUESTS", "5"))
+    new_tokens = int(os.getenv("BENCH_NEW_TOKENS", "64"))
+
+    texts = [
+        rec["text"] for rec in read_finetune_records(
+            "Data/datasets/llamafactory-finetune-data/val.json", limit=num_requests
+        )
+    ]
+
+    results = {}
+
+    base = TransformersModel(model_id=model_id, temp=0.2)
+    results["base"] = tokens_per_second(base, texts, new_tokens)
+
+    base.load_adapter(adapter_id)
+    results["unmerged"] = tokens_per_second(base, texts, new_tokens)
+    del base
+
+    merged = TransformersModel(model_id=model_id, temp=0.2)
+    merged.merge_adapter(adapter_id)
+    results["merged"] = tokens_per_second(merged, texts, new_tokens)
+
+    print("\n[RESULT]:")
+    for name, tps in results.items():
+        print(f"{name:<9} {tps:8.2f} tokens/sec")
+    print(f"merged speedup over unmerged: {results['merged'] / results['unmerged']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.benchmarks.benchmark_merged_adapter
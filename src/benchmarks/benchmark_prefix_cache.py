@@ -0,0 +1,74 @@
+"""Benchmark the time to first token with and without the shared-prefix KV cache."""
+
+import os
+import time
+import statistics
+import torch
+from dotenv import load_dotenv
+from src.tasks import text_summarization
+from src.utils.json_utils import read_finetune_records
+from src.evaluation.evaluate_transformers import TransformersModel
+
+
+def time_to_first_token(model: TransformersModel, texts: list, use_prefix_cache: bool) -> list:
+    """
+    Measures the latency of generating the first token for every text.
+    Args:
+        model (TransformersModel): The model used to generate.
+        texts (list): The texts to be summarized, one request each.
+        use_prefix_cache (bool): If True, the prefix cache is reused.
+    Returns:
+        list: The time to first token of every request, in seconds.
+    """
+    latencies = []
+    for text in texts:
+        input_tokens = model.get_input_tokens_from_ids(
+            [text_summarization.get_input_ids(model.tokenizer, text)]
+        )
+        prefix_kwargs = model.get_prefix_kwargs(input_tokens) if use_prefix_cache else {}
+
+        start = time.perf_counter()
+        with torch.no_grad():
+            model.model.generate(
+                **input_tokens,
+                max_new_tokens=1,
+                pad_token_id=model.tokenizer.pad_token_id,
+                **prefix_kwargs,
+            )
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    """Runs the time to first token benchmark on ~500 word validation articles."""
+    print("\n[INFO] Starting prefix cache benchmark...")
+    load_dotenv(dotenv_path=".env", override=True, verbose=True)
+    model_id = os.getenv("QWEN_ID", "Qwen/Qwen2.5-0.5B-Instruct")
+    num_requests = int(os.getenv("BENCH_NUM_REQUESTS", "20"))
+
+    model = TransformersModel(model_id=model_id, temp=0.2)
+    model.set_prefix_cache(text_summarization.get_prefix_ids(model.tokenizer))
+
+    records = read_finetune_records("Data/datasets/llamafactory-finetune-data/val.json")
+    texts = [
+        rec["text"] for rec in records if 400 <= len(rec["text"].split()) <= 600
+    ][:num_requests]
+    print(f"[INFO] Using {len(texts)} articles of 400-600 words")
+
+    # warmup
+    time_to_first_token(model, texts[:1], use_prefix_cache=True)
+
+    baseline = time_to_first_token(model, texts, use_prefix_cache=False)
+    cached = time_to_first_token(model, texts, use_prefix_cache=True)
+
+    print("\n[RESULT]:")
+    print(f"prefix tokens: {model.prefix_ids.size(-1)}")  # type: ignore
+    print(f"without prefix cache: mean TTFT {statistics.mean(baseline) * 1000:.1f} ms")
+    print(f"with prefix cache:    mean TTFT {statistics.mean(cached) * 1000:.1f} ms")
+    print(f"reduction: {(1 - statistics.mean(cached) / statistics.mean(baseline)) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.benchmarks.benchmark_prefix_cache
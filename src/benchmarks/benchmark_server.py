@@ -0,0 +1,290 @@
+"""End-to-end load test of `server.py` and microbenchmarks of the request stages.
+
+The server runs against a tiny randomly initialized stand-in model (see
+`src.benchmarks.tiny_model`), so the suite needs neither a GPU nor network access.
+The requests are articles of val.json drawn with replacement, so the load has the
+real article length distribution. The results are saved as JSON and compared with
+the previous run. Run it from the repository root.
+"""
+
+import os
+import glob
+import json
+import time
+import random
+import platform
+import subprocess
+import urllib.error
+import urllib.request
+from typing import Callable, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from src.benchmarks.benchmark_workers import serve
+from src.benchmarks.tiny_model import get_tiny_model
+from src.utils.json_utils import read_finetune_records
+
+
+def sample_texts(texts: List[str], num_requests: int, seed: int = 0) -> List[str]:
+    """Draws `num_requests` texts with replacement, keeping their length distribution."""
+    return random.Random(seed).choices(texts, k=num_requests)
+
+
+def get_percentiles(values: List[float], prefix: str) -> Dict[str, float]:
+    """Returns the mean, p50, p95, p99 and max of the values, keyed `<prefix>_<stat>`."""
+    if not values:
+        return {}
+    return {
+        f"{prefix}_mean": float(np.mean(values)),
+        f"{prefix}_p50": float(np.percentile(values, 50)),
+        f"{prefix}_p95": float(np.percentile(values, 95)),
+        f"{prefix}_p99": float(np.percentile(values, 99)),
+        f"{prefix}_max": float(np.max(values)),
+    }
+
+
+def post_request(port: int, text: str) -> Dict:
+    """
+    Sends one summarization request.
+    Args:
+        port (int): The port of the server.
+        text (str): The text to be summarized.
+    Returns:
+        dict: The latency in seconds and the HTTP status, 0 if no response was received.
+    """
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/predict",
+        data=json.dumps({"prompt": text}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=600) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = 0
+    return {"latency": time.perf_counter() - start, "status": status}
+
+
+def run_load(port: int, texts: List[str], concurrency: int) -> Dict:
+    """
+    Sends all texts to a running server with a fixed number of requests in flight.
+    Args:
+        port (int): The port of the server.
+        texts (list): The texts to be summarized, one request each.
+        concurrency (int): The number of requests in flight.
+    Returns:
+        dict: The throughput, the error rate and the latency percentiles of the
+        successful requests.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        responses = list(pool.map(lambda text: post_request(port, text), texts))
+    elapsed = time.perf_counter() - start
+
+    latencies = [r["latency"] for r in responses if r["status"] == 200]
+    errors = len(responses) - len(latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": len(responses),
+        "errors": errors,
+        "error_rate": errors / len(responses),
+        "requests_per_sec": len(latencies) / elapsed,
+        **get_percentiles(latencies, "latency"),
+    }
+
+
+def time_calls(function: Callable, inputs: list, repeat: int = 1) -> Dict:
+    """
+    Calls a function on every input, `repeat` times, and times every call.
+    Args:
+        function (Callable): The benchmarked function of one argument.
+        inputs (list): The arguments, e.g. articles of different lengths.
+        repeat (int, optional): The number of passes over the inputs. Defaults to 1.
+    Returns:
+        dict: The number of calls and the percentiles of their duration in milliseconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        for value in inputs:
+            start = time.perf_counter()
+            function(value)
+            durations.append((time.perf_counter() - start) * 1000)
+    return {"calls": len(durations), **get_percentiles(durations, "ms")}
+
+
+def run_microbenchmarks(model_path: str, texts: List[str], summaries: List[str], num_new_tokens: int) -> Dict:
+    """
+    Times the stages of a request in process, one call at a time.
+    Args:
+        model_path (str): The checkpoint of the model.
+        texts (list): The articles.
+        summaries (list): Reference summaries, for the output validation.
+        num_new_tokens (int): The exact number of tokens of every generation.
+    Returns:
+        dict: The call duration percentiles of every stage.
+    """
+    # imported here, only the microbenchmarks run the model in this process
+    from src.tasks import text_summarization
+    from src.evaluation.evaluate_transformers import TransformersModel
+    from src.pydantic_models.text_summarization import TextSummarization
+
+    model = TransformersModel(model_path, temp=0.2)
+    # the stand-in model never closes the JSON answer, so every generation has the same length
+    model.set_generation_limits(
+        max_new_tokens=num_new_tokens, budget_ratio=0, min_new_tokens=num_new_tokens, stop_at_json=False
+    )
+    model.warmup()
+    messages = [text_summarization.get_message(text) for text in texts]
+    input_ids = [text_summarization.get_input_ids(model.tokenizer, text) for text in texts]
+
+    results = {
+        "get_message": time_calls(text_summarization.get_message, texts, repeat=10),
+        "get_chat_template": time_calls(model.get_chat_template, messages, repeat=3),
+        "get_input_tokens": time_calls(
+            model.get_input_tokens, [model.get_chat_template(message) for message in messages], repeat=3
+        ),
+        "get_input_ids": time_calls(
+            lambda text: text_summarization.get_input_ids(model.tokenizer, text), texts, repeat=3
+        ),
+        "generate": time_calls(lambda ids: model.create_from_ids([ids]), input_ids),
+        "validate_output": time_calls(
+            lambda summary: TextSummarization(summarized_text=summary), summaries, repeat=10
+        ),
+    }
+    results["generate"]["tokens_per_sec"] = num_new_tokens / (results["generate"]["ms_mean"] / 1000)
+    return results
+
+
+def get_metadata() -> Dict:
+    """Returns what identifies a run: the commit, the time and the versions."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = ""
+    import torch
+    import transformers
+
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "transformers": transformers.__version__,
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def get_previous_results(results_dir: str) -> Optional[Dict]:
+    """Returns the results of the latest run saved in `results_dir`, None if there is none."""
+    paths = sorted(glob.glob(os.path.join(results_dir, "server_*.json")))
+    if not paths:
+        return None
+    with open(paths[-1], mode="r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare_results(previous: Dict, current: Dict) -> List[str]:
+    """
+    Compares the main numbers of two runs.
+    Args:
+        previous (dict): The results of the previous run.
+        current (dict): The results of this run.
+    Returns:
+        List[str]: One line per number, with the relative change.
+    """
+    lines = []
+    pairs = []
+    for name, result in current["load"].items():
+        for key in ("requests_per_sec", "latency_p50", "latency_p95", "latency_p99", "error_rate"):
+            pairs.append((f"load {name} {key}", previous["load"].get(name, {}).get(key), result.get(key)))
+    for name, result in current["micro"].items():
+        pairs.append((f"micro {name} ms_p50", previous["micro"].get(name, {}).get("ms_p50"), result["ms_p50"]))
+
+    for label, before, after in pairs:
+        if before is None or after is None:
+            continue
+        change = f"{(after - before) / before * 100:+7.1f}%" if before else "    n/a"
+        lines.append(f"{label:<40} {before:>10.4f} -> {after:>10.4f} {change}")
+    return lines
+
+
+def main():
+    """Runs the load test at every concurrency, the microbenchmarks, and saves the results."""
+    print("\n[INFO] Starting server benchmark suite...")
+    data_path = os.getenv("BENCH_DATA", "Data/datasets/llamafactory-finetune-data/val.json")
+    model_path = os.getenv("BENCH_MODEL_PATH", os.path.join("models", "tiny"))
+    results_dir = os.getenv("BENCH_RESULTS_DIR", os.path.join("Data", "benchmarks"))
+    concurrencies = [int(n) for n in os.getenv("BENCH_CONCURRENCY", "1,4,16").split(",")]
+    num_requests = int(os.getenv("BENCH_NUM_REQUESTS", "64"))
+    num_new_tokens = int(os.getenv("BENCH_MAX_NEW_TOKENS", "64"))
+    port = int(os.getenv("BENCH_PORT", "8125"))
+
+    records = read_finetune_records(data_path)
+    texts = [rec["text"] for rec in records]
+    model_path = get_tiny_model(model_path, texts + [rec["summary"] for rec in records])
+    requests = sample_texts(texts, num_requests)
+    lengths = [len(text) for text in requests]
+    print(f"[INFO] {num_requests} requests, article length p50={np.percentile(lengths, 50):.0f} "
+          f"p95={np.percentile(lengths, 95):.0f} chars")
+
+    env = {
+        "MERGED_MODEL_PATH": model_path,
+        "SHARED_WEIGHTS_PATH": "",
+        "WORKERS": os.getenv("WORKERS", "1"),
+        "MAX_NEW_TOKENS": str(num_new_tokens),
+        # every request must reach the model, resampled articles would be cache hits
+        "SUMMARY_CACHE_SIZE": "0",
+        "SUMMARY_CACHE_PATH": "",
+    }
+    load_results = {}
+    with serve(env, port):
+        for concurrency in concurrencies:
+            load_results[f"concurrency_{concurrency}"] = run_load(port, requests, concurrency)
+            print(f"[INFO] concurrency={concurrency} {load_results[f'concurrency_{concurrency}']}")
+
+    summaries = [rec["summary"] for rec in records if rec["summary"]][:16]
+    micro_results = run_microbenchmarks(model_path, requests[:16], summaries, num_new_tokens)
+
+    results = {
+        "metadata": {**get_metadata(), "model_path": model_path, "num_requests": num_requests,
+                     "max_new_tokens": num_new_tokens, "server_env": env},
+        "load": load_results,
+        "micro": micro_results,
+    }
+    baseline_path = os.getenv("BENCH_BASELINE", "")
+    if baseline_path:
+        with open(baseline_path, mode="r", encoding="utf-8") as f:
+            previous = json.load(f)
+    else:
+        previous = get_previous_results(results_dir)
+    os.makedirs(results_dir, exist_ok=True)
+    results_path = os.path.join(results_dir, f"server_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(results_path, mode="w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print("\n[RESULT]:")
+    print(f"{'concurrency':>11} {'req/sec':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+    for result in load_results.values():
+        print(
+            f"{result['concurrency']:>11} {result['requests_per_sec']:>8.2f} "
+            f"{result.get('latency_p50', 0):>7.3f}s {result.get('latency_p95', 0):>7.3f}s "
+            f"{result.get('latency_p99', 0):>7.3f}s {result['error_rate']:>7.1%}"
+        )
+    print(f"\n{'stage':<18} {'p50 ms':>10} {'p95 ms':>10}")
+    for name, result in micro_results.items():
+        print(f"{name:<18} {result['ms_p50']:>10.3f} {result['ms_p95']:>10.3f}")
+    if previous is not None:
+        print(f"\n[INFO] Compared with the run of {previous['metadata']['time']} ({previous['metadata']['commit']}):")
+        print("\n".join(compare_results(previous, results)))
+    print(f"\n[INFO] Results saved to {results_path}")
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.benchmarks.benchmark_server
@@ -0,0 +1,158 @@
+"""Load test of `server.py` with several inference workers: requests/sec and memory.
+
+Every configuration starts its own server process. The memory is measured over the
+whole process tree, as the sum of the RSS (every worker counts the shared weights in
+full) and as the sum of the PSS (the shared pages are split between the workers, so
+it is the real memory use). Run it from the repository root.
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import subprocess
+import urllib.request
+from contextlib import contextmanager
+from typing import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.backend_utils import get_pss_mb, get_rss_mb
+from src.utils.json_utils import read_finetune_records
+
+
+def get_process_tree(pid: int) -> list:
+    """Returns the pid of a process and of all its descendants (Linux only)."""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", mode="r", encoding="utf-8") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        children = []
+    for child in children:
+        pids.extend(get_process_tree(child))
+    return pids
+
+
+def wait_until_ready(port: int, timeout: float = 600.0):
+    """Polls the health check of the server until all its workers are set up."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=5) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(1)
+    raise TimeoutError(f"The server on port {port} was not ready after {timeout}s")
+
+
+def send_request(port: int, text: str) -> float:
+    """Sends one summarization request and returns its latency in seconds."""
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/predict",
+        data=json.dumps({"prompt": text}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=600) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+@contextmanager
+def serve(env: dict, port: int) -> Iterator[subprocess.Popen]:
+    """
+    Runs `server.py` with the given environment until the `with` block ends.
+    Args:
+        env (dict): The environment variables of the server, e.g. WORKERS.
+        port (int): The port of the server.
+    Yields:
+        subprocess.Popen: The server process, once all its workers are set up.
+    """
+    client_exists = os.path.exists("client.py")
+    server = subprocess.Popen(
+        [sys.executable, "server.py"], env={**os.environ, **env, "PORT": str(port)},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+    )
+    try:
+        wait_until_ready(port)
+        yield server
+    finally:
+        os.killpg(server.pid, signal.SIGINT)
+        try:
+            server.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            os.killpg(server.pid, signal.SIGKILL)
+        # LitServe writes an example client on startup
+        if not client_exists and os.path.exists("client.py"):
+            os.remove("client.py")
+
+
+def run_load_test(env: dict, texts: list, port: int, concurrency: int) -> dict:
+    """
+    Starts the server with the given environment and sends all texts concurrently.
+    Args:
+        env (dict): The environment variables of the server, e.g. WORKERS.
+        texts (list): The texts to be summarized, one request each.
+        port (int): The port of the server.
+        concurrency (int): The number of requests in flight.
+    Returns:
+        dict: The requests/sec, the mean latency and the memory of the process tree.
+    """
+    with serve(env, port) as server:
+        # warmup, one request per worker
+        with ThreadPoolExecutor(int(env["WORKERS"])) as pool:
+            list(pool.map(lambda text: send_request(port, text), texts[:int(env["WORKERS"])]))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            latencies = list(pool.map(lambda text: send_request(port, text), texts))
+        elapsed = time.perf_counter() - start
+
+        pids = get_process_tree(server.pid)
+        return {
+            "requests_per_sec": len(texts) / elapsed,
+            "mean_latency": sum(latencies) / len(latencies),
+            "rss_mb": sum(get_rss_mb(pid) for pid in pids),
+            "pss_mb": sum(get_pss_mb(pid) for pid in pids),
+        }
+
+
+def main():
+    """Compares 1, 2 and 4 workers, with private and with shared weights."""
+    print("\n[INFO] Starting multi-worker load test...")
+    merged_model_path = os.getenv("MERGED_MODEL_PATH", os.path.join("models", "merged"))
+    shared_weights_path = os.getenv("SHARED_WEIGHTS_PATH", os.path.join("models", "shared"))
+    worker_counts = [int(n) for n in os.getenv("BENCH_WORKERS", "1,2,4").split(",")]
+    modes = os.getenv("BENCH_MODES", "private,shared").split(",")
+    num_requests = int(os.getenv("BENCH_NUM_REQUESTS", "32"))
+    port = int(os.getenv("BENCH_PORT", "8123"))
+
+    records = read_finetune_records(
+        "Data/datasets/llamafactory-finetune-data/val.json", limit=num_requests
+    )
+    texts = [rec["text"] for rec in records]
+
+    results = {}
+    for mode in modes:
+        for workers in worker_counts:
+            env = {"WORKERS": str(workers), "MERGED_MODEL_PATH": merged_model_path, "SHARED_WEIGHTS_PATH": ""}
+            if mode == "shared":
+                env["SHARED_WEIGHTS_PATH"] = shared_weights_path
+            results[(mode, workers)] = run_load_test(env, texts, port, concurrency=2 * workers)
+            print(f"[INFO] {mode} workers={workers} {results[(mode, workers)]}")
+
+    print("\n[RESULT]:")
+    print(f"{'weights':<8} {'workers':>7} {'req/sec':>8} {'latency':>8} {'rss_mb':>9} {'pss_mb':>9}")
+    for (mode, workers), result in results.items():
+        print(
+            f"{mode:<8} {workers:>7} {result['requests_per_sec']:>8.3f} {result['mean_latency']:>7.2f}s "
+            f"{result['rss_mb']:>9.1f} {result['pss_mb']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.benchmarks.benchmark_workers
@@ -0,0 +1,74 @@
+"""A tiny randomly initialized stand-in for the Qwen model, for offline benchmarks.
+
+It has the architecture, chat template and special tokens of Qwen2.5 but a
+BPE tokenizer trained on the given texts and a few small layers, so that the
+server and the benchmarks run on a CPU-only box without network access. Its
+summaries are random tokens: it measures the serving overhead, not quality.
+"""
+
+import os
+from typing import Iterable
+
+QWEN_CHAT_TEMPLATE = (
+    "{% for message in messages %}"
+    "<|im_start|>{{ message['role'] }}\n{{ message['content'] }}<|im_end|>\n"
+    "{% endfor %}"
+    "{% if add_generation_prompt %}<|im_start|>assistant\n{% endif %}"
+)
+SPECIAL_TOKENS = ["<|endoftext|>", "<|im_start|>", "<|im_end|>"]
+
+
+def create_tiny_model(
+        save_dir: str, texts: Iterable[str], vocab_size: int = 2048, hidden_size: int = 64,
+        num_layers: int = 2, seed: int = 0
+) -> str:
+    """
+    Trains a small tokenizer on the texts and saves it with a random Qwen2 model.
+    Args:
+        save_dir (str): The directory of the checkpoint, usable as `MERGED_MODEL_PATH`.
+        texts (Iterable[str]): The texts the BPE tokenizer is trained on.
+        vocab_size (int, optional): The vocabulary size of the model; the tokenizer
+            has at most as many tokens. Defaults to 2048.
+        hidden_size (int, optional): The hidden size of the model. Defaults to 64.
+        num_layers (int, optional): The number of decoder layers. Defaults to 2.
+        seed (int, optional): The seed of the random weights. Defaults to 0.
+    Returns:
+        str: The checkpoint directory.
+    """
+    # imported here, only needed when the stand-in is created
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import PreTrainedTokenizerFast, Qwen2Config, Qwen2ForCausalLM
+
+    print(f"[INFO] Creating tiny stand-in model in {save_dir}...")
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=vocab_size, special_tokens=SPECIAL_TOKENS,
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+    )
+    tokenizer.train_from_iterator(texts, trainer)
+
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, eos_token="<|im_end|>", pad_token="<|endoftext|>"
+    )
+    tokenizer.chat_template = QWEN_CHAT_TEMPLATE
+    tokenizer.save_pretrained(save_dir)
+
+    torch.manual_seed(seed)
+    config = Qwen2Config(
+        vocab_size=vocab_size, hidden_size=hidden_size, intermediate_size=2 * hidden_size,
+        num_hidden_layers=num_layers, num_attention_heads=4, num_key_value_heads=2,
+        max_position_embeddings=8192, eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id,
+    )
+    Qwen2ForCausalLM(config).save_pretrained(save_dir, safe_serialization=True)
+    return save_dir
+
+
+def get_tiny_model(save_dir: str, texts: Iterable[str]) -> str:
+    """Returns the stand-in checkpoint directory, creating it if it does not exist yet."""
+    if not os.path.exists(os.path.join(save_dir, "config.json")):
+        create_tiny_model(save_dir, texts)
+    return save_dir
@@ -1,24 +1,137 @@
 """Text preprocessing utilities for pandas DataFrames."""
 
-# import os
+import os
 import re
+import multiprocessing as mp
+from typing import List, Optional
 import pandas as pd
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 import nltk
-from src.utils.file_utils import read_file, save_to_file
+from src.utils.file_utils import (
+    TableWriter, get_save_path, read_file, read_file_chunks, save_to_file
+)
+from src.data_preprocessing.near_duplicates import NearDuplicateDetector
 
 
 # Download necessary resources if not already
 nltk.download('stopwords')
 nltk.download('wordnet')
 
+SINGLE_CHAR_PATTERN = re.compile(r'\s+[a-zA-Z]\s+')
+URL_PATTERN = re.compile(r"http\S+|www\S+|https\S+")
+# replacing special characters and extra spaces by one space and splitting on
+# spaces gives the same tokens as finding the runs of word characters
+WORD_PATTERN = re.compile(r'\w+')
+
+
+class TextCleaner:
+    """
+    Cleans texts with precompiled regexes and memoized lemmatization.
+    The vocabulary of news articles is heavily Zipfian, so every unique token is
+    lemmatized and checked against the stop words once and then looked up.
+    """
+
+    def __init__(self, stop_words: Optional[set] = None, lemmatizer: Optional[WordNetLemmatizer] = None) -> None:
+        """
+        Initializes the cleaner.
+        Args:
+            stop_words (set, optional): The words removed after lemmatization.
+                Defaults to the NLTK English stop words.
+            lemmatizer (WordNetLemmatizer, optional): The lemmatizer. Defaults to a new one.
+        Attributes:
+            lemmas (dict): The cleaned form of every token seen so far, "" for stop words.
+        """
+        self.stop_words = stop_words if stop_words is not None else set(stopwords.words('english'))
+        self.lemmatizer = lemmatizer or WordNetLemmatizer()
+        self.lemmas = {}
+
+    def clean_token(self, word: str) -> str:
+        """Returns the lemma of a token, or "" if the lemma is a stop word."""
+        lemma = self.lemmas.get(word)
+        if lemma is None:
+            lemma = self.lemmatizer.lemmatize(word)
+            if lemma in self.stop_words:
+                lemma = ""
+            self.lemmas[word] = lemma
+        return lemma
+
+    def clean(self, text: str) -> str:
+        """
+        Cleans one text, see `DataCleaning.clean_text`.
+        Args:
+            text (str): The input text to be cleaned.
+        Returns:
+            str: The cleaned and preprocessed text.
+        """
+        text = SINGLE_CHAR_PATTERN.sub(' ', text.lower())
+        text = URL_PATTERN.sub('', text)
+        lemmas = (self.clean_token(word) for word in WORD_PATTERN.findall(text) if len(word) > 3)
+        return ' '.join(lemma for lemma in lemmas if lemma)
+
+    def clean_many(self, texts: List[str]) -> List[str]:
+        """Cleans a list of texts, sharing the lemma cache."""
+        return [self.clean(text) for text in texts]
+
+
+# one cleaner per worker process, created by `_init_worker`
+_WORKER_CLEANER = None
+
+
+def _init_worker():
+    """Creates the cleaner of a worker process."""
+    global _WORKER_CLEANER  # pylint: disable=global-statement
+    _WORKER_CLEANER = TextCleaner()
+
+
+def _clean_chunk(texts: List[str]) -> List[str]:
+    """Cleans a chunk of texts in a worker process."""
+    return _WORKER_CLEANER.clean_many(texts)
+
+
+def clean_texts(
+        texts: List[str], num_workers: int = 1, chunk_size: int = 2000,
+        cleaner: Optional[TextCleaner] = None, pool=None
+) -> List[str]:
+    """
+    Cleans a list of texts, optionally across a pool of processes.
+    Args:
+        texts (List[str]): The texts to be cleaned.
+        num_workers (int, optional): The number of processes, 1 cleans the texts in
+            the current process. Defaults to 1.
+        chunk_size (int, optional): The number of texts sent to a worker at once.
+            Defaults to 2000.
+        cleaner (TextCleaner, optional): The cleaner used when `num_workers` is 1.
+            Defaults to a new one.
+        pool (multiprocessing.pool.Pool, optional): A pool created with `create_pool`,
+            reused across calls instead of starting `num_workers` new processes.
+    Returns:
+        List[str]: The cleaned texts, in the same order.
+    """
+    if (num_workers <= 1 and pool is None) or len(texts) <= chunk_size:
+        return (cleaner or TextCleaner()).clean_many(texts)
+
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    if pool is not None:
+        cleaned = pool.map(_clean_chunk, chunks)
+    else:
+        with create_pool(num_workers) as new_pool:
+            cleaned = new_pool.map(_clean_chunk, chunks)
+    return [text for chunk in cleaned for text in chunk]
+
+
+def create_pool(num_workers: int):
+    """Returns a process pool whose workers can run `clean_texts`."""
+    return mp.Pool(num_workers, initializer=_init_worker)
+
+
 class DataCleaning:
     """Cleans and preprocesses text data in a pandas DataFrame."""
 
     def __init__(
             self, df: pd.DataFrame, text_column: str, summary_column : str,
-            overwrite: bool = False, print_log: bool = True
+            overwrite: bool = False, print_log: bool = True,
+            cleaner: Optional[TextCleaner] = None
     ) -> None:
         """
         Initializes the data cleaning class with the provided DataFrame and text column.
@@ -30,6 +143,8 @@ class DataCleaning:
                 otherwise, creates a copy of the DataFrame. Defaults to False.
             print_log (bool, optional): If True, prints log messages during processing.
                 Defaults to True.
+            cleaner (TextCleaner, optional): A cleaner shared with other instances,
+                e.g. one per chunk of a file, so its lemma cache is reused.
         Attributes:
             df (pd.DataFrame): The DataFrame to be cleaned.
             text_column (str): The name of the column containing text data.
@@ -41,6 +156,7 @@ class DataCleaning:
         self.summary_column = summary_column
         self.stop_words = set(stopwords.words('english'))
         self.lemmatizer = WordNetLemmatizer()
+        self.cleaner = cleaner or TextCleaner(self.stop_words, self.lemmatizer)
         self.print_log = print_log
         if self.print_log:
             print(f"[INFO] DataCleaning initialized with text column: {self.text_column} and summary column: {self.summary_column}")
@@ -59,17 +175,18 @@ class DataCleaning:
         if self.print_log:
             print(f"[INFO] Removed columns: {columns}")
 
-    def partition_data(self, data_size: float = 0.2):
+    def partition_data(self, data_size: float = 0.2, random_state: int = 42):
         """
         Partitions the DataFrame to a specified fraction of its original size.
         This method randomly samples a fraction of the DataFrame to reduce its size.
         Args:
             data_size (float): The fraction of the DataFrame to retain. Defaults to 0.05 (5%).
+            random_state (int): The seed of the sampling. Defaults to 42.
         Returns:
             None: The DataFrame is modified in place to retain only the specified fraction.
         """
 
-        self.df = self.df.sample(frac=data_size, random_state=42)
+        self.df = self.df.sample(frac=data_size, random_state=random_state)
         if self.print_log:
             print(f"[INFO] Partitioned data to {data_size * 100}% of original size, resulting in {len(self.df)} rows.")
 
@@ -92,6 +209,40 @@ class DataCleaning:
             else:
                 print("[INFO] No duplicate rows found.")
 
+    def remove_near_duplicates(
+            self, shingle_size: int = 5, threshold: float = 0.8, num_perm: int = 128,
+            detector: Optional[NearDuplicateDetector] = None
+    ):
+        """
+        Removes near-identical articles, e.g. syndicated copies of the same story.
+        The rows are clustered with MinHash/LSH on the word shingles of the text column
+        and the first row of every cluster is kept, see `NearDuplicateDetector`.
+        Args:
+            shingle_size (int, optional): The number of words per shingle. Defaults to 5.
+            threshold (float, optional): The Jaccard similarity above which two articles
+                are duplicates. Defaults to 0.8.
+            num_perm (int, optional): The number of MinHash permutations. Defaults to 128.
+            detector (NearDuplicateDetector, optional): A detector shared with the other
+                chunks of a stream, whose rows are removed against all previous chunks
+                with `filter_new`. The other arguments are then ignored.
+        Returns:
+            dict: The cluster statistics, empty with a shared detector.
+        """
+
+        num_rows = len(self.df)
+        if detector is not None:
+            self.df = detector.filter_new(self.df, self.text_column)
+            stats = {}
+        else:
+            detector = NearDuplicateDetector(
+                shingle_size=shingle_size, threshold=threshold, num_perm=num_perm, print_log=self.print_log
+            )
+            self.df = detector.deduplicate(self.df, self.text_column)
+            stats = detector.stats
+        if self.print_log:
+            print(f"[INFO] Removed {num_rows - len(self.df)} near-duplicate rows.")
+        return stats
+
     def handle_missing_values(self):
         """
         Removes rows with missing values in the specified text column.
@@ -122,34 +273,31 @@ class DataCleaning:
             str: The cleaned and preprocessed text.
         """
 
-        text = text.lower()  # Lowercase
-        text = re.sub(r'\s+[a-zA-Z]\s+', ' ', text) # Remove all single characters from text
-        text = re.sub(r"http\S+|www\S+|https\S+", '', text, flags=re.MULTILINE)  # Remove URLs
-        text = re.sub(r'\W', ' ', text)  # Remove special characters
-        text = re.sub(r'\s+', ' ', text, flags=re.I).strip()  # Remove extra spaces
-        tokens = text.split()
-        tokens = [word for word in tokens if len(word) > 3]
-        lemma_txt = [self.lemmatizer.lemmatize(word) for word in tokens]
-        lemma_no_stop_txt = [word for word in lemma_txt if word not in self.stop_words]
-        clean_txt = ' '.join(lemma_no_stop_txt)
-        return clean_txt
-
-    def apply_clean_text(self):
+        return self.cleaner.clean(text)
+
+    def apply_clean_text(self, num_workers: int = 1, chunk_size: int = 2000, pool=None):
         """
         Normalize text data in the specified column of the DataFrame.
         This method applies the `clean_text` function to each entry in the 
         column specified by `self.text_column` of the DataFrame `self.df`. 
         It is intended to preprocess and clean text data for further analysis.
+        Both columns are cleaned in one pass, chunked across `num_workers` processes.
         Prints an informational message indicating the start of the normalization process.
         Args:
-            None
+            num_workers (int, optional): The number of processes. Defaults to 1.
+            chunk_size (int, optional): The number of texts per chunk. Defaults to 2000.
+            pool (multiprocessing.pool.Pool, optional): A pool created with `create_pool`
+                to reuse instead of starting new processes.
         Returns:
             None: The DataFrame `self.df` is modified in place.
         """
         if self.print_log:
-            print("[INFO] Apply clean data...")
-        self.df[self.text_column] = self.df[self.text_column].apply(self.clean_text)
-        self.df[self.summary_column] = self.df[self.summary_column].apply(self.clean_text)
+            print(f"[INFO] Apply clean data with {num_workers} worker(s)...")
+        texts = self.df[self.text_column].tolist()
+        summaries = self.df[self.summary_column].tolist()
+        cleaned = clean_texts(texts + summaries, num_workers, chunk_size, cleaner=self.cleaner, pool=pool)
+        self.df[self.text_column] = cleaned[:len(texts)]
+        self.df[self.summary_column] = cleaned[len(texts):]
 
 
     def remove_stop_words(self):
@@ -232,7 +380,7 @@ class DataCleaning:
 def test_data_cleaning(
         path: str,
         text_column: str, summary_column : str, text_length: int = 500,
-        all_cleaning : bool = False
+        all_cleaning : bool = False, num_workers: int = 1, deduplicate: bool = True
         ) -> pd.DataFrame:
     """
     Test function for the DataCleaning class.
@@ -241,6 +389,10 @@ def test_data_cleaning(
         text_column (str): The name of the column containing text data.
         text_length (int, optional): Maximum length of sentences to keep. Defaults to 500.
         all_cleaning (bool, optional): If True, performs all cleaning steps. Defaults to False.
+        num_workers (int, optional): The number of processes used to clean the text. Defaults to 1.
+        deduplicate (bool, optional): If True, removes the near-duplicate articles, so
+            that copies of an article cannot end up in both the train and val sets.
+            Defaults to True.
     Returns:
         pd.DataFrame: The cleaned DataFrame.
     """
@@ -251,14 +403,112 @@ def test_data_cleaning(
     cleaner = DataCleaning(df, text_column, summary_column, overwrite=False, print_log=True)
     cleaner.remove_unwanted_columns(columns=['id'])
     cleaner.partition_data(data_size=0.2)
+    if deduplicate:
+        cleaner.remove_near_duplicates()
 
     if all_cleaning:
-        cleaner.apply_clean_text()
+        cleaner.apply_clean_text(num_workers=num_workers)
 
     cleaner.limit_sentence_length(text_length)
 
     return cleaner.get_clean_data()
 
+def stream_data_cleaning(
+        path: str, text_column: str, summary_column: str, save_file_name: str,
+        chunksize: int = 10000, data_size: float = 0.2, text_length: int = 500,
+        all_cleaning: bool = False, num_workers: int = 1, file_format: str = "csv",
+        deduplicate: bool = True
+) -> int:
+    """
+    Runs the cleaning steps of `test_data_cleaning` one chunk of the input file at a time.
+    Every chunk is sampled, filtered, cleaned and appended to the output file before
+    the next one is read, so the memory use does not grow with the size of the file.
+    Args:
+        path (str): Path to the input CSV, Parquet or Arrow file.
+        text_column (str): The name of the column containing text data.
+        summary_column (str): The name of the column containing summary data.
+        save_file_name (str): The name of the output file in 'Data/processed'.
+        chunksize (int, optional): The number of rows read at once. Defaults to 10000.
+        data_size (float, optional): The fraction of every chunk to retain. Defaults to 0.2.
+        text_length (int, optional): Maximum length of sentences to keep. Defaults to 500.
+        all_cleaning (bool, optional): If True, performs all cleaning steps. Defaults to False.
+        num_workers (int, optional): The number of processes used to clean the text. Defaults to 1.
+        file_format (str, optional): The output format, "csv", "parquet" or "arrow".
+            Defaults to "csv".
+        deduplicate (bool, optional): If True, removes the near-duplicate articles
+            across all chunks. Defaults to True.
+    Returns:
+        int: The number of rows written.
+    """
+    os.makedirs(os.path.join('Data', 'processed'), exist_ok=True)
+    total_read = 0
+    total_written = 0
+
+    def count_read(chunks):
+        """Counts the rows read from the input file."""
+        nonlocal total_read
+        for chunk in chunks:
+            total_read += len(chunk)
+            yield chunk
+
+    chunks = read_file_chunks(path, chunksize=chunksize, print_log=True)
+    clean_chunks = iter_clean_chunks(
+        count_read(chunks), text_column, summary_column, data_size, text_length,
+        all_cleaning, num_workers, deduplicate,
+    )
+    with TableWriter(get_save_path(save_file_name, file_format), file_format) as writer:
+        for i, clean_chunk in enumerate(clean_chunks):
+            writer.write(clean_chunk)
+            total_written += len(clean_chunk)
+            print(f"[INFO] Chunk {i}: read {total_read} rows, written {total_written} rows")
+    return total_written
+
+def iter_clean_chunks(
+        chunks, text_column: str, summary_column: str, data_size: float = 0.2,
+        text_length: int = 500, all_cleaning: bool = False, num_workers: int = 1,
+        deduplicate: bool = False
+):
+    """
+    Runs the cleaning steps of `test_data_cleaning` on every chunk of a DataFrame stream.
+    One lemma cache, one process pool and one near-duplicate index are shared by all chunks.
+    Args:
+        chunks (Iterable[pd.DataFrame]): The chunks, e.g. from `read_file_chunks`.
+        text_column (str): The name of the column containing text data.
+        summary_column (str): The name of the column containing summary data.
+        data_size (float, optional): The fraction of every chunk to retain. Defaults to 0.2.
+        text_length (int, optional): Maximum length of sentences to keep. Defaults to 500.
+        all_cleaning (bool, optional): If True, performs all cleaning steps. Defaults to False.
+        num_workers (int, optional): The number of processes used to clean the text. Defaults to 1.
+        deduplicate (bool, optional): If True, removes the articles that near-duplicate
+            an article of the same or a previous chunk. Defaults to False.
+    Yields:
+        pd.DataFrame: The cleaned chunks.
+    """
+    text_cleaner = TextCleaner() if all_cleaning else None
+    detector = NearDuplicateDetector(print_log=False) if deduplicate else None
+    pool = create_pool(num_workers) if all_cleaning and num_workers > 1 else None
+    try:
+        for i, chunk in enumerate(chunks):
+            cleaner = DataCleaning(
+                chunk, text_column, summary_column, overwrite=True, print_log=False,
+                cleaner=text_cleaner,
+            )
+            cleaner.remove_unwanted_columns(columns=['id'])
+            # a different seed per chunk, so the chunks are not sampled at the same positions
+            cleaner.partition_data(data_size=data_size, random_state=42 + i)
+            cleaner.handle_missing_values()
+            if detector is not None:
+                # on the raw articles, before the train/val split and the costly cleaning
+                cleaner.remove_near_duplicates(detector=detector)
+            if all_cleaning:
+                cleaner.apply_clean_text(num_workers=num_workers, pool=pool)
+            cleaner.limit_sentence_length(text_length)
+            yield cleaner.get_clean_data()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
 def main():
     """
     Main function to execute the data cleaning process.
@@ -272,11 +522,28 @@ def main():
     summary_column = "highlights"
     text_length = 500
     all_cleaning = False  # only limit sentence length
+    num_workers = mp.cpu_count()
+    chunksize = 0  # > 0 streams the file in chunks of this many rows
+    file_format = "csv"  # "parquet" or "arrow" are much faster to load in the next stages
     save_file_name = "cleaned_data"
 
-    cleaned_data = test_data_cleaning(path, text_column, summary_column, text_length, all_cleaning)
+    if chunksize > 0:
+        num_rows = stream_data_cleaning(
+            path, text_column, summary_column, save_file_name, chunksize,
+            text_length=text_length, all_cleaning=all_cleaning, num_workers=num_workers,
+            file_format=file_format,
+        )
+        print(f"[INFO] Data cleaning process completed successfully, {num_rows} rows saved.")
+        return
+
+    cleaned_data = test_data_cleaning(
+        path, text_column, summary_column, text_length, all_cleaning, num_workers
+    )
 
-    save_to_file(save_dir='processed', save_file_name=save_file_name, df=cleaned_data, print_log=True)
+    save_to_file(
+        save_dir='processed', save_file_name=save_file_name, df=cleaned_data, print_log=True,
+        file_format=file_format,
+    )
 
     print(cleaned_data.head())
     print("[INFO] Data cleaning process completed successfully.")
@@ -5,7 +5,7 @@ saving it as JSONL.
 
 # import random
 import pandas as pd
-from src.utils.file_utils import read_file, save_json_file
+from src.utils.file_utils import get_save_path, read_file, save_json_file
 
 
 class DataExtraction:
@@ -47,14 +47,26 @@ class DataExtraction:
         """
 
         print("[INFO] Extracting text and Summary...")
-        _df = self.df
-        data = [{"id": i,
-                 "text": text[0],
-                 "summary": text[1]}
-                for i, text in enumerate(zip(_df["article"], _df["highlights"]))]
+        data = list(self.iter_text())
         # random.shuffle(data)
         return data
 
+    def iter_text(self, start_id: int = 0):
+        """
+        Yields the records of `extract_text` one at a time, e.g. for `save_json_file`.
+        Args:
+            start_id (int, optional): The id of the first record, to continue the ids
+                of a previous chunk of the data. Defaults to 0.
+        Yields:
+            dict: A dictionary with keys 'id', 'text' and 'summary'.
+        """
+
+        _df = self.df
+        for i, text in enumerate(zip(_df["article"], _df["highlights"]), start=start_id):
+            yield {"id": i,
+                   "text": text[0],
+                   "summary": text[1]}
+
 
 def test_data_extraction_0():
     """Test function for DataExtraction class."""
@@ -71,14 +83,16 @@ def test_data_extraction_0():
     print("Data extraction test passed.")
 
 def test_data_extraction():
-    """Test function for DataExtraction class with a CSV file."""
+    """Test function for DataExtraction class with a CSV, Parquet or Arrow file."""
 
-    file_path = r"Data\processed\cleaned_data.csv"
+    file_format = "csv"  # the format written by data_cleaning
+    file_path = get_save_path("cleaned_data", file_format)
     save_path = "extracted_data"
-    df = read_file(file_path, print_log=True)
+    df = read_file(file_path, print_log=True, memory_map=file_format == "arrow")
+    # the DataFrame is not used afterwards, copying it would read a memory-mapped file into memory
     extractor = DataExtraction(df=df,
                                text_column="article", summary_column="highlights",
-                               overwrite=False, print_log=True)
+                               overwrite=True, print_log=True)
     extracted_data = extractor.extract_text()
     save_json_file(save_file_name=save_path, obj=extracted_data)
     print("[INFO] Data extraction completed successfully.")
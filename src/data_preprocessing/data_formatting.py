@@ -2,7 +2,10 @@
 import json
 import os
 import random
-from src.utils.file_utils import read_json_lines, save_json_file
+import itertools
+from src.utils.file_utils import (
+    iter_json_lines, read_json_lines, save_json_file, shuffle_json_lines, write_json_array
+)
 
 class DataFormatting:
     """
@@ -114,33 +117,97 @@ class DataFormatting:
 
         print("\n[INFO] Formatting data for finetuning in progress..")
         for rec in data:
-
-            self.llm_finetuning_data.append({
-                "system": self.system_message,
-                "instruction": "\n".join([
-                    "# Text:",
-                    rec["text"], # type: ignore
-
-                    "# Task:",
-                    rec["task"], # type: ignore
-
-                    "# Output Scheme:",
-                    rec["output_scheme"], # type: ignore
-
-                    "Output JSON:",
-                    "```json"
-                ]),
-                "input": "",
-                "output": "\n".join([
-                    "```json",
-                    json.dumps(rec["response"], ensure_ascii=False, default=str), # type: ignore
-                    "```"
-                ]),
-                "history": ""
-            })
+            self.llm_finetuning_data.append(self.format_record(rec))
 
         random.Random(101).shuffle(self.llm_finetuning_data)
 
+    def format_record(self, rec: dict) -> dict:
+        """
+        Formats one record for fine-tuning, see `format_data`.
+        Args:
+            rec (dict): A record with the keys "text", "task", "output_scheme" and "response".
+        Returns:
+            dict: The record in the LLaMA-Factory alpaca format.
+        """
+
+        return {
+            "system": self.system_message,
+            "instruction": "\n".join([
+                "# Text:",
+                rec["text"], # type: ignore
+
+                "# Task:",
+                rec["task"], # type: ignore
+
+                "# Output Scheme:",
+                rec["output_scheme"], # type: ignore
+
+                "Output JSON:",
+                "```json"
+            ]),
+            "input": "",
+            "output": "\n".join([
+                "```json",
+                json.dumps(rec["response"], ensure_ascii=False, default=str), # type: ignore
+                "```"
+            ]),
+            "history": ""
+        }
+
+    def stream_to_file(self, data, train_size: int = 3000, val_size: int = 500):
+        """
+        Formats, shuffles and saves the records without holding them all in memory.
+        This is the streaming version of `format_data` followed by `save_to_file`:
+        the records are shuffled with a bounded-memory external shuffle, written to
+        the JSON lines file, and the train and validation splits are then streamed
+        from that file.
+        Args:
+            data (Iterable[dict]): The records to be formatted, e.g. from `iter_json_lines`.
+            train_size (int, optional): The number of training records. Defaults to 3000.
+            val_size (int, optional): The number of validation records. Defaults to 500.
+        Returns:
+            None
+        """
+
+        print("\n[INFO] Streaming formatted data to file..")
+        self.save_stream((self.format_record(rec) for rec in data), train_size, val_size)
+
+    def save_stream(self, records, train_size: int = 3000, val_size: int = 500):
+        """
+        Shuffles and saves records that are already formatted, see `stream_to_file`.
+        Args:
+            records (Iterable[dict]): The records returned by `format_record`.
+            train_size (int, optional): The number of training records. Defaults to 3000.
+            val_size (int, optional): The number of validation records. Defaults to 500.
+        Returns:
+            None
+        """
+
+        path = save_json_file(self.save_path, shuffle_json_lines(records, seed=101))
+
+        save_dir = os.path.join("Data", "datasets", "llamafactory-finetune-data")
+        os.makedirs(save_dir, exist_ok=True)
+        train_count = write_json_array(
+            os.path.join(save_dir, "train.json"), itertools.islice(iter_json_lines(path), train_size)
+        )
+        val_count = write_json_array(
+            os.path.join(save_dir, "val.json"),
+            itertools.islice(iter_json_lines(path), train_size, train_size + val_size),
+        )
+        print(f"[INFO] Training dataset size: {train_count}")
+        print(f"[INFO] Validation dataset size: {val_count}")
+
+def test_data_formatting_stream():
+    """test function for the streaming formatting of DataFormatting class."""
+
+    print("\n[INFO] Testing DataFormatting class in streaming mode...")
+    formatter = DataFormatting(
+        data_path=os.path.join("Data", "processed", "prepared_data.jsonl"),
+        save_path="formatted"
+    )
+    formatter.stream_to_file(iter_json_lines(formatter.data_path))
+
+
 def test_data_formatting():
     """test function for DataFormatting class."""
 
@@ -161,6 +228,7 @@ def test_data_formatting():
 def main():
     """Main function to execute the data formatting process."""
     test_data_formatting()
+    # test_data_formatting_stream()
 
 if __name__ == "__main__":
     main()
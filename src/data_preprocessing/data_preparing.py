@@ -1,16 +1,25 @@
 """ preparedata for fine-tuning LLMs """
 
 import json
-from src.utils.file_utils import read_json_lines, save_json_file
+from src.utils.file_utils import SHARED_REF_KEY, iter_json_lines, read_json_lines, save_json_file
 from src.pydantic_models.text_summarization import TextSummarization
 
+TASK = "summarized the given text and save the response as JSON"
+
+
 class DataPreparing:
     """ class for preparing data for fine-tuning LLMs """
 
-    def __init__(self, data_path: str, save_name: str) -> None:
-        """Initialize the DataPreparing class."""
+    def __init__(self, data_path: str, save_name: str, compact: bool = False) -> None:
+        """
+        Initialize the DataPreparing class.
+        With `compact=True` the task and the output scheme, identical for every record,
+        are saved once in the header of the file instead of in every record; they are
+        filled in again when the file is read with `iter_json_lines`.
+        """
         self.data_path = data_path
         self.save_name = save_name
+        self.compact = compact
 
         print(f"[INFO] DataPreparing initialized with data path: {self.data_path} and save path: data/processed/{self.save_name}")
 
@@ -24,17 +33,35 @@ class DataPreparing:
         print(f"\n[INFO] Loading data from {data_path}...")
         return read_json_lines(data_path, shuffle=False)
 
-    def save_data(self, data: list):
+    def iter_data(self):
+        """
+        Yields the records of the JSON lines file one at a time.
+        Returns:
+            Iterator[dict]: The records loaded lazily from the file.
+        """
+        print(f"\n[INFO] Streaming data from {self.data_path}...")
+        return iter_json_lines(self.data_path)
+
+    def save_data(self, data):
         """
         Saves the prepared data to a JSON lines file.
         Args:
-            data (list): A list of dictionaries representing the prepared data.
+            data (Iterable[dict]): A list or a generator of dictionaries representing the prepared data.
             save_file_name (str): The name of the file to save the data to.
         """
         #  save_file_name: str="prepared_data"
         save_file_name = self.save_name
         print(f"[INFO] Saving prepared data to {save_file_name}.jsonl...")
-        save_json_file(save_file_name, data)
+        save_json_file(save_file_name, data, shared=self.get_shared_fields() if self.compact else None)
+
+    def get_shared_fields(self) -> dict:
+        """
+        Returns the fields shared by all prepared records, by group name.
+        Returns:
+            dict: The task and the output scheme of the "summarization" group.
+        """
+        scheme = json.dumps(TextSummarization.model_json_schema(), ensure_ascii=False, indent=2)
+        return {"summarization": {"task": TASK, "output_scheme": scheme}}
 
     def prepare_data(self, data: list):
         """
@@ -45,32 +72,47 @@ class DataPreparing:
             list: A list of dictionaries representing the prepared data.
         """
         print("[INFO] Preparing data for fine-tuning...")
-        data_s = []
-        scheme = TextSummarization.model_json_schema()
+        data_s = list(self.prepare_records(data))
+        print(f"[INFO] Prepared {len(data_s)} records for fine-tuning.")
+        return data_s
+
+    def prepare_records(self, data):
+        """
+        Prepares the records one at a time, see `prepare_data`.
+        Args:
+            data (Iterable[dict]): The records to be prepared, e.g. from `iter_data`.
+        Yields:
+            dict: The prepared records.
+        """
+        shared = self.get_shared_fields()["summarization"]
         for line in data:
-            item = {
+            if self.compact:
+                yield {
+                    "id": line['id'],
+                    SHARED_REF_KEY: "summarization",
+                    "text": line['text'],
+                    "response": {"summarized_text": line['summary']}
+                }
+                continue
+            yield {
                 "id": line['id'],
-                "task" : "summarized the given text and save the response as JSON",
-                "output_scheme": json.dumps(scheme, ensure_ascii=False, indent=2),
+                "task" : shared["task"],
+                "output_scheme": shared["output_scheme"],
                 "text": line['text'],
                 "response": {"summarized_text":
                              line['summary']}
             }
 
-            data_s.append(item)
-        print(f"[INFO] Prepared {len(data_s)} records for fine-tuning.")
-        return data_s
-
 
 def test_data_preparing():
     """Test function for DataPreparing class."""
     data_path="Data/processed/extracted_data.jsonl"
-    data_preparing = DataPreparing(data_path=data_path, save_name="prepared_data")
+    data_preparing = DataPreparing(data_path=data_path, save_name="prepared_data", compact=True)
 
 
-    data = data_preparing.load_data()
-    prepared_data = data_preparing.prepare_data(data)
-    data_preparing.save_data(prepared_data)
+    # the records are streamed from the input file to the output file
+    data = data_preparing.iter_data()
+    data_preparing.save_data(data_preparing.prepare_records(data))
 
 def test_get_schema():
 
@@ -0,0 +1,290 @@
+"""Near-duplicate detection of articles with MinHash signatures and LSH banding."""
+
+import re
+import time
+from typing import List, Tuple
+import numpy as np
+import pandas as pd
+from src.utils.file_utils import read_file
+
+WORD_PATTERN = re.compile(r'\w+')
+HASH_SHIFT = np.uint64(32)
+
+
+def get_lsh_params(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    Chooses the number of bands and rows per band of the LSH index.
+    Two texts with Jaccard similarity s share at least one band with probability
+    1 - (1 - s^rows)^bands. The split minimizes the probability mass of the false
+    positives (s below the threshold) plus the false negatives (s above it), with
+    false negatives weighted more since every candidate is verified afterwards.
+    Args:
+        num_perm (int): The number of MinHash permutations.
+        threshold (float): The Jaccard similarity threshold.
+    Returns:
+        tuple: The number of bands and the number of rows per band.
+    """
+    below = np.linspace(0.0, threshold, 100)
+    above = np.linspace(threshold, 1.0, 100)
+
+    def get_error(split: Tuple[int, int]) -> float:
+        """Returns the weighted false positive and false negative areas of a split."""
+        bands, rows = split
+        false_positives = np.mean(1 - (1 - below ** rows) ** bands) * threshold
+        false_negatives = np.mean((1 - above ** rows) ** bands) * (1 - threshold)
+        return 0.25 * false_positives + 0.75 * false_negatives
+
+    splits = [(bands, num_perm // bands) for bands in range(1, num_perm + 1)]
+    return min(splits, key=get_error)
+
+
+class NearDuplicateDetector:
+    """
+    Clusters near-identical texts, e.g. syndicated copies of the same article.
+    Every text is represented by its set of word shingles (k consecutive words).
+    The MinHash signature of a set estimates its Jaccard similarity with other sets,
+    and LSH banding of the signatures only compares texts that share a band, so
+    the cost grows linearly with the number of texts instead of quadratically.
+    """
+
+    def __init__(
+            self, shingle_size: int = 5, threshold: float = 0.8, num_perm: int = 128,
+            batch_words: int = 50000, seed: int = 42, print_log: bool = True
+    ) -> None:
+        """
+        Initializes the detector.
+        Args:
+            shingle_size (int, optional): The number of words per shingle. Defaults to 5.
+            threshold (float, optional): The Jaccard similarity above which two texts
+                are duplicates. Defaults to 0.8.
+            num_perm (int, optional): The number of MinHash permutations. Defaults to 128.
+            batch_words (int, optional): The number of words hashed at once, it bounds
+                the memory use to a few times `8 * num_perm * batch_words` bytes.
+                Defaults to 50000.
+            seed (int, optional): The seed of the hash functions. Defaults to 42.
+            print_log (bool, optional): If True, prints log messages. Defaults to True.
+        Attributes:
+            bands (int): The number of LSH bands.
+            rows (int): The number of signature rows per band.
+            stats (dict): The cluster statistics of the last `find_clusters` call.
+            seen_signatures (List[np.ndarray]): The signatures of the texts kept by `filter_new`.
+            seen_buckets (List[dict]): The indices in `seen_signatures` per band bucket.
+        """
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.batch_words = batch_words
+        self.print_log = print_log
+        self.bands, self.rows = get_lsh_params(num_perm, threshold)
+
+        # multiply-shift hash functions: the high 32 bits of (a * x + b) mod 2^64, a odd
+        rng = np.random.RandomState(seed)
+        max_int = np.iinfo(np.uint64).max
+        self.perm_a = rng.randint(0, max_int, size=(num_perm, 1), dtype=np.uint64) | np.uint64(1)
+        self.perm_b = rng.randint(0, max_int, size=(num_perm, 1), dtype=np.uint64)
+        self.word_multipliers = rng.randint(0, max_int, size=shingle_size, dtype=np.uint64) | np.uint64(1)
+        self.stats = {}
+        self.seen_signatures: List[np.ndarray] = []
+        self.seen_buckets: List[dict] = [{} for _ in range(self.bands)]
+
+    @staticmethod
+    def has_words(texts: List[str]) -> np.ndarray:
+        """Returns True for every text with at least one word, the others have no shingles."""
+        return np.array([isinstance(text, str) and WORD_PATTERN.search(text) is not None for text in texts],
+                        dtype=bool)
+
+    def get_shingle_hashes(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the 32-bit hashes of the word shingles of a batch of texts.
+        The words of all texts are hashed with one call to `pd.util.hash_array`, and
+        the shingles are hashed with one vectorized multiply-add per word of a shingle.
+        A text shorter than the shingle size has one shingle made of all its words.
+        Args:
+            texts (List[str]): The input texts.
+        Returns:
+            tuple: The concatenated shingle hashes and the number of shingles per text.
+        """
+        words = [WORD_PATTERN.findall(text.lower()) if isinstance(text, str) else [] for text in texts]
+        lengths = np.array([len(w) for w in words], dtype=np.int64)
+        word_hashes = pd.util.hash_array(np.array([w for ws in words for w in ws], dtype=object))
+
+        text_ids = np.repeat(np.arange(len(texts)), lengths)
+        positions = np.arange(len(word_hashes)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        remaining = lengths[text_ids] - positions  # words from a position to the end of its text
+
+        padded = np.concatenate([word_hashes, np.zeros(self.shingle_size, dtype=np.uint64)])
+        hashes = np.zeros(len(word_hashes), dtype=np.uint64)
+        for j in range(self.shingle_size):
+            # uint64 overflow wraps around, which is fine for hashing
+            word = padded[j:j + len(word_hashes)] * self.word_multipliers[j]
+            hashes += np.where(remaining > j, word, np.uint64(0))
+
+        valid = (remaining >= self.shingle_size) | ((positions == 0) & (lengths[text_ids] < self.shingle_size))
+        counts = np.bincount(text_ids[valid], minlength=len(texts))
+        return hashes[valid] >> HASH_SHIFT, counts
+
+    def get_signatures(self, texts: List[str]) -> np.ndarray:
+        """
+        Computes the MinHash signatures of the texts.
+        The shingles of a batch of texts are permuted together, then
+        `np.minimum.reduceat` takes the minimum of every text's segment.
+        Args:
+            texts (List[str]): The input texts.
+        Returns:
+            np.ndarray: The signatures, of shape (len(texts), num_perm). Empty texts
+            keep the all-max signature, the callers skip them with `has_words`.
+        """
+        signatures = np.full((len(texts), self.num_perm), np.iinfo(np.uint32).max, dtype=np.uint64)
+        start = 0
+        while start < len(texts):
+            # grow the batch until it holds about `batch_words` words (estimated from characters)
+            end, num_chars = start, 0
+            while end < len(texts) and (num_chars < 6 * self.batch_words or end == start):
+                num_chars += len(texts[end]) if isinstance(texts[end], str) else 0
+                end += 1
+
+            hashes, counts = self.get_shingle_hashes(texts[start:end])
+            rows = np.flatnonzero(counts) + start
+            if len(rows):
+                offsets = np.cumsum(counts[counts > 0]) - counts[counts > 0]
+                # in place, the (num_perm, num_shingles) matrix is the largest array
+                permuted = self.perm_a * hashes
+                permuted += self.perm_b
+                permuted >>= HASH_SHIFT
+                signatures[rows] = np.minimum.reduceat(permuted, offsets, axis=1).T
+            start = end
+        return signatures
+
+    def find_clusters(self, texts: List[str]) -> np.ndarray:
+        """
+        Clusters the near-duplicate texts.
+        Texts whose signatures are equal in at least one band are candidates, and
+        a candidate is merged into the cluster of the first text of its bucket if
+        their estimated Jaccard similarity reaches the threshold. Empty or missing
+        texts have nothing to compare and are never clustered.
+        Args:
+            texts (List[str]): The input texts.
+        Returns:
+            np.ndarray: The cluster label of every text, the index of its representative
+            (the first text of the cluster).
+        """
+        start = time.perf_counter()
+        signatures = self.get_signatures(texts)
+        if self.print_log:
+            print(f"[INFO] Computed {len(texts)} MinHash signatures in {time.perf_counter() - start:.1f}s")
+
+        parents = np.arange(len(texts))
+        candidates = np.flatnonzero(self.has_words(texts))
+
+        def find(i: int) -> int:
+            """Returns the root of a text in the union-find forest, compressing the path."""
+            root = i
+            while parents[root] != root:
+                root = parents[root]
+            while parents[i] != root:
+                parents[i], i = root, parents[i]
+            return root
+
+        for band in range(self.bands):
+            # with bands * rows < num_perm the last permutations are only used for verification
+            rows = np.ascontiguousarray(signatures[candidates, band * self.rows:(band + 1) * self.rows])
+            _, buckets = np.unique(rows.view(np.dtype((np.void, rows.dtype.itemsize * self.rows))),
+                                   return_inverse=True)
+            buckets = buckets.ravel()
+            order = candidates[np.argsort(buckets, kind="stable")]
+            sorted_buckets = np.sort(buckets, kind="stable")
+            # only the buckets holding more than one text can contain duplicates
+            starts = np.flatnonzero(np.diff(sorted_buckets, prepend=-1))
+            sizes = np.diff(np.append(starts, len(order)))
+            for first, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+                members = order[first:first + size]
+                similarities = (signatures[members[1:]] == signatures[members[0]]).mean(axis=1)
+                for member in members[1:][similarities >= self.threshold]:
+                    root_a, root_b = find(members[0]), find(member)
+                    if root_a != root_b:
+                        parents[max(root_a, root_b)] = min(root_a, root_b)
+
+        labels = np.array([find(i) for i in range(len(texts))])
+        self.stats = self.get_cluster_stats(labels)
+        if self.print_log:
+            print(f"[INFO] Found {self.stats['num_clusters']} near-duplicate clusters "
+                  f"({self.stats['num_duplicates']} duplicates) in {time.perf_counter() - start:.1f}s")
+        return labels
+
+    @staticmethod
+    def get_cluster_stats(labels: np.ndarray) -> dict:
+        """Returns the number and the size distribution of the clusters with duplicates."""
+        _, sizes = np.unique(labels, return_counts=True)
+        duplicated = sizes[sizes > 1]
+        return {
+            "num_texts": int(len(labels)),
+            "num_clusters": int(len(duplicated)),
+            "num_duplicates": int((duplicated - 1).sum()),
+            "largest_cluster": int(duplicated.max()) if len(duplicated) else 1,
+            "mean_cluster_size": float(duplicated.mean()) if len(duplicated) else 0.0,
+            "size_histogram": {int(size): int(count) for size, count in zip(*np.unique(duplicated, return_counts=True))},
+        }
+
+    def deduplicate(self, df: pd.DataFrame, column: str) -> pd.DataFrame:
+        """
+        Keeps one representative, the first row, of every cluster of near-duplicate rows.
+        Args:
+            df (pd.DataFrame): The input DataFrame.
+            column (str): The name of the text column compared.
+        Returns:
+            pd.DataFrame: The rows that are representatives of their cluster.
+        """
+        labels = self.find_clusters(df[column].tolist())
+        return df[labels == np.arange(len(df))]
+
+    def filter_new(self, df: pd.DataFrame, column: str) -> pd.DataFrame:
+        """
+        Removes the rows that near-duplicate a row kept by a previous call or an
+        earlier row of `df`, and remembers the kept rows for the next calls.
+        It deduplicates a stream of chunks against everything seen before, e.g. in
+        `iter_clean_chunks`, with one signature per kept row in memory. A row is
+        compared with the kept rows only, so unlike `find_clusters` the duplicates
+        of a removed row are not removed through it.
+        Args:
+            df (pd.DataFrame): The next chunk.
+            column (str): The name of the text column compared.
+        Returns:
+            pd.DataFrame: The rows of the chunk that are not near-duplicates.
+        """
+        texts = df[column].tolist()
+        signatures = self.get_signatures(texts).astype(np.uint32)
+        keep = np.ones(len(texts), dtype=bool)
+        for i in np.flatnonzero(self.has_words(texts)):
+            keys = [signatures[i, band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+            candidates = {j for band, key in enumerate(keys) for j in self.seen_buckets[band].get(key, ())}
+            if any((self.seen_signatures[j] == signatures[i]).mean() >= self.threshold for j in candidates):
+                keep[i] = False
+                continue
+            for band, key in enumerate(keys):
+                self.seen_buckets[band].setdefault(key, []).append(len(self.seen_signatures))
+            self.seen_signatures.append(signatures[i])
+        if self.print_log:
+            print(f"[INFO] Removed {int((~keep).sum())} near-duplicates, {len(self.seen_signatures)} texts seen.")
+        return df[keep]
+
+
+def main():
+    """Reports the near-duplicate clusters of the articles of the train set."""
+    print("[INFO] Starting near-duplicate detection...")
+    path = r"Data/raw/cnn_dailymail/train.csv"
+    text_column = "article"
+
+    df = read_file(path, print_log=True)
+    detector = NearDuplicateDetector(shingle_size=5, threshold=0.8, num_perm=128)
+    deduplicated = detector.deduplicate(df, text_column)
+
+    print("\n[RESULT]:")
+    for key, value in detector.stats.items():
+        print(f"{key}: {value}")
+    print(f"rows kept: {len(deduplicated)} / {len(df)}")
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.data_preprocessing.near_duplicates
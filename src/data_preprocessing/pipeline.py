@@ -0,0 +1,332 @@
+"""
+Runs cleaning, extraction, preparing, the optional token length filtering and formatting
+as streaming stages in one process, with on-disk caching of every stage output and
+per-stage timing.
+"""
+
+import os
+import json
+import time
+import hashlib
+import multiprocessing as mp
+from typing import Dict, Iterable, Iterator, Optional
+from src.utils.file_utils import (
+    SHARED_REF_KEY, TableWriter, expand_record, iter_json_lines, json_dumps, read_file_chunks
+)
+from src.pydantic_models.text_summarization import TextSummarization
+from src.data_preprocessing.data_cleaning import iter_clean_chunks
+from src.data_preprocessing.data_extraction import DataExtraction
+from src.data_preprocessing.data_preparing import DataPreparing
+from src.data_preprocessing.data_formatting import DataFormatting
+from src.data_preprocessing.token_lengths import TokenLengthFilter
+
+# the stages in order, "reading" is the source and "saving" the sink
+STAGES = ("cleaning", "extraction", "preparing", "formatting")
+# the optional stage filtering the prepared records by token length, run before formatting
+TOKENIZING_STAGE = "tokenizing"
+
+
+def get_file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """Returns the SHA-256 hex digest of the content of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_stage_key(stage: str, config: Dict, input_key: str) -> str:
+    """Returns the cache key of a stage output from its configuration and the key of its input."""
+    payload = json.dumps({"stage": stage, "config": config, "input": input_key}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class StageCache:
+    """
+    Stores the output of every stage in a directory, one file per stage key.
+    The cleaning stage outputs DataFrame chunks, stored as an Arrow file; the
+    other stages output records, stored as JSON lines. A file is only visible
+    once the stage has run to completion. Subclasses can override `has`,
+    `read` and `write` to use another storage.
+    """
+
+    def __init__(self, cache_dir: str = os.path.join("Data", "cache", "pipeline")) -> None:
+        """
+        Initializes the cache.
+        Args:
+            cache_dir (str, optional): The directory of the cached outputs.
+                Defaults to "Data/cache/pipeline".
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_path(self, stage: str, key: str) -> str:
+        """Returns the path of the cached output of a stage."""
+        extension = ".arrow" if stage == "cleaning" else ".jsonl"
+        return os.path.join(self.cache_dir, f"{stage}-{key[:16]}{extension}")
+
+    def has(self, stage: str, key: str) -> bool:
+        """Returns True if the output of the stage with this key is cached."""
+        return os.path.exists(self.get_path(stage, key))
+
+    def read(self, stage: str, key: str, chunksize: int = 10000) -> Iterator:
+        """Yields the cached output of a stage."""
+        path = self.get_path(stage, key)
+        if stage == "cleaning":
+            return read_file_chunks(path, chunksize=chunksize)
+        # the prepared records stay compact, their shared fields are not in the file
+        return iter_json_lines(path, expand=False)
+
+    def write(self, stage: str, key: str, items: Iterable) -> Iterator:
+        """
+        Passes the output of a stage through while writing it to the cache.
+        Args:
+            stage (str): The stage name.
+            key (str): The stage key, see `get_stage_key`.
+            items (Iterable): The DataFrame chunks or records produced by the stage.
+        Yields:
+            The items, unchanged.
+        """
+        path = self.get_path(stage, key)
+        tmp_path = f"{path}.tmp"
+        if stage == "cleaning":
+            with TableWriter(tmp_path, "arrow") as writer:
+                for chunk in items:
+                    writer.write(chunk)
+                    yield chunk
+        else:
+            with open(tmp_path, "wb") as f:
+                for record in items:
+                    f.write(json_dumps(record) + b"\n")
+                    yield record
+        os.replace(tmp_path, path)
+
+    def mark(self, stage: str, key: str):
+        """Records that a stage without an output to cache, e.g. the sink, completed."""
+        with open(os.path.join(self.cache_dir, f"{stage}-{key[:16]}.done"), "w", encoding="utf-8"):
+            pass
+
+    def is_marked(self, stage: str, key: str) -> bool:
+        """Returns True if `mark` was called for the stage with this key."""
+        return os.path.exists(os.path.join(self.cache_dir, f"{stage}-{key[:16]}.done"))
+
+
+class StageTimer:
+    """
+    Measures the time spent in every stage of a chain of generators.
+    Every stage is wrapped, so its measured time includes the time of the stages
+    it pulls from; the time of a stage is its time minus the one of its input.
+    """
+
+    def __init__(self) -> None:
+        """Initializes the timer with no stages."""
+        self.order = []
+        self.elapsed = {}
+        self.counts = {}
+
+    def wrap(self, stage: str, items: Iterable) -> Iterator:
+        """Registers a stage, in the order of the chain, and returns its timed items."""
+        self.order.append(stage)
+        self.elapsed[stage] = 0.0
+        self.counts[stage] = 0
+        return self.iterate(stage, items)
+
+    def iterate(self, stage: str, items: Iterable) -> Iterator:
+        """Yields the items of a stage while measuring the time spent producing them."""
+        iterator = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.elapsed[stage] += time.perf_counter() - start
+                return
+            self.elapsed[stage] += time.perf_counter() - start
+            # DataFrame chunks count as their number of rows
+            self.counts[stage] += len(item) if hasattr(item, "columns") else 1
+            yield item
+
+    def report(self, total: float):
+        """Prints the time and the throughput of every stage."""
+        print("\n[RESULT]:")
+        previous = 0.0
+        for stage in self.order:
+            own = max(self.elapsed[stage] - previous, 0.0)
+            previous = self.elapsed[stage]
+            rate = self.counts[stage] / own if own else 0.0
+            print(f"{stage:<12} time={own:8.2f}s items={self.counts[stage]:<8} items/sec={rate:.1f}")
+        sink = max(total - previous, 0.0)
+        print(f"{'saving':<12} time={sink:8.2f}s")
+        print(f"{'total':<12} time={total:8.2f}s")
+
+
+class PreprocessingPipeline:
+    """
+    Composes `DataCleaning`, `DataExtraction`, `DataPreparing` and `DataFormatting`
+    as streaming stages, from the raw CSV to the LLaMA-Factory train/val files.
+    The key of every stage depends on the hash of the input file and on the
+    configuration of the stage and of all stages before it, so a rerun resumes
+    from the last stage whose output is cached. Delete the cache directory after
+    changing the code of a stage.
+    """
+
+    def __init__(
+            self, input_path: str, text_column: str = "article", summary_column: str = "highlights",
+            chunksize: int = 10000, data_size: float = 0.2, text_length: int = 500,
+            all_cleaning: bool = False, deduplicate: bool = True, num_workers: int = 1,
+            save_path: str = "formatted",
+            train_size: int = 3000, val_size: int = 500, cache: Optional[StageCache] = None,
+            length_filter: Optional[TokenLengthFilter] = None
+    ) -> None:
+        """
+        Initializes the pipeline.
+        Args:
+            input_path (str): The raw CSV, Parquet or Arrow file.
+            text_column (str, optional): The column of the articles. Defaults to "article".
+            summary_column (str, optional): The column of the summaries. Defaults to "highlights".
+            chunksize (int, optional): The number of rows read at once. Defaults to 10000.
+            data_size (float, optional): The fraction of the rows to retain. Defaults to 0.2.
+            text_length (int, optional): Maximum length of the articles in words. Defaults to 500.
+            all_cleaning (bool, optional): If True, performs all cleaning steps. Defaults to False.
+            deduplicate (bool, optional): If True, removes the near-duplicate articles in the
+                cleaning stage, before the train/val split. Defaults to True.
+            num_workers (int, optional): The number of processes used to clean the text. Defaults to 1.
+            save_path (str, optional): The name of the formatted JSON lines file. Defaults to "formatted".
+            train_size (int, optional): The number of training records. Defaults to 3000.
+            val_size (int, optional): The number of validation records. Defaults to 500.
+            cache (StageCache, optional): The stage cache, None to always run every stage.
+            length_filter (TokenLengthFilter, optional): Drops or truncates the records over
+                the token budget of fine-tuning, None to skip the tokenizing stage.
+        """
+        self.input_path = input_path
+        self.chunksize = chunksize
+        self.cleaning_config = {
+            "text_column": text_column,
+            "summary_column": summary_column,
+            "data_size": data_size,
+            "text_length": text_length,
+            "all_cleaning": all_cleaning,
+            "deduplicate": deduplicate,
+        }
+        self.num_workers = num_workers
+        self.save_path = save_path
+        self.train_size = train_size
+        self.val_size = val_size
+        self.cache = cache
+        self.length_filter = length_filter
+        self.stages = STAGES if length_filter is None else STAGES[:-1] + (TOKENIZING_STAGE,) + STAGES[-1:]
+        # the prepared records are compact and only expanded by the formatting stage
+        self.preparing = DataPreparing(data_path=input_path, save_name="", compact=True)
+        self.formatting = DataFormatting(data_path=input_path, save_path=save_path)
+
+    def get_stage_configs(self) -> Dict[str, Dict]:
+        """Returns everything that changes the output of every stage."""
+        return {
+            # the sampling seed changes with every chunk, so the chunk size matters
+            "cleaning": {**self.cleaning_config, "chunksize": self.chunksize},
+            "extraction": {},
+            "preparing": {
+                "schema": TextSummarization.model_json_schema(), "compact": True, "shared_ref_key": SHARED_REF_KEY,
+            },
+            **({} if self.length_filter is None else {TOKENIZING_STAGE: {
+                "tokenizer": self.length_filter.tokenizer.name_or_path,
+                "cutoff_len": self.length_filter.cutoff_len,
+                "overflow": self.length_filter.overflow,
+            }}),
+            "formatting": {"system_message": self.formatting.system_message},
+            "saving": {"save_path": self.save_path, "train_size": self.train_size, "val_size": self.val_size},
+        }
+
+    def get_stage_keys(self) -> Dict[str, str]:
+        """Returns the cache key of every stage, chained from the hash of the input file."""
+        key = get_file_hash(self.input_path)
+        keys = {}
+        for stage, config in self.get_stage_configs().items():
+            key = get_stage_key(stage, config, key)
+            keys[stage] = key
+        return keys
+
+    def run_stage(self, stage: str, items: Iterable) -> Iterator:
+        """Applies one stage to the stream of its input."""
+        if stage == "cleaning":
+            return iter_clean_chunks(items, num_workers=self.num_workers, **self.cleaning_config)
+        if stage == "extraction":
+            return self.extract(items)
+        if stage == "preparing":
+            return self.preparing.prepare_records(items)
+        shared = self.preparing.get_shared_fields()
+        if stage == TOKENIZING_STAGE:
+            return self.length_filter.filter_records(items, shared=shared)
+        return (self.formatting.format_record(expand_record(rec, shared)) for rec in items)
+
+    def extract(self, chunks: Iterable) -> Iterator[Dict]:
+        """Yields the records of every cleaned chunk, with ids continued across chunks."""
+        count = 0
+        for chunk in chunks:
+            extractor = DataExtraction(
+                df=chunk, text_column=self.cleaning_config["text_column"],
+                summary_column=self.cleaning_config["summary_column"], overwrite=True,
+            )
+            yield from extractor.iter_text(start_id=count)
+            count += len(chunk)
+
+    def run(self):
+        """Runs the stages that are not cached and saves the train/val files."""
+        start = time.perf_counter()
+        keys = self.get_stage_keys()
+        if self.cache is not None and self.cache.is_marked("saving", keys["saving"]):
+            print("[INFO] Every stage is cached and the output is up to date, nothing to run.")
+            return
+
+        # resume from the output of the last cached stage
+        first = 0
+        items = None
+        if self.cache is not None:
+            for i in reversed(range(len(self.stages))):
+                stage = self.stages[i]
+                if self.cache.has(stage, keys[stage]):
+                    print(f"[INFO] Using the cached output of the {stage} stage.")
+                    items = self.cache.read(stage, keys[stage], self.chunksize)
+                    first = i + 1
+                    break
+
+        if items is None:
+            items = read_file_chunks(self.input_path, self.chunksize, print_log=True)
+        timer = StageTimer()
+        items = timer.wrap("reading", items)
+        for stage in self.stages[first:]:
+            items = self.run_stage(stage, items)
+            if self.cache is not None:
+                items = self.cache.write(stage, keys[stage], items)
+            items = timer.wrap(stage, items)
+
+        self.formatting.save_stream(items, self.train_size, self.val_size)
+        if self.cache is not None:
+            self.cache.mark("saving", keys["saving"])
+        timer.report(time.perf_counter() - start)
+
+
+def main():
+    """Runs the whole preprocessing pipeline on the CNN/DailyMail train set."""
+    print("[INFO] Starting preprocessing pipeline...")
+    pipeline = PreprocessingPipeline(
+        input_path=os.path.join("Data", "raw", "cnn_dailymail", "train.csv"),
+        chunksize=10000,
+        data_size=0.2,
+        text_length=500,
+        all_cleaning=False,  # only limit sentence length
+        num_workers=mp.cpu_count(),
+        cache=StageCache(),
+        length_filter=TokenLengthFilter(
+            cutoff_len=3500,  # cutoff_len of the fine-tuning config
+            overflow="truncate",
+        ),
+    )
+    pipeline.run()
+    print("[INFO] Preprocessing pipeline completed successfully.")
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.data_preprocessing.pipeline
@@ -0,0 +1,176 @@
+"""
+Exact token lengths of the fine-tuning records, filtering of the records over the
+`cutoff_len` budget and the padding saved by length-grouped batches.
+"""
+
+import os
+import random
+from typing import Dict, Iterable, Iterator, List, Optional
+import numpy as np
+from transformers import AutoTokenizer
+from src.utils.file_utils import (
+    expand_record, iter_json_lines, read_shared_fields, save_json_file
+)
+from src.data_preprocessing.data_formatting import DataFormatting
+
+OVERFLOW_POLICIES = ("drop", "truncate")
+
+
+class TokenLengthFilter:
+    """
+    Computes the prompt and response token lengths of prepared records exactly as
+    they are seen in fine-tuning: formatted by `DataFormatting` and rendered with the
+    chat template of the tokenizer. The records are tokenized in batches with the
+    fast tokenizer, which encodes a batch in parallel.
+    """
+
+    def __init__(
+            self, tokenizer_id: str = "Qwen/Qwen2.5-0.5B-Instruct", cutoff_len: int = 3500,
+            overflow: str = "drop", batch_size: int = 256, print_log: bool = True
+    ) -> None:
+        """
+        Initializes the filter.
+        Args:
+            tokenizer_id (str, optional): The tokenizer of the fine-tuned model.
+                Defaults to "Qwen/Qwen2.5-0.5B-Instruct".
+            cutoff_len (int, optional): The maximum number of prompt and response tokens,
+                the `cutoff_len` of the fine-tuning config. Defaults to 3500.
+            overflow (str, optional): "drop" removes the records over the budget,
+                "truncate" shortens their text to fit. Defaults to "drop".
+            batch_size (int, optional): The number of records tokenized at once. Defaults to 256.
+            print_log (bool, optional): If True, prints log messages. Defaults to True.
+        Attributes:
+            stats (dict): The number of kept, truncated and dropped records.
+            lengths (List[int]): The total token length of every kept record, in order.
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow}, expected one of {OVERFLOW_POLICIES}")
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_id, cache_dir="models/cache")
+        self.cutoff_len = cutoff_len
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self.print_log = print_log
+        self.formatter = DataFormatting(data_path="", save_path="")
+        self.stats = {"kept": 0, "truncated": 0, "dropped": 0}
+        self.lengths: List[int] = []
+
+    def get_lengths(self, records: List[Dict]) -> np.ndarray:
+        """
+        Returns the prompt and response token lengths of prepared records.
+        The prompt is the system message and the instruction rendered with the chat
+        template up to the assistant turn, the response is the rest of the conversation.
+        Args:
+            records (List[Dict]): The prepared (expanded) records.
+        Returns:
+            np.ndarray: The lengths, of shape (len(records), 2).
+        """
+        prompts, responses = [], []
+        for record in records:
+            formatted = self.formatter.format_record(record)
+            messages = [
+                {"role": "system", "content": formatted["system"]},
+                {"role": "user", "content": formatted["instruction"] + formatted["input"]},
+            ]
+            prompt = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+            conversation = self.tokenizer.apply_chat_template(
+                messages + [{"role": "assistant", "content": formatted["output"]}], tokenize=False
+            )
+            prompts.append(prompt)
+            # like LLaMA-Factory, the prompt and the response are encoded separately
+            responses.append(conversation[len(prompt):] if conversation.startswith(prompt) else formatted["output"])
+
+        encoded = self.tokenizer(prompts + responses, add_special_tokens=False)["input_ids"]
+        lengths = np.array([len(ids) for ids in encoded]).reshape(2, len(records))
+        return lengths.T
+
+    def truncate(self, record: Dict, excess: int) -> Optional[Dict]:
+        """Returns the record with `excess` fewer text tokens, or None if nothing is left."""
+        text_ids = self.tokenizer(record["text"], add_special_tokens=False)["input_ids"]
+        if excess >= len(text_ids):
+            return None
+        return {**record, "text": self.tokenizer.decode(text_ids[:len(text_ids) - excess])}
+
+    def filter_records(self, records: Iterable[Dict], shared: Optional[Dict] = None) -> Iterator[Dict]:
+        """
+        Yields the records that fit in `cutoff_len`, truncated if the policy allows it.
+        Args:
+            records (Iterable[Dict]): The prepared records, compact or not.
+            shared (Dict, optional): The shared fields of compact records.
+        Yields:
+            dict: The kept records, in the same format as the input.
+        """
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == self.batch_size:
+                yield from self.filter_batch(batch, shared or {})
+                batch = []
+        if batch:
+            yield from self.filter_batch(batch, shared or {})
+        if self.print_log:
+            print(f"[INFO] Token length filter: {self.stats}")
+
+    def filter_batch(self, batch: List[Dict], shared: Dict) -> List[Dict]:
+        """Filters one batch of records and records the lengths of the kept ones."""
+        expanded = [expand_record(record, shared) for record in batch]
+        lengths = self.get_lengths(expanded)
+
+        kept = []
+        for record, full, (prompt_len, response_len) in zip(batch, expanded, lengths):
+            truncated = False
+            excess = prompt_len + response_len - self.cutoff_len
+            if excess > 0 and self.overflow == "truncate":
+                shortened = self.truncate(record, excess)
+                if shortened is not None:
+                    # decoding and re-encoding can merge tokens differently, check again
+                    prompt_len, response_len = self.get_lengths([{**full, "text": shortened["text"]}])[0]
+                    if prompt_len + response_len <= self.cutoff_len:
+                        record, truncated = shortened, True
+            if prompt_len + response_len > self.cutoff_len:
+                self.stats["dropped"] += 1
+                continue
+
+            self.stats["kept"] += 1
+            self.stats["truncated"] += truncated
+            kept.append(record)
+            self.lengths.append(int(prompt_len + response_len))
+        return kept
+
+
+def get_padding_ratio(lengths: List[int], batches: List[List[int]]) -> float:
+    """Returns the fraction of padding tokens when every batch is padded to its longest record."""
+    lengths = np.asarray(lengths)
+    padded = sum(int(lengths[batch].max()) * len(batch) for batch in batches)
+    return 1 - lengths.sum() / padded if padded else 0.0
+
+
+def main():
+    """Filters the prepared records by token length and reports the padding saved by `group_by_length`."""
+    print("[INFO] Starting token length filtering...")
+    data_path = os.path.join("Data", "annotations", "prepared_data.jsonl")
+    batch_size = 4  # per_device_train_batch_size of the fine-tuning config
+
+    length_filter = TokenLengthFilter(cutoff_len=3500, overflow="truncate")
+    shared = read_shared_fields(data_path)
+    records = length_filter.filter_records(iter_json_lines(data_path, expand=False), shared=shared)
+    save_json_file("prepared_data_filtered", records, shared=shared)
+
+    lengths = length_filter.lengths
+    order = list(range(len(lengths)))
+    random.Random(42).shuffle(order)
+    random_batches = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+    # what `group_by_length` of the fine-tuning config does, up to its mega-batches
+    order = np.argsort(lengths, kind="stable").tolist()
+    sorted_batches = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+    print("\n[RESULT]:")
+    print(f"records: {length_filter.stats}")
+    print(f"tokens: mean={np.mean(lengths):.1f} max={np.max(lengths)}")
+    print(f"padding random batches: {get_padding_ratio(lengths, random_batches):.1%}")
+    print(f"padding length-grouped batches: {get_padding_ratio(lengths, sorted_batches):.1%}")
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.data_preprocessing.token_lengths
@@ -2,10 +2,20 @@
 
 import os
 import json
-from typing import Optional
+import time
+import asyncio
+from typing import Dict, List, Optional
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import (
+    APIConnectionError, APIStatusError, APITimeoutError, AsyncOpenAI, DefaultAsyncHttpxClient,
+    InternalServerError, OpenAI, RateLimitError
+)
 from src.tasks import text_summarization
+from src.evaluation.rouge import corpus_rouge
+from src.utils.cache_utils import SummaryCache, get_cache_key
+from src.utils.json_utils import get_output_summary, read_finetune_records
+from src.utils.rate_limit_utils import TokenBucket, get_backoff_delay
 
 load_dotenv(dotenv_path=".env", override=True, verbose=True)
 
@@ -51,6 +61,159 @@ class OpenAIModel:
         return chat_completion
 
 
+# the errors that can succeed when the same request is sent again
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+
+class AsyncOpenAIModel:
+    """
+    Asyncio variant of `OpenAIModel` that sends many requests concurrently.
+    All requests share one pooled HTTP client. The number of requests in flight is
+    bounded by a semaphore, their rate by a token bucket, and the failed requests
+    are retried with exponential backoff. The responses can be cached on disk so
+    that an interrupted evaluation run does not pay again for the finished requests.
+    """
+    def __init__(
+            self, temp: Optional[float], model: Optional[str]=None,
+            url: Optional[str]=None, key: Optional[str]=None,
+            max_concurrency: int = 16, requests_per_second: float = 0.0,
+            max_retries: int = 5, timeout: float = 120.0,
+            cache: Optional[SummaryCache] = None
+    ) -> None:
+        """Initialize AsyncOpenAIModel with the model and the client limits.
+        Args:
+            temp (Optional[float]): Temperature for the model.
+            model (Optional[str]): Model ID to be used for evaluation.
+            url (Optional[str]): Base URL for the model.
+            key (Optional[str]): API key for authentication.
+            max_concurrency (int): Maximum number of requests in flight. Defaults to 16.
+            requests_per_second (float): Maximum mean request rate, 0 for no limit. Defaults to 0.
+            max_retries (int): Number of retries of a failed request. Defaults to 5.
+            timeout (float): Timeout of a request in seconds. Defaults to 120.
+            cache (Optional[SummaryCache]): Cache of the responses, None to disable it.
+        """
+        print("\n[INFO] Initializing Async OpenAI Model...")
+        self.model_id = model
+        self.base_url = url
+        self.key = key
+        self.temp = temp
+        self.max_retries = max_retries
+        self.cache = cache
+        self.cache_config = {"model": model, "base_url": url, "temperature": temp}
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.bucket = TokenBucket(requests_per_second)
+        # the SDK retries are disabled, the retries are done here with the rate limit
+        self.openai_client = AsyncOpenAI(
+            base_url=self.base_url,
+            api_key=self.key,
+            max_retries=0,
+            timeout=timeout,
+            http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(
+                max_connections=max_concurrency, max_keepalive_connections=max_concurrency
+            )),
+        )
+
+    async def get_response(self, message) -> str:
+        """Get the response content of the model, from the cache if it is there.
+        Args:
+            message (list): List of messages to be sent to the model.
+        Returns:
+            str: Content of the response.
+        Raises:
+            openai.OpenAIError: If the request still fails after `max_retries` retries.
+        """
+        key = get_cache_key(json.dumps(message, ensure_ascii=False), self.cache_config)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.bucket.acquire()
+                self.stats["requests"] += 1
+                try:
+                    chat_completion = await self.openai_client.chat.completions.create(
+                        model=self.model_id, #type: ignore
+                        messages=message,
+                        temperature=self.temp,
+                    )
+                    break
+                except RETRYABLE_ERRORS as error:
+                    if attempt == self.max_retries:
+                        raise
+                    retry_after = None
+                    if isinstance(error, APIStatusError):
+                        try:
+                            retry_after = float(error.response.headers.get("retry-after", ""))
+                        except ValueError:
+                            pass
+                    self.stats["retries"] += 1
+                    await asyncio.sleep(get_backoff_delay(attempt, retry_after=retry_after))
+
+        choice = chat_completion.choices[0]
+        content = choice.message.content or ""
+        # a response cut by the length limit or a content filter is not cached
+        if self.cache is not None and content and choice.finish_reason == "stop":
+            self.cache.put(key, content)
+        return content
+
+    async def get_responses(self, messages: List) -> List[Optional[str]]:
+        """Get the response contents of many messages concurrently.
+        Args:
+            messages (List): The messages, each one as accepted by `get_response`.
+        Returns:
+            List[Optional[str]]: One content per message, None for the failed requests.
+        """
+        results = await asyncio.gather(
+            *(self.get_response(message) for message in messages), return_exceptions=True
+        )
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                print(f"[ERROR] Request {i} failed: {result!r}")
+                self.stats["failures"] += 1
+                results[i] = None
+        return results
+
+    async def close(self):
+        """Closes the pooled HTTP client."""
+        await self.openai_client.close()
+
+
+async def evaluate_openai_model(model: AsyncOpenAIModel, data_path: str, limit: int = 0) -> Dict:
+    """Evaluate the model on a LLaMA-Factory file with concurrent requests.
+    Args:
+        model (AsyncOpenAIModel): The model to evaluate.
+        data_path (str): The LLaMA-Factory JSON file, e.g. the validation set.
+        limit (int): The number of records to evaluate, 0 for all. Defaults to 0.
+    Returns:
+        dict: The mean ROUGE scores of the answered records and the throughput.
+    """
+    records = read_finetune_records(data_path, limit=limit)
+    messages = [text_summarization.get_message(rec["text"]) for rec in records]
+
+    start = time.perf_counter()
+    try:
+        responses = await model.get_responses(messages)
+    finally:
+        await model.close()
+    elapsed = time.perf_counter() - start
+
+    answered = [(get_output_summary(response), rec["summary"])
+                for response, rec in zip(responses, records) if response is not None]
+    return {
+        "num_records": len(records),
+        "num_answered": len(answered),
+        **corpus_rouge([a[0] for a in answered], [a[1] for a in answered]),
+        "elapsed": elapsed,
+        "records_per_sec": len(records) / elapsed if elapsed else 0.0,
+        **model.stats,
+        **(model.cache.stats() if model.cache is not None else {}),
+    }
+
+
 def test_openai_model():
     """Test OpenAI Model."""
     print("\n[INFO] Testing OpenAI Model...")
@@ -83,10 +246,37 @@ def test_openai_model():
 
 
 
+def test_async_openai_model():
+    """Evaluate the OpenAI Model on the validation set with concurrent requests."""
+    print("\n[INFO] Testing Async OpenAI Model...")
+
+    cache_path = os.getenv("EVAL_CACHE_PATH", os.path.join("Data", "cache", "openai_responses.sqlite"))
+    model = AsyncOpenAIModel(
+        temp=0.2,
+        model=os.getenv("MODEL_ID"),
+        url=os.getenv("BASE_URL"),
+        key=os.environ.get('OPENROUTER_API_KEY'),
+        max_concurrency=int(os.getenv("EVAL_CONCURRENCY", "16")),
+        requests_per_second=float(os.getenv("EVAL_REQUESTS_PER_SECOND", "0")),
+        max_retries=int(os.getenv("EVAL_MAX_RETRIES", "5")),
+        cache=SummaryCache(ttl=None, db_path=cache_path) if cache_path else None,
+    )
+    report = asyncio.run(evaluate_openai_model(
+        model,
+        data_path=os.getenv("EVAL_DATA", "Data/datasets/llamafactory-finetune-data/val.json"),
+        limit=int(os.getenv("EVAL_LIMIT", "0")),
+    ))
+
+    print("\n[RESULT]:")
+    for key, value in report.items():
+        print(f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}")
+
+
 def main():
     """Main function to run the OpenAI model evaluation."""
     print("\n[INFO] Starting OpenAI Model Evaluation...")
-    test_openai_model()
+    # test_openai_model()
+    test_async_openai_model()
     print("\n[INFO] OpenAI Model Evaluation Completed.")
 
 
@@ -4,14 +4,27 @@ rephrasing refinement, and sentiment analysis using Hugging Face's `transformers
 """
 
 import os
-import torch
+import copy
 import json
-from transformers import AutoModelForCausalLM, AutoTokenizer
+import queue
+from threading import Thread
+from typing import Optional
+import torch
+from transformers import (
+    AutoModelForCausalLM, AutoTokenizer, DynamicCache, LogitsProcessorList,
+    StoppingCriteriaList, TextIteratorStreamer
+)
 # from src.pydantic_models.textsummarization import TextSummarization
 from src.pydantic_models.text_summarization import TextSummarization
 from dotenv import load_dotenv
 from src.tasks import text_summarization
-load_dotenv(dotenv_path=".env", override=True, verbose=True)
+from src.utils.logits_processors import BannedUnicodeLogitsProcessor
+from src.utils.backend_utils import apply_backend, configure_threads, get_load_kwargs, resolve_backend
+from src.utils.generation_utils import (
+    CancelStoppingCriteria, GenerationTimer, JsonBlockStoppingCriteria, get_generation_budget, get_schema_max_length
+)
+from src.utils.snapshot_utils import resolve_snapshot
+from src.utils.timing_utils import PhaseTimer, RequestTimer, get_phase
 
 
 class TransformersModel:
@@ -19,39 +32,101 @@ class TransformersModel:
     A class for handling transformer-based models for text generation tasks.
     """
 
-    def __init__(self, model_id: str, temp: float, print_logs=False) -> None:
+    def __init__(
+            self, model_id: str, temp: float, print_logs=False, banned_ranges=None,
+            backend: str = "default", num_threads=None, num_interop_threads=None,
+            shared_weights: bool = False, startup_timer: Optional[PhaseTimer] = None
+    ) -> None:
         """
         Initializes the evaluation class for transformer models.
         Args:
             model_id (str): The identifier for the pre-trained transformer model.
             temp (float): The temperature parameter for controlling randomness in model outputs.
             print_logs (bool, optional): Flag to enable or disable logging. Defaults to False.
+            banned_ranges (list, optional): Inclusive Unicode code point ranges whose
+                tokens are banned during generation. Defaults to the CJK ideograph blocks.
+            backend (str, optional): The inference backend, one of "default" (full precision,
+                `device_map="auto"`), "cpu_fp32", "cpu_bf16" (falls back to fp32 if the CPU
+                has no bf16 support) or "cpu_int8" (dynamic int8 quantization of the linear
+                layers). Defaults to "default".
+            num_threads (int, optional): The number of torch intra-op threads.
+            num_interop_threads (int, optional): The number of torch inter-op threads.
+            shared_weights (bool, optional): If True, `model_id` is a directory exported with
+                `src.inference.shared_weights` and its weights are memory-mapped instead of
+                copied, so that processes loading it share one copy. Defaults to False.
+            startup_timer (PhaseTimer, optional): Records the "weights", "tokenizer", "mask",
+                "adapter" and "warmup" phases. Defaults to a new timer.
         Attributes:
             model_id (str): The identifier for the pre-trained transformer model.
             temp (float): The temperature parameter for controlling randomness in model outputs.
             print_logs (bool): Flag to enable or disable logging.
             model (AutoModelForCausalLM): The loaded transformer model for causal language modeling.
             tokenizer (AutoTokenizer): The tokenizer associated with the transformer model.
+            backend (str): The resolved inference backend.
+            adapter_ids (list): The adapters loaded or merged into the model.
+            max_new_tokens (int): The hard upper limit of generated tokens,
+                see `set_generation_limits` for the other limits.
+            assisted_decoding (str): The assisted decoding mode, see `set_assisted_decoding`.
+            logits_processor (BannedUnicodeLogitsProcessor): Bans the tokens in `banned_ranges`.
+            prefix_ids (torch.Tensor): The token ids of the shared prompt prefix, if any.
+            prefix_cache (DynamicCache): The `past_key_values` of the shared prompt prefix.
+            request_timer (RequestTimer): Records the stages, token counts and generation
+                timings of the current request, None to disable the instrumentation.
         """
 
         self.model_id = model_id
         self.temp = temp
+        self.startup_timer = startup_timer or PhaseTimer()
         self.print_logs = print_logs
-        self.mask = None
-        print(f"[INFO] Initializing Model {self.model_id}...")
-        self.model = AutoModelForCausalLM.from_pretrained(
-            pretrained_model_name_or_path=self.model_id,
-            cache_dir=r"models/cache",
-            device_map="auto",
-            force_download=False,
-        )
+        self.prefix_ids = None
+        self.prefix_cache = None
+        self.adapter_ids = []
+        self.max_new_tokens = 2000
+        self.budget_ratio = 0.5
+        self.min_new_tokens = 64
+        self.max_time = None
+        self.stop_at_json = True
+        self.assisted_decoding = "none"
+        self.num_assistant_tokens = 10
+        self.draft_model_id = ""
+        self.assistant_model = None
+        self.request_timer: Optional[RequestTimer] = None
+        configure_threads(num_threads, num_interop_threads)
+        self.backend = resolve_backend(backend)
+        print(f"[INFO] Initializing Model {self.model_id} ({self.backend} backend)...")
+        with self.startup_timer.phase("weights"):
+            # a local snapshot directory loads without any Hub request
+            self.model_path = resolve_snapshot(self.model_id)
+            if shared_weights:
+                # only the workers sharing an exported file need it
+                from src.inference.shared_weights import load_shared_model
+
+                # the dtype is the one of the export, cpu_int8 quantizes into private copies
+                self.model = load_shared_model(self.model_path)
+            else:
+                self.model = AutoModelForCausalLM.from_pretrained(
+                    pretrained_model_name_or_path=self.model_path,
+                    **get_load_kwargs(self.backend),
+                )
+            self.model = apply_backend(self.model, self.backend)
 
         print("[INFO] Initializing Tokenizer...")
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            pretrained_model_name_or_path=self.model_id,
-            cache_dir=r"models/cache",
-            force_download=False,
-        )
+        with self.startup_timer.phase("tokenizer"):
+            self.tokenizer = AutoTokenizer.from_pretrained(
+                pretrained_model_name_or_path=self.model_path,
+            )
+            # decoder-only models must be left-padded for batched generation
+            self.tokenizer.padding_side = "left"
+
+        print("[INFO] Initializing Logits Processor...")
+        with self.startup_timer.phase("mask"):
+            self.logits_processor = BannedUnicodeLogitsProcessor(
+                tokenizer=self.tokenizer,
+                vocab_size=self.model.config.vocab_size,
+                banned_ranges=banned_ranges,
+                cache_dir=r"models/cache",
+                print_logs=self.print_logs,
+            )
 
     def get_chat_template(self, message: list):
         """
@@ -69,17 +144,19 @@ class TransformersModel:
 
         if self.print_logs:
             print("[INFO] Applying Chat Template...")
-        return self.tokenizer.apply_chat_template(
-            conversation=message,
-            add_generation_prompt=True,
-            tokenize=False,
-        )
+        with self.span("get_chat_template"):
+            return self.tokenizer.apply_chat_template(
+                conversation=message,
+                add_generation_prompt=True,
+                tokenize=False,
+            )
 
     def get_input_tokens(self, text):
         """
         Converts the input text into tokenized format suitable for transformer models.
         Args:
-            text (str): The input text to be tokenized.
+            text (str | list): The input text to be tokenized, or a list of texts
+                to be tokenized as one left-padded batch.
         Returns:
             torch.Tensor: A tensor containing the tokenized representation of the input text,
             prepared for processing by transformer models. The tensor is moved to the device
@@ -90,13 +167,257 @@ class TransformersModel:
 
         if self.print_logs:
             print("[INFO] Getting Input Tokens...")
-        return self.tokenizer(
-            text=[text],
-            return_tensors="pt",
-            padding=True,
-        ).to(
-            os.getenv("DEVICE")
-        )  # type: ignore
+        with self.span("get_input_tokens"):
+            return self.tokenizer(
+                text=text if isinstance(text, list) else [text],
+                return_tensors="pt",
+                padding=True,
+            ).to(
+                os.getenv("DEVICE")
+            )  # type: ignore
+
+    def get_input_tokens_from_ids(self, input_ids: list):
+        """
+        Pads already tokenized prompts into a batch suitable for transformer models.
+        Args:
+            input_ids (list): A list of token id lists, e.g. built with
+                `text_summarization.get_input_ids`.
+        Returns:
+            BatchEncoding: The left-padded `input_ids` and `attention_mask` tensors,
+            moved to the device specified by the "DEVICE" environment variable.
+        """
+
+        if self.print_logs:
+            print("[INFO] Padding Input Tokens...")
+        with self.span("get_input_tokens"):
+            return self.tokenizer.pad(
+                {"input_ids": input_ids},
+                padding=True,
+                return_tensors="pt",
+            ).to(
+                os.getenv("DEVICE")
+            )  # type: ignore
+
+    def set_prefix_cache(self, prefix_ids: list):
+        """
+        Computes the `past_key_values` of a prompt prefix shared by all requests.
+        Prompts starting with these tokens reuse a copy of the cache instead of
+        re-encoding the prefix, which reduces the time to first token.
+        Args:
+            prefix_ids (list): The token ids of the shared prefix,
+                e.g. from `text_summarization.get_prefix_ids`.
+        Returns:
+            None
+        """
+
+        if self.print_logs:
+            print("[INFO] Computing Prefix Cache...")
+        self.prefix_ids = torch.tensor([prefix_ids], device=self.model.device)
+        with torch.no_grad():
+            self.prefix_cache = self.model(
+                input_ids=self.prefix_ids,
+                past_key_values=DynamicCache(),
+                use_cache=True,
+            ).past_key_values
+
+    def get_prefix_kwargs(self, input_tokens) -> dict:
+        """
+        Returns the `generate` keyword arguments that reuse the prefix cache.
+        The cache is only reused when every prompt of the batch starts with the
+        cached prefix without padding, since left padding would shift its positions.
+        Args:
+            input_tokens (BatchEncoding): The tokenized prompts.
+        Returns:
+            dict: `{"past_key_values": ...}` holding a copy of the prefix cache,
+            or an empty dict if the cache cannot be used.
+        """
+
+        if self.prefix_cache is None:
+            return {}
+
+        input_ids = input_tokens.input_ids
+        prefix_len = self.prefix_ids.size(-1)  # type: ignore
+        if (
+            input_ids.size(-1) <= prefix_len
+            or not bool(input_tokens.attention_mask.all())
+            or not torch.equal(
+                input_ids[:, :prefix_len],
+                self.prefix_ids.to(input_ids.device).expand(input_ids.size(0), -1),  # type: ignore
+            )
+        ):
+            return {}
+
+        cache = copy.deepcopy(self.prefix_cache)
+        if input_ids.size(0) > 1:
+            cache.batch_repeat_interleave(input_ids.size(0))
+        return {"past_key_values": cache}
+
+    def set_assisted_decoding(
+            self, mode: str = "prompt_lookup", num_assistant_tokens: int = 10,
+            draft_model_id: str = ""
+    ):
+        """
+        Enables assisted (speculative) decoding.
+        A cheap draft proposes several tokens and the model verifies all of them in
+        a single forward pass, keeping the longest accepted run. With greedy decoding
+        the output is identical to plain decoding, only faster.
+        Args:
+            mode (str, optional): "none", "prompt_lookup" (copies n-gram continuations
+                from the source article, which suits extractive news summaries) or
+                "draft_model" (a smaller model sharing the tokenizer). Defaults to "prompt_lookup".
+            num_assistant_tokens (int, optional): The number of tokens proposed per step.
+                Defaults to 10.
+            draft_model_id (str, optional): The draft model for the "draft_model" mode.
+        Returns:
+            None
+        Raises:
+            ValueError: If the mode is unknown or the draft model is missing.
+        """
+
+        if mode not in ("none", "prompt_lookup", "draft_model"):
+            raise ValueError(f"Unknown assisted decoding mode {mode}")
+        if mode == "draft_model" and not draft_model_id:
+            raise ValueError("The draft_model mode requires a draft_model_id")
+
+        print(f"[INFO] Assisted Decoding: {mode}...")
+        self.assisted_decoding = mode
+        self.num_assistant_tokens = num_assistant_tokens
+        self.draft_model_id = draft_model_id if mode == "draft_model" else ""
+        self.assistant_model = None
+        if mode == "draft_model":
+            self.assistant_model = apply_backend(
+                AutoModelForCausalLM.from_pretrained(
+                    pretrained_model_name_or_path=draft_model_id,
+                    cache_dir=r"models/cache",
+                    force_download=False,
+                    **get_load_kwargs(self.backend),
+                ),
+                self.backend,
+            )
+
+    def get_assisted_kwargs(self, input_tokens) -> dict:
+        """
+        Returns the `generate` keyword arguments of the assisted decoding mode.
+        Assisted generation only supports one sequence at a time, so batched
+        inputs fall back to plain decoding.
+        Args:
+            input_tokens (BatchEncoding): The tokenized prompts.
+        Returns:
+            dict: The assisted decoding parameters, or an empty dict.
+        """
+
+        if self.assisted_decoding == "none" or input_tokens.input_ids.size(0) != 1:
+            return {}
+        if self.assisted_decoding == "prompt_lookup":
+            return {"prompt_lookup_num_tokens": self.num_assistant_tokens}
+        self.assistant_model.generation_config.num_assistant_tokens = self.num_assistant_tokens  # type: ignore
+        return {"assistant_model": self.assistant_model}
+
+    def set_generation_limits(
+            self, max_new_tokens: int = 2000, budget_ratio: float = 0.5,
+            min_new_tokens: int = 64, max_time=None, stop_at_json: bool = True
+    ):
+        """
+        Sets the limits that bound the length and the duration of a generation.
+        The budget of every `generate` call is computed from the input length and the
+        schema `max_length` instead of always allowing `max_new_tokens` tokens.
+        Args:
+            max_new_tokens (int, optional): The hard upper limit of new tokens. Defaults to 2000.
+            budget_ratio (float, optional): The maximum summary length as a fraction of
+                the text length, 0 disables the length-aware budget. Defaults to 0.5.
+            min_new_tokens (int, optional): The smallest length-aware budget. Defaults to 64.
+            max_time (float, optional): The maximum number of seconds of a generation.
+                Defaults to None (no limit).
+            stop_at_json (bool, optional): If True, a sequence stops as soon as its
+                JSON answer is complete. Defaults to True.
+        Returns:
+            None
+        """
+
+        self.max_new_tokens = max_new_tokens
+        self.budget_ratio = budget_ratio
+        self.min_new_tokens = min_new_tokens
+        self.max_time = max_time
+        self.stop_at_json = stop_at_json
+
+    def get_max_new_tokens(self, input_tokens) -> int:
+        """
+        Returns the generation budget of a batch.
+        The text length is the longest prompt minus the static prompt prefix, whether
+        or not the prefix cache is used, so both modes get the same budget.
+        Args:
+            input_tokens (BatchEncoding): The tokenized prompts.
+        Returns:
+            int: The number of new tokens allowed.
+        """
+
+        if not self.budget_ratio:
+            return self.max_new_tokens
+        text_tokens = int(input_tokens.attention_mask.sum(-1).max())
+        text_tokens -= len(text_summarization.get_prefix_ids(self.tokenizer))
+        return get_generation_budget(
+            text_tokens=text_tokens,
+            max_summary_chars=get_schema_max_length(),
+            budget_ratio=self.budget_ratio,
+            min_new_tokens=self.min_new_tokens,
+            max_new_tokens=self.max_new_tokens,
+        )
+
+    def get_generate_kwargs(self, input_tokens) -> dict:
+        """
+        Returns the keyword arguments passed to `model.generate` for the given inputs.
+        Args:
+            input_tokens (BatchEncoding): A batch of input tokens containing `input_ids`
+                and `attention_mask` attributes.
+        Returns:
+            dict: The generation parameters, including the assisted decoding or, for
+            plain decoding, the prefix cache if it applies.
+        """
+
+        assisted_kwargs = self.get_assisted_kwargs(input_tokens)
+        return {
+            **input_tokens,
+            "max_new_tokens": self.get_max_new_tokens(input_tokens),
+            "max_time": self.max_time,
+            "temperature": 0.1,
+            "pad_token_id": self.tokenizer.pad_token_id,
+            # ban the Chinese tokens with the precomputed mask
+            "logits_processor": LogitsProcessorList([self.logits_processor]),
+            "stopping_criteria": StoppingCriteriaList(
+                ([JsonBlockStoppingCriteria(self.tokenizer, input_tokens.input_ids.size(-1))]
+                 if self.stop_at_json else [])
+                # last, so that it sees the final step of every generate call
+                + ([GenerationTimer(input_tokens.input_ids.size(-1))]
+                   if self.request_timer is not None else [])
+            ),
+            # the assisted paths do not handle a prefilled cache correctly and change
+            # the greedy output, so the prefix cache is only used for plain decoding
+            **(assisted_kwargs or self.get_prefix_kwargs(input_tokens)),
+        }
+
+    def get_generation_config(self) -> dict:
+        """
+        Returns everything that determines the generated response for a given prompt.
+        It is used to key caches of generated responses.
+        Returns:
+            dict: The model id, adapters, backend and generation parameters.
+        """
+
+        return {
+            "model_id": self.model_id,
+            "adapters": list(self.adapter_ids),
+            "backend": self.backend,
+            "max_new_tokens": self.max_new_tokens,
+            "max_time": self.max_time,
+            "budget_ratio": self.budget_ratio,
+            "min_new_tokens": self.min_new_tokens,
+            "stop_at_json": self.stop_at_json,
+            "assisted_decoding": self.assisted_decoding,
+            "num_assistant_tokens": self.num_assistant_tokens,
+            "draft_model_id": self.draft_model_id,
+            "temperature": 0.1,
+            "banned_ranges": self.logits_processor.banned_ranges,
+        }
 
     def get_output_tokens(self, input_tokens):
         """
@@ -109,53 +430,24 @@ class TransformersModel:
             generated by the model and excludes the input tokens.
         """
 
-        def logits_processor(token_ids, logits):
-            """A processor to ban Chinese character"""
-            if self.mask is None:
-                # as we don't know where the Chinses tokens locate at which index
-                # in the vocabulary but we know how it looks like and the range of it
-
-                # decode all the tokens in the vocabulary in order
-                token_ids = torch.arange(logits.size(-1))
-                decoded_tokens = self.tokenizer.batch_decode(
-                    token_ids.unsqueeze(1), skip_special_tokens=True
-                )
-
-                # create a mask tensor to exclude positions of Chinese characters.
-                # since this process uses a for loop and is time-consuming,
-                # the result will be stored as a property for later use to ensure it only runs once.
-                self.mask = torch.tensor(
-                    [
-                        # loop through each token in the vocabulary and compare it to Chinese characters.
-                        any(
-                            0x4E00 <= ord(c) <= 0x9FFF
-                            or 0x3400 <= ord(c) <= 0x4DBF
-                            or 0xF900 <= ord(c) <= 0xFAFF
-                            for c in token
-                        )
-                        for token in decoded_tokens
-                    ]
-                )
-
-            # mask the score by - inf
-            logits[:, self.mask] = -float("inf")
-            return logits
-
         if self.print_logs:
             print("[INFO] Generating Ouput Tokens...")
 
-        generated_ids = self.model.generate(
-            **input_tokens,
-            max_new_tokens=2000,
-            temperature=0.1,
-            # add the logits_processor here
-            logits_processor=[logits_processor],
-        )
+        generate_kwargs = self.get_generate_kwargs(input_tokens)
+        with self.span("get_output_tokens"):
+            generated_ids = self.model.generate(**generate_kwargs)
         generated_ids = [
             output_ids[len(input_ids) :]
             for input_ids, output_ids in zip(input_tokens.input_ids, generated_ids)
         ]
 
+        if self.request_timer is not None:
+            # finished sequences are padded up to the longest one
+            self.record_generation(
+                input_tokens,
+                [int((ids != self.tokenizer.pad_token_id).sum()) for ids in generated_ids],
+                generate_kwargs["stopping_criteria"][-1],
+            )
         return generated_ids
 
 
@@ -189,6 +481,41 @@ class TransformersModel:
         #     for input_ids, output_ids in zip(input_tokens.input_ids, generated_ids)
         # ]
 
+    def span(self, name: str):
+        """
+        Times a stage of the current request into `request_timer`.
+        Args:
+            name (str): The name of the stage, e.g. "get_output_tokens".
+        Returns:
+            ContextManager: The timing context, a shared no-op context if
+            `request_timer` is None.
+        """
+
+        return get_phase(self.request_timer, name)
+
+    def record_generation(self, input_tokens, output_lengths: list, generation_timer: GenerationTimer):
+        """
+        Records the token counts and generation timings of one `generate` call
+        into `request_timer`.
+        Args:
+            input_tokens (BatchEncoding): The batch of input tokens.
+            output_lengths (list): The number of generated tokens of every sequence.
+            generation_timer (GenerationTimer): The timer passed to `generate`.
+        Returns:
+            None
+        """
+
+        for length in input_tokens.attention_mask.sum(dim=-1).tolist():
+            self.request_timer.record("input_tokens", length)
+        for length in output_lengths:
+            self.request_timer.record("output_tokens", length)
+        time_to_first_token = generation_timer.get_time_to_first_token()
+        if time_to_first_token is not None:
+            self.request_timer.record("time_to_first_token_seconds", time_to_first_token)
+        decode_rate = generation_timer.get_decode_rate(sum(output_lengths), len(output_lengths))
+        if decode_rate is not None:
+            self.request_timer.record("decode_tokens_per_second", decode_rate)
+
     def get_response(self, output_tokens):
         """
         Decodes the output tokens generated by the model into a human-readable response.
@@ -198,12 +525,24 @@ class TransformersModel:
             str: The decoded response string.
         """
 
+        return self.get_responses(output_tokens)[0]
+
+    def get_responses(self, output_tokens):
+        """
+        Decodes a batch of output token sequences into one response per sequence.
+        Args:
+            output_tokens (list): A list of token sequences generated by the model.
+        Returns:
+            List[str]: The decoded response strings, in the same order as the input.
+        """
+
         if self.print_logs:
             print("[INFO] Generating Response...")
-        return self.tokenizer.batch_decode(
-            sequences=output_tokens, skip_special_tokens=True
-        )[0]
-    
+        with self.span("get_response"):
+            return self.tokenizer.batch_decode(
+                sequences=output_tokens, skip_special_tokens=True
+            )
+
     def load_adapter(self, adapter_id: str):
         """
         Loads an adapter into the model.
@@ -212,9 +551,93 @@ class TransformersModel:
                       This could be a path to the adapter file or a predefined adapter name.
         Returns:
             None
+        Raises:
+            ValueError: If the model is quantized to int8.
+        """
+
+        if self.backend == "cpu_int8":
+            raise ValueError("Adapters cannot be loaded into an int8 model, merge them before quantizing.")
+        with self.startup_timer.phase("adapter"):
+            self.model.load_adapter(adapter_id)
+        self.adapter_ids.append(adapter_id)
+        # the cached keys and values depend on the weights, recompute them
+        if self.prefix_ids is not None:
+            self.set_prefix_cache(self.prefix_ids[0].tolist())
+
+    def merge_adapter(self, adapter_id: str):
+        """
+        Loads a LoRA adapter and folds its weights into the base model weights.
+        The merged model has the same architecture as the base model, so inference
+        runs without the extra LoRA matmuls of an unmerged PEFT adapter.
+        Args:
+            adapter_id (str): The identifier of the adapter to be merged.
+        Returns:
+            None
+        Raises:
+            ValueError: If the model is quantized to int8.
+        """
+
+        if self.backend == "cpu_int8":
+            raise ValueError("Adapters cannot be merged into an int8 model, merge them before quantizing.")
+        # peft is only needed when merging, the merged checkpoint loads without it
+        from peft import PeftModel
+
+        print(f"[INFO] Merging Adapter {adapter_id}...")
+        with self.startup_timer.phase("adapter"):
+            self.model = PeftModel.from_pretrained(self.model, adapter_id).merge_and_unload()
+        self.adapter_ids.append(adapter_id)
+        if self.prefix_ids is not None:
+            self.set_prefix_cache(self.prefix_ids[0].tolist())
+
+    def quantize(self):
+        """
+        Switches the model to the "cpu_int8" backend by quantizing its linear layers.
+        This allows merging an adapter into the full precision weights first.
+        Returns:
+            None
+        """
+
+        print("[INFO] Quantizing Model to int8...")
+        self.backend = "cpu_int8"
+        self.model = apply_backend(self.model.to("cpu").float(), self.backend)
+        if self.prefix_ids is not None:
+            self.set_prefix_cache(self.prefix_ids[0].tolist())
+
+    def save_pretrained(self, save_dir: str):
+        """
+        Saves the model weights as safetensors together with the tokenizer, so the
+        directory can be used as `model_id` of a new `TransformersModel`.
+        Args:
+            save_dir (str): The directory where the checkpoint is saved.
+        Returns:
+            None
+        """
+
+        print(f"[INFO] Saving Model to {save_dir}...")
+        os.makedirs(save_dir, exist_ok=True)
+        self.model.save_pretrained(save_dir, safe_serialization=True)
+        self.tokenizer.save_pretrained(save_dir)
+
+    def warmup(self, num_new_tokens: int = 2):
+        """
+        Runs one short generation so that the first request does not pay for the
+        lazy initialization of the kernels, the memory allocator and the caches.
+        Args:
+            num_new_tokens (int, optional): The number of generated tokens. Defaults to 2.
+        Returns:
+            None
         """
 
-        self.model.load_adapter(adapter_id)
+        with self.startup_timer.phase("warmup"):
+            input_tokens = self.get_input_tokens_from_ids(
+                [text_summarization.get_input_ids(self.tokenizer, "Warmup.")]
+            )
+            with torch.no_grad():
+                self.model.generate(**{
+                    **self.get_generate_kwargs(input_tokens),
+                    "max_new_tokens": num_new_tokens,
+                    "max_time": None,
+                })
 
     def create(self, message):
         """
@@ -231,6 +654,102 @@ class TransformersModel:
             )
         )
 
+    def create_from_ids(self, input_ids: list):
+        """
+        Generates one response per pre-tokenized prompt with a single `generate` call.
+        This skips the chat template and the tokenization of the static prompt prefix.
+        Args:
+            input_ids (list): A list of token id lists, one per prompt.
+        Returns:
+            List[str]: One response per prompt, in the same order as the input.
+        """
+
+        if not input_ids:
+            return []
+
+        return self.get_responses(
+            self.get_output_tokens(self.get_input_tokens_from_ids(input_ids))
+        )
+
+    def create_stream(self, input_ids: list, timeout: float = 60.0):
+        """
+        Generates the response for one pre-tokenized prompt as a stream of text chunks.
+        `generate` runs in a background thread and pushes the decoded tokens to a
+        `TextIteratorStreamer`, so the first chunk is available right after the
+        first decoding step instead of at the end of the generation. If the stream
+        is closed early, e.g. when the client disconnects, the generation is
+        cancelled after its current step instead of being waited for.
+        Args:
+            input_ids (list): The token ids of the prompt.
+            timeout (float, optional): The maximum number of seconds to wait for the
+                next chunk. Defaults to 60.0.
+        Returns:
+            Iterator[str]: The decoded text chunks, in generation order.
+        Raises:
+            TimeoutError: If no chunk is generated within `timeout` seconds.
+            Exception: The exception raised by `generate`, if any.
+        """
+
+        if self.print_logs:
+            print("[INFO] Streaming Ouput Tokens...")
+        input_tokens = self.get_input_tokens_from_ids([input_ids])
+        streamer = TextIteratorStreamer(
+            self.tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=timeout
+        )
+        generate_kwargs = self.get_generate_kwargs(input_tokens)
+        cancel = CancelStoppingCriteria()
+        # inserted first, the `GenerationTimer` of the request timer must stay last
+        generate_kwargs["stopping_criteria"].insert(0, cancel)
+        errors = []
+
+        def generate():
+            """Runs `generate`, ending the stream with the exception if it fails."""
+            try:
+                self.model.generate(**generate_kwargs, streamer=streamer)
+            except Exception as e:  # pylint: disable=broad-except
+                errors.append(e)
+                streamer.end()
+
+        thread = Thread(target=generate, daemon=True)
+        with self.span("get_output_tokens"):
+            thread.start()
+            try:
+                try:
+                    yield from streamer
+                except queue.Empty as e:
+                    raise TimeoutError(f"No output token was generated within {timeout}s") from e
+                if errors:
+                    raise errors[0]
+            finally:
+                cancel.cancel()
+
+        if self.request_timer is not None:
+            generation_timer = generate_kwargs["stopping_criteria"][-1]
+            self.record_generation(input_tokens, [generation_timer.new_tokens], generation_timer)
+
+    def create_batch(self, messages: list):
+        """
+        Processes several messages with a single `generate` call.
+        The chat templates are tokenized together as one left-padded batch,
+        so every prompt ends at the same position and the generated tokens
+        can be split back per message.
+        Args:
+            messages (list): A list of messages, each one as accepted by `create`.
+        Returns:
+            List[str]: One response per message, in the same order as the input.
+        """
+
+        if not messages:
+            return []
+
+        return self.get_responses(
+            self.get_output_tokens(
+                self.get_input_tokens(
+                    [self.get_chat_template(message) for message in messages]
+                )
+            )
+        )
+
 
 
 def test_model():
@@ -241,6 +760,7 @@ def test_model():
     """
 
     print("\n[INFO] Testing TransformersModel...\n")
+    load_dotenv(dotenv_path=".env", override=True, verbose=True)
     model_id = os.getenv("QWEN_ID")
     id = "/teamspace/studios/this_studio/Text-Summarization/models/finetuned"
 
@@ -0,0 +1,206 @@
+"""
+Evaluates `TransformersModel` on the whole validation set with batched generation,
+resumable checkpoints and ROUGE scoring.
+"""
+
+import os
+import time
+import json
+from typing import Dict, List
+import numpy as np
+import torch
+from dotenv import load_dotenv
+from src.tasks import text_summarization
+from src.evaluation.rouge import rouge_scores
+from src.evaluation.evaluate_transformers import TransformersModel
+from src.utils.file_utils import iter_json_lines, json_dumps
+from src.utils.json_utils import parse_output_summary, read_finetune_records
+
+
+class ValSetEvaluator:
+    """
+    Summarizes the records of a LLaMA-Factory file in batches and scores them.
+    The records are sorted by prompt length so that every batch pads its prompts
+    to similar lengths. The result of every batch is appended to a JSON lines
+    checkpoint as soon as it is generated, and a rerun skips the records that are
+    already in the checkpoint.
+    """
+
+    def __init__(
+            self, model: TransformersModel, output_dir: str = os.path.join("Data", "evaluation"),
+            batch_size: int = 8
+    ) -> None:
+        """
+        Initializes the evaluator.
+        Args:
+            model (TransformersModel): The model to evaluate.
+            output_dir (str, optional): The directory of the checkpoint and of the report.
+                Defaults to "Data/evaluation".
+            batch_size (int, optional): The number of records per `generate` call. Defaults to 8.
+        """
+        self.model = model
+        self.batch_size = batch_size
+        self.output_dir = output_dir
+        self.predictions_path = os.path.join(output_dir, "predictions.jsonl")
+        self.config_path = os.path.join(output_dir, "config.json")
+        self.report_path = os.path.join(output_dir, "report.json")
+        os.makedirs(output_dir, exist_ok=True)
+
+    def check_config(self, data_path: str):
+        """
+        Saves the generation config of the run, or checks that a checkpoint was made with
+        the same one, so that the predictions of two different models are never mixed.
+        Raises:
+            ValueError: If the checkpoint was made with another config.
+        """
+        config = {"data_path": data_path, **self.model.get_generation_config()}
+        config = json.loads(json.dumps(config, default=str))
+        if os.path.exists(self.predictions_path) and os.path.exists(self.config_path):
+            with open(self.config_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved != config:
+                raise ValueError(
+                    f"The checkpoint in {self.output_dir} was made with another config, "
+                    "delete it or use another output directory."
+                )
+        with open(self.config_path, "w", encoding="utf-8") as f:
+            json.dump(config, f, indent=2)
+
+    def load_checkpoint(self) -> Dict[int, Dict]:
+        """Returns the results already in the checkpoint, by record id."""
+        if not os.path.exists(self.predictions_path):
+            return {}
+        return {result["id"]: result for result in iter_json_lines(self.predictions_path)}
+
+    def generate_batch(self, records: List[Dict], input_ids: List[List[int]]) -> List[Dict]:
+        """
+        Summarizes one batch of records and scores every prediction.
+        Args:
+            records (List[Dict]): The `{id, text, summary}` records.
+            input_ids (List[List[int]]): The prompt token ids of every record.
+        Returns:
+            List[Dict]: The result of every record.
+        """
+        input_tokens = self.model.get_input_tokens_from_ids(input_ids)
+        start = time.perf_counter()
+        with torch.no_grad():
+            output_tokens = self.model.get_output_tokens(input_tokens)
+        latency = time.perf_counter() - start
+
+        results = []
+        pad_token_id = self.model.tokenizer.pad_token_id
+        for record, prompt_ids, output_ids, response in zip(
+                records, input_ids, output_tokens, self.model.get_responses(output_tokens)
+        ):
+            summary = parse_output_summary(response)
+            prediction = response if summary is None else summary
+            results.append({
+                "id": record["id"],
+                "prediction": prediction,
+                "reference": record["summary"],
+                "valid_json": summary is not None,
+                "input_tokens": len(prompt_ids),
+                "output_tokens": int((output_ids != pad_token_id).sum()),
+                # every record of a batch is ready when the batch is
+                "latency": latency,
+                "batch_size": len(records),
+                **rouge_scores(prediction, record["summary"]),
+            })
+        return results
+
+    def run(self, data_path: str, limit: int = 0) -> Dict:
+        """
+        Evaluates the model on a LLaMA-Factory file, resuming from the checkpoint.
+        Args:
+            data_path (str): The LLaMA-Factory JSON file, e.g. the validation set.
+            limit (int, optional): The number of records to evaluate, 0 for all. Defaults to 0.
+        Returns:
+            dict: The report, see `get_report`.
+        """
+        self.check_config(data_path)
+        records = read_finetune_records(data_path, limit=limit)
+        done = self.load_checkpoint()
+        todo = [record for record in records if record["id"] not in done]
+        print(f"[INFO] {len(done)} records in the checkpoint, {len(todo)} to evaluate...")
+
+        input_ids = [text_summarization.get_input_ids(self.model.tokenizer, rec["text"]) for rec in todo]
+        # longest first, so that an out-of-memory batch fails at the start of the run
+        order = sorted(range(len(todo)), key=lambda i: len(input_ids[i]), reverse=True)
+
+        start = time.perf_counter()
+        with open(self.predictions_path, "ab") as f:
+            for i in range(0, len(order), self.batch_size):
+                batch = order[i:i + self.batch_size]
+                results = self.generate_batch([todo[j] for j in batch], [input_ids[j] for j in batch])
+                f.writelines(json_dumps(result) + b"\n" for result in results)
+                f.flush()
+                print(f"[INFO] Evaluated {min(i + self.batch_size, len(order))}/{len(order)} records "
+                      f"in {time.perf_counter() - start:.1f}s")
+
+        ids = {record["id"] for record in records}
+        results = [result for result in self.load_checkpoint().values() if result["id"] in ids]
+        report = self.get_report(results)
+        with open(self.report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Saved the report to {self.report_path}")
+        return report
+
+    @staticmethod
+    def get_report(results: List[Dict]) -> Dict:
+        """
+        Aggregates the quality and the speed of the results.
+        Args:
+            results (List[Dict]): The results returned by `generate_batch`.
+        Returns:
+            dict: The mean ROUGE scores, the JSON validity rate, the latency percentiles
+            and the decoding throughput.
+        """
+        if not results:
+            return {"num_records": 0}
+        latencies = np.array([result["latency"] for result in results])
+        # every batch is counted once for the generation time
+        batch_time = sum(result["latency"] / result["batch_size"] for result in results)
+        output_tokens = sum(result["output_tokens"] for result in results)
+        return {
+            "num_records": len(results),
+            **{key: float(np.mean([result[key] for result in results])) for key in ("rouge1", "rouge2", "rougeL")},
+            "valid_json": float(np.mean([result["valid_json"] for result in results])),
+            "latency_mean": float(latencies.mean()),
+            "latency_p50": float(np.percentile(latencies, 50)),
+            "latency_p95": float(np.percentile(latencies, 95)),
+            "generation_time": batch_time,
+            "output_tokens": output_tokens,
+            "tokens_per_sec": output_tokens / batch_time if batch_time else 0.0,
+            "records_per_sec": len(results) / batch_time if batch_time else 0.0,
+        }
+
+
+def main():
+    """Evaluates the fine-tuned model on the validation set."""
+    print("\n[INFO] Starting validation set evaluation...")
+    load_dotenv(dotenv_path=".env", override=True, verbose=True)
+    model_id = os.getenv("QWEN_ID", "Qwen/Qwen2.5-0.5B-Instruct")
+    lora_path = os.getenv("LORA_PATH")
+    data_path = os.getenv("EVAL_DATA", "Data/datasets/llamafactory-finetune-data/val.json")
+    output_dir = os.getenv("EVAL_OUTPUT_DIR", os.path.join("Data", "evaluation"))
+    batch_size = int(os.getenv("EVAL_BATCH_SIZE", "8"))
+    limit = int(os.getenv("EVAL_LIMIT", "0"))
+    max_new_tokens = int(os.getenv("MAX_NEW_TOKENS", "2000"))
+
+    model = TransformersModel(model_id=model_id, temp=0.2)
+    if lora_path:
+        model.load_adapter(lora_path)
+    model.set_generation_limits(max_new_tokens=max_new_tokens)
+
+    evaluator = ValSetEvaluator(model, output_dir=output_dir, batch_size=batch_size)
+    report = evaluator.run(data_path, limit=limit)
+
+    print("\n[RESULT]:")
+    for key, value in report.items():
+        print(f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.evaluation.evaluate_val_set
@@ -0,0 +1,87 @@
+"""ROUGE-1/2/L scoring of generated summaries against reference summaries."""
+
+import re
+from collections import Counter
+from typing import Dict, List
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercases the text and splits it into alphanumeric tokens."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def f1_score(overlap: int, prediction_total: int, reference_total: int) -> float:
+    """Returns the F1 score of an overlap count."""
+    if overlap == 0 or prediction_total == 0 or reference_total == 0:
+        return 0.0
+    precision = overlap / prediction_total
+    recall = overlap / reference_total
+    return 2 * precision * recall / (precision + recall)
+
+
+def ngram_f1(prediction: List[str], reference: List[str], n: int) -> float:
+    """Returns the ROUGE-N F1 score of two token lists."""
+    pred_ngrams = Counter(zip(*[prediction[i:] for i in range(n)]))
+    ref_ngrams = Counter(zip(*[reference[i:] for i in range(n)]))
+    overlap = sum((pred_ngrams & ref_ngrams).values())
+    return f1_score(overlap, sum(pred_ngrams.values()), sum(ref_ngrams.values()))
+
+
+def lcs_length(prediction: List[str], reference: List[str]) -> int:
+    """
+    Returns the length of the longest common subsequence of two token lists.
+    The dynamic programming table is filled one row at a time with NumPy:
+    a matching token extends the diagonal and a running maximum propagates
+    the best value along the row, so there is no Python loop over columns.
+    """
+    if not prediction or not reference:
+        return 0
+    vocab = {token: i for i, token in enumerate(set(prediction) | set(reference))}
+    ref_ids = np.fromiter((vocab[token] for token in reference), dtype=np.int64)
+
+    row = np.zeros(len(reference) + 1, dtype=np.int64)
+    for token in prediction:
+        match = ref_ids == vocab[token]
+        candidates = row.copy()
+        candidates[1:] = np.maximum(row[1:], np.where(match, row[:-1] + 1, 0))
+        row = np.maximum.accumulate(candidates)
+    return int(row[-1])
+
+
+def rouge_scores(prediction: str, reference: str) -> Dict[str, float]:
+    """
+    Computes the ROUGE-1, ROUGE-2 and ROUGE-L F1 scores of one prediction.
+    Args:
+        prediction (str): The generated summary.
+        reference (str): The reference summary.
+    Returns:
+        dict: The scores with the keys "rouge1", "rouge2" and "rougeL".
+    """
+    pred_tokens = tokenize(prediction)
+    ref_tokens = tokenize(reference)
+    return {
+        "rouge1": ngram_f1(pred_tokens, ref_tokens, 1),
+        "rouge2": ngram_f1(pred_tokens, ref_tokens, 2),
+        "rougeL": f1_score(lcs_length(pred_tokens, ref_tokens), len(pred_tokens), len(ref_tokens)),
+    }
+
+
+def corpus_rouge(predictions: List[str], references: List[str]) -> Dict[str, float]:
+    """
+    Computes the mean ROUGE-1, ROUGE-2 and ROUGE-L F1 scores over a corpus.
+    Args:
+        predictions (List[str]): The generated summaries.
+        references (List[str]): The reference summaries, in the same order.
+    Returns:
+        dict: The mean scores with the keys "rouge1", "rouge2" and "rougeL".
+    """
+    if len(predictions) != len(references):
+        raise ValueError("predictions and references must have the same length")
+    if not predictions:
+        return {"rouge1": 0.0, "rouge2": 0.0, "rougeL": 0.0}
+
+    scores = [rouge_scores(p, r) for p, r in zip(predictions, references)]
+    return {key: float(np.mean([s[key] for s in scores])) for key in scores[0]}
@@ -0,0 +1,154 @@
+"""
+A local stub of the OpenAI chat completions API, to test `AsyncOpenAIModel`
+without a network or an API key.
+
+The stub answers with the first words of the text as the summary, after a fixed
+latency, and fails a fraction of the requests with 429 or 500 errors so that the
+retries are exercised. `GET /stats` returns the request counters and the maximum
+number of requests that were in flight at the same time.
+
+    python -m src.evaluation.stub_openai_server
+    BASE_URL=http://127.0.0.1:8001/v1 MODEL_ID=stub python -m src.evaluation.evaluate_large_model
+"""
+
+import os
+import json
+import time
+import random
+import threading
+from typing import Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubState:
+    """The configuration and the counters shared by the request handlers."""
+
+    def __init__(self, latency: float = 0.2, failure_rate: float = 0.0, summary_words: int = 30) -> None:
+        """
+        Initializes the stub state.
+        Args:
+            latency (float, optional): The number of seconds spent on every request. Defaults to 0.2.
+            failure_rate (float, optional): The fraction of the requests that fail. Defaults to 0.
+            summary_words (int, optional): The number of words of the summaries. Defaults to 30.
+        """
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.summary_words = summary_words
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.stats = {"requests": 0, "failures": 0, "max_in_flight": 0}
+
+
+def get_summary(messages: list, num_words: int) -> str:
+    """Returns the response of the stub: the first words of the text of the last user message."""
+    content = messages[-1]["content"] if messages else ""
+    text = content.split("## Text:\n", 1)[-1].split("\n## Summary Result:", 1)[0]
+    summary = " ".join(text.split()[:num_words])
+    return "\n".join(["```json", json.dumps({"summarized_text": summary}, ensure_ascii=False), "```"])
+
+
+def create_handler(state: StubState):
+    """Returns the request handler class bound to the stub state."""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        """Handles `POST /v1/chat/completions` and `GET /stats`."""
+
+        def send_json(self, status: int, body: dict, headers: Optional[dict] = None):
+            """Sends a JSON response."""
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """Returns the counters of the stub."""
+            if self.path.rstrip("/") != "/stats":
+                self.send_json(404, {"error": {"message": "not found"}})
+                return
+            with state.lock:
+                self.send_json(200, dict(state.stats))
+
+        def do_POST(self):  # pylint: disable=invalid-name
+            """Answers a chat completion request."""
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_json(404, {"error": {"message": "not found"}})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            with state.lock:
+                state.stats["requests"] += 1
+                state.in_flight += 1
+                state.stats["max_in_flight"] = max(state.stats["max_in_flight"], state.in_flight)
+            try:
+                time.sleep(state.latency)
+                if random.random() < state.failure_rate:
+                    with state.lock:
+                        state.stats["failures"] += 1
+                    if random.random() < 0.5:
+                        self.send_json(429, {"error": {"message": "rate limited", "type": "rate_limit"}},
+                                       headers={"Retry-After": "0.1"})
+                    else:
+                        self.send_json(500, {"error": {"message": "internal error", "type": "server_error"}})
+                    return
+
+                content = get_summary(request.get("messages", []), state.summary_words)
+                self.send_json(200, {
+                    "id": f"chatcmpl-stub-{state.stats['requests']}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model") or "stub",
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                })
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            """Silences the access log."""
+
+    return StubHandler
+
+
+def create_server(host: str = "127.0.0.1", port: int = 8001, state: Optional[StubState] = None) -> ThreadingHTTPServer:
+    """
+    Creates the stub server, one thread per request.
+    Args:
+        host (str, optional): The host to bind. Defaults to "127.0.0.1".
+        port (int, optional): The port to bind, 0 for any free port. Defaults to 8001.
+        state (StubState, optional): The stub configuration. Defaults to `StubState()`.
+    Returns:
+        ThreadingHTTPServer: The server, started with `serve_forever`.
+    """
+    server = ThreadingHTTPServer((host, port), create_handler(state or StubState()))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    """Runs the stub server until it is interrupted."""
+    state = StubState(
+        latency=float(os.getenv("STUB_LATENCY", "0.2")),
+        failure_rate=float(os.getenv("STUB_FAILURE_RATE", "0.1")),
+    )
+    server = create_server(port=int(os.getenv("STUB_PORT", "8001")), state=state)
+    print(f"[INFO] Stub OpenAI server listening on http://127.0.0.1:{server.server_port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.evaluation.stub_openai_server
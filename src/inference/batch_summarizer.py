@@ -0,0 +1,200 @@
+"""
+Bulk summarization with `TransformersModel`: length-sorted batched generation
+and a resumable command line job over JSON lines, Parquet, Arrow or CSV files.
+"""
+
+import os
+import time
+import itertools
+from typing import Dict, Iterator, List, Optional, Tuple
+import torch
+from dotenv import load_dotenv
+from src.tasks import text_summarization
+from src.evaluation.evaluate_transformers import TransformersModel
+from src.utils.file_utils import iter_json_lines, json_dumps, read_file_chunks
+from src.utils.json_utils import parse_output_summary
+
+JSON_LINES_EXTENSIONS = (".jsonl", ".jsonl.gz", ".jsonl.zst")
+
+
+def iter_documents(path: str, chunksize: int = 1000) -> Iterator[Dict]:
+    """
+    Yields the `{id, text}` documents of a file one at a time.
+    Args:
+        path (str): A JSON lines file (optionally ".gz" or ".zst" compressed), or a
+            Parquet, Arrow IPC or CSV table with "id" and "text" columns.
+        chunksize (int, optional): The number of table rows read at once. Defaults to 1000.
+    Yields:
+        dict: The documents, a document without "id" gets its position in the file.
+    """
+    if path.lower().endswith(JSON_LINES_EXTENSIONS):
+        records = iter_json_lines(path)
+    else:
+        records = itertools.chain.from_iterable(
+            df.to_dict("records") for df in read_file_chunks(path, chunksize=chunksize)
+        )
+    for i, record in enumerate(records):
+        yield {"id": record.get("id", i), "text": record["text"]}
+
+
+class BatchSummarizer:
+    """
+    Summarizes many texts with as few `generate` calls as possible.
+    The prompts are sorted by token length before they are split into batches,
+    so that every batch pads its prompts to similar lengths.
+    """
+
+    def __init__(self, model: TransformersModel, batch_size: int = 8) -> None:
+        """
+        Initializes the summarizer.
+        Args:
+            model (TransformersModel): The model used to generate the summaries.
+            batch_size (int, optional): The number of texts per `generate` call. Defaults to 8.
+        """
+        self.model = model
+        self.batch_size = batch_size
+
+    def get_batches(self, input_ids: List[List[int]]) -> List[List[int]]:
+        """
+        Groups prompts of similar lengths.
+        Args:
+            input_ids (List[List[int]]): The prompt token ids.
+        Returns:
+            List[List[int]]: The indices of the prompts of every batch, longest first,
+            so that an out-of-memory batch fails at the start of a job.
+        """
+        order = sorted(range(len(input_ids)), key=lambda i: len(input_ids[i]), reverse=True)
+        return [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+
+    def iter_batches(self, texts: List[str]) -> Iterator[Tuple[List[int], List[str]]]:
+        """
+        Summarizes the texts one batch at a time.
+        Args:
+            texts (List[str]): The texts to be summarized.
+        Yields:
+            Tuple[List[int], List[str]]: The indices of the texts of a batch and their
+            raw responses, in the same order.
+        """
+        # the static prompt prefix is tokenized once and reused for every text
+        input_ids = [text_summarization.get_input_ids(self.model.tokenizer, text) for text in texts]
+        for batch in self.get_batches(input_ids):
+            with torch.no_grad():
+                responses = self.model.create_from_ids([input_ids[i] for i in batch])
+            yield batch, responses
+
+    def summarize(self, texts: List[str]) -> List[str]:
+        """
+        Summarizes the texts with length-sorted batches.
+        Args:
+            texts (List[str]): The texts to be summarized.
+        Returns:
+            List[str]: The raw response of every text, in the same order as the input.
+        """
+        responses = [None] * len(texts)
+        for batch, batch_responses in self.iter_batches(texts):
+            for i, response in zip(batch, batch_responses):
+                responses[i] = response
+        return responses
+
+    @staticmethod
+    def load_checkpoint(output_path: str) -> set:
+        """Returns the ids of the documents already summarized in the output file."""
+        if not os.path.exists(output_path):
+            return set()
+        return {result["id"] for result in iter_json_lines(output_path)}
+
+    def summarize_file(
+            self, input_path: str, output_path: str, window_size: int = 1024, limit: int = 0
+    ) -> Dict:
+        """
+        Summarizes the documents of a file into a JSON lines file, resuming from it.
+        The documents are read in windows of `window_size`, and every window is sorted
+        by length and summarized in batches. Every batch is appended to the output
+        file as soon as it is generated, so an interrupted job loses at most one batch.
+        Args:
+            input_path (str): The `{id, text}` documents, see `iter_documents`.
+            output_path (str): The JSON lines file of `{id, summarized_text, valid_json}`.
+            window_size (int, optional): The number of documents sorted together.
+                Defaults to 1024.
+            limit (int, optional): The number of documents to read, 0 for all. Defaults to 0.
+        Returns:
+            dict: The number of documents skipped and summarized, and the throughput.
+        """
+        done = self.load_checkpoint(output_path)
+        print(f"[INFO] {len(done)} documents in the checkpoint {output_path}...")
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+        documents = iter_documents(input_path)
+        if limit:
+            documents = itertools.islice(documents, limit)
+        todo = (document for document in documents if document["id"] not in done)
+
+        summarized = 0
+        start = time.perf_counter()
+        with open(output_path, "ab") as f:
+            while True:
+                window = list(itertools.islice(todo, window_size))
+                if not window:
+                    break
+                for batch, responses in self.iter_batches([document["text"] for document in window]):
+                    results = []
+                    for i, response in zip(batch, responses):
+                        summary = parse_output_summary(response)
+                        results.append({
+                            "id": window[i]["id"],
+                            "summarized_text": response if summary is None else summary,
+                            "valid_json": summary is not None,
+                        })
+                    f.writelines(json_dumps(result) + b"\n" for result in results)
+                    f.flush()
+                    summarized += len(results)
+                elapsed = time.perf_counter() - start
+                print(f"[INFO] Summarized {summarized} documents in {elapsed:.1f}s "
+                      f"({summarized / elapsed:.2f} documents/sec)")
+
+        elapsed = time.perf_counter() - start
+        return {
+            "skipped": len(done),
+            "summarized": summarized,
+            "seconds": elapsed,
+            "documents_per_sec": summarized / elapsed if elapsed else 0.0,
+        }
+
+
+def load_model(model_id: str, lora_path: Optional[str] = None, max_new_tokens: int = 2000) -> TransformersModel:
+    """Loads the model of the job, with the prefix cache of the static prompt."""
+    model = TransformersModel(model_id=model_id, temp=0.2, backend=os.getenv("BACKEND", "default"))
+    if lora_path:
+        model.load_adapter(lora_path)
+    model.set_generation_limits(max_new_tokens=max_new_tokens)
+    model.set_prefix_cache(text_summarization.get_prefix_ids(model.tokenizer))
+    return model
+
+
+def main():
+    """Summarizes the documents of `BATCH_INPUT` into `BATCH_OUTPUT`."""
+    print("\n[INFO] Starting batch summarization...")
+    load_dotenv(dotenv_path=".env", override=True, verbose=True)
+    merged_model_path = os.getenv("MERGED_MODEL_PATH", "")
+    model_id = merged_model_path or os.getenv("QWEN_ID", "Qwen/Qwen2.5-0.5B-Instruct")
+    lora_path = "" if merged_model_path else os.getenv("LORA_PATH", "")
+    input_path = os.getenv("BATCH_INPUT", "Data/batch/documents.jsonl")
+    output_path = os.getenv("BATCH_OUTPUT", "Data/batch/summaries.jsonl")
+    batch_size = int(os.getenv("BATCH_SIZE", "8"))
+    window_size = int(os.getenv("BATCH_WINDOW", "1024"))
+    limit = int(os.getenv("BATCH_LIMIT", "0"))
+    max_new_tokens = int(os.getenv("MAX_NEW_TOKENS", "2000"))
+
+    model = load_model(model_id, lora_path=lora_path, max_new_tokens=max_new_tokens)
+    summarizer = BatchSummarizer(model, batch_size=batch_size)
+    stats = summarizer.summarize_file(input_path, output_path, window_size=window_size, limit=limit)
+
+    print("\n[RESULT]:")
+    for key, value in stats.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.inference.batch_summarizer
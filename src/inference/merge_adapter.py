@@ -0,0 +1,42 @@
+"""Merge the LoRA adapter into the base model and export a standalone checkpoint."""
+
+import os
+from dotenv import load_dotenv
+from src.evaluation.evaluate_transformers import TransformersModel
+
+
+def merge_and_export(base_model_id: str, adapter_id: str, save_dir: str) -> str:
+    """
+    Folds the LoRA adapter into the base model weights and saves the result.
+    Args:
+        base_model_id (str): The identifier of the base model.
+        adapter_id (str): The path or identifier of the LoRA adapter.
+        save_dir (str): The directory where the merged checkpoint is saved.
+    Returns:
+        str: The directory of the merged checkpoint.
+    """
+    model = TransformersModel(model_id=base_model_id, temp=0.2)
+    model.merge_adapter(adapter_id)
+    model.save_pretrained(save_dir)
+    return save_dir
+
+
+def main():
+    """Main function to export the merged checkpoint used by `server.py`."""
+    print("\n[INFO] Starting adapter merge...")
+    load_dotenv(dotenv_path=".env", override=True, verbose=True)
+    base_model_id = os.getenv("QWEN_ID", "Qwen/Qwen2.5-0.5B-Instruct")
+    adapter_id = os.getenv(
+        "LORA_PATH", "/teamspace/studios/this_studio/Text-Summarization/models/finetuned"
+    )
+    save_dir = os.getenv("MERGED_MODEL_PATH", os.path.join("models", "merged"))
+
+    merge_and_export(base_model_id, adapter_id, save_dir)
+    print(f"[INFO] Merged model saved to {save_dir}")
+    print(f"[INFO] Serve it with: MERGED_MODEL_PATH={save_dir} python server.py")
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.inference.merge_adapter
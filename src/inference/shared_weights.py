@@ -0,0 +1,126 @@
+"""
+Exports a (merged) model to a single memory-mappable weights file and loads it without
+copying the weights, so that every serving worker process maps the same pages of the
+page cache instead of holding its own copy of the model.
+"""
+
+import os
+import time
+import torch
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer, GenerationConfig
+from src.utils.backend_utils import get_pss_mb, get_rss_mb
+
+SHARED_WEIGHTS_FILE = "shared_weights.pt"
+
+
+def has_shared_weights(model_dir: str) -> bool:
+    """Returns True if `export_shared_weights` was run for this directory."""
+    return os.path.exists(os.path.join(model_dir, SHARED_WEIGHTS_FILE))
+
+
+def export_shared_weights(
+        model_id: str, save_dir: str, adapter_id: str = "", dtype: torch.dtype = torch.float32
+) -> str:
+    """
+    Saves the weights, the config and the tokenizer of a model for `load_shared_model`.
+    The parameters and all buffers, including the non-persistent ones such as the
+    rotary embedding frequencies, are saved in one `torch.save` file whose storages
+    can be memory-mapped. Tied weights are saved once.
+    Args:
+        model_id (str): The model to export, a hub id or a local checkpoint.
+        save_dir (str): The directory of the exported model.
+        adapter_id (str, optional): A LoRA adapter merged into the weights before the
+            export, "" for none. Defaults to "".
+        dtype (torch.dtype, optional): The dtype of the exported weights. Defaults to float32.
+    Returns:
+        str: The path of the weights file.
+    """
+    print(f"[INFO] Exporting shared weights of {model_id} to {save_dir}...")
+    model = AutoModelForCausalLM.from_pretrained(
+        model_id, cache_dir=r"models/cache", device_map="cpu", dtype=dtype
+    )
+    if adapter_id:
+        # imported here so that PEFT is only needed when an adapter is merged
+        from peft import PeftModel
+        model = PeftModel.from_pretrained(model, adapter_id).merge_and_unload()
+    model.eval()
+
+    tensors = {
+        name: tensor.detach()
+        for name, tensor in [
+            *model.named_parameters(remove_duplicate=False),
+            *model.named_buffers(remove_duplicate=False),
+        ]
+    }
+    os.makedirs(save_dir, exist_ok=True)
+    path = os.path.join(save_dir, SHARED_WEIGHTS_FILE)
+    torch.save(tensors, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+
+    model.config.save_pretrained(save_dir)
+    model.generation_config.save_pretrained(save_dir)
+    AutoTokenizer.from_pretrained(model_id, cache_dir=r"models/cache").save_pretrained(save_dir)
+    print(f"[INFO] Saved {len(tensors)} tensors to {path}")
+    return path
+
+
+def load_shared_model(model_dir: str):
+    """
+    Loads a model exported with `export_shared_weights` without copying its weights.
+    The model is built on the meta device, so no memory is allocated for its weights,
+    and the memory-mapped tensors are then assigned to its parameters and buffers.
+    The pages are read-only and backed by the file, so the processes that load the
+    same file share them.
+    Args:
+        model_dir (str): The directory of the exported model.
+    Returns:
+        AutoModelForCausalLM: The model, in eval mode and on the CPU.
+    Raises:
+        ValueError: If a parameter or buffer of the model is not in the weights file.
+    """
+    config = AutoConfig.from_pretrained(model_dir)
+    with torch.device("meta"):
+        model = AutoModelForCausalLM.from_config(config)
+
+    tensors = torch.load(os.path.join(model_dir, SHARED_WEIGHTS_FILE), mmap=True, weights_only=True)
+    for name, tensor in tensors.items():
+        module_name, _, attr = name.rpartition(".")
+        module = model.get_submodule(module_name)
+        if attr in module._parameters:  # pylint: disable=protected-access
+            module._parameters[attr] = torch.nn.Parameter(tensor, requires_grad=False)  # pylint: disable=protected-access
+        else:
+            module._buffers[attr] = tensor  # pylint: disable=protected-access
+
+    missing = [name for name, tensor in [*model.named_parameters(), *model.named_buffers()] if tensor.is_meta]
+    if missing:
+        raise ValueError(f"The shared weights of {model_dir} have no values for {missing}")
+    if os.path.exists(os.path.join(model_dir, "generation_config.json")):
+        model.generation_config = GenerationConfig.from_pretrained(model_dir)
+    return model.eval()
+
+
+def main():
+    """Exports the merged fine-tuned model and compares the memory of both loading paths."""
+    print("[INFO] Starting shared weights export...")
+    model_id = os.getenv("MERGED_MODEL_PATH", os.path.join("models", "merged"))
+    save_dir = os.getenv("SHARED_WEIGHTS_PATH", os.path.join("models", "shared"))
+
+    export_shared_weights(model_id, save_dir)
+
+    rss_before, pss_before = get_rss_mb(), get_pss_mb()
+    start = time.perf_counter()
+    model = load_shared_model(save_dir)
+    with torch.no_grad():
+        model(torch.tensor([[1, 2, 3]]))
+    elapsed = time.perf_counter() - start
+
+    print("\n[RESULT]:")
+    print(f"load and first forward: {elapsed:.2f}s")
+    print(f"rss: +{get_rss_mb() - rss_before:.1f} MiB (file-backed pages included)")
+    print(f"pss: +{get_pss_mb() - pss_before:.1f} MiB (file-backed pages split between processes)")
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.inference.shared_weights
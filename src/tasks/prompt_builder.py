@@ -0,0 +1,123 @@
+""" prompt builder for text summarization task """
+import os
+import json
+import time
+from typing import Dict, List, Optional
+from src.pydantic_models.text_summarization import TextSummarization
+
+# placeholder used to locate the text inside the rendered chat template
+TEXT_PLACEHOLDER = "<<TEXT_PLACEHOLDER>>"
+
+
+class PromptBuilder:
+    """
+    Builds the text summarization messages from a cached prompt template.
+    The template file and the serialized schema are loaded once and only
+    reloaded when the modification time of the template file changes, so
+    building a message does not touch the disk.
+    """
+
+    def __init__(
+            self, template_path: str = r'src/tasks/text_summarization.json',
+            check_interval: float = 1.0
+    ) -> None:
+        """
+        Initializes the prompt builder.
+        Args:
+            template_path (str): The path of the JSON prompt template.
+            check_interval (float, optional): The minimum number of seconds between
+                two checks of the template modification time. Defaults to 1.0.
+        Attributes:
+            template (list): The cached prompt template messages.
+            schema (str): The cached serialized `TextSummarization` JSON schema.
+        """
+        self.template_path = template_path
+        self.check_interval = check_interval
+        self.template: Optional[List[Dict]] = None
+        self.schema: Optional[str] = None
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._prefix_cache: Dict[str, tuple] = {}
+
+    def load(self):
+        """Loads the prompt template and serializes the schema."""
+        with open(file=self.template_path, mode='r', encoding='utf-8') as f:
+            self.template = json.load(f)
+        self.schema = json.dumps(TextSummarization.model_json_schema(), ensure_ascii=False)
+        self._mtime = os.path.getmtime(self.template_path)
+        self._prefix_cache.clear()
+
+    def refresh(self):
+        """Reloads the template if it was never loaded or if the file has changed."""
+        now = time.monotonic()
+        if self.template is not None and now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        if self.template is None or os.path.getmtime(self.template_path) != self._mtime:
+            self.load()
+
+    def get_user_content(self, text: str) -> str:
+        """Builds the user message content for the given text."""
+        # the text comes last so that everything before it is a constant prefix
+        # whose tokens and KV cache can be shared by all requests
+        return "\n".join([
+            "## Pydantic Details:",
+            self.schema,  # type: ignore
+            "",
+
+            "## Text:",
+            text.strip(),
+            "",
+
+            "## Summary Result:",
+            "```json"
+        ])
+
+    def get_message(self, text: str) -> List[Dict]:
+        """Get the message for text summarization task
+        Args:
+            text (str): The text to be summarized.
+        Returns:
+            list: A list containing the message structure for text summarization.
+        """
+        self.refresh()
+        message = [dict(item) for item in self.template]  # type: ignore
+        message[1]['content'] = self.get_user_content(text)
+        return message
+
+    def get_prefix(self, tokenizer) -> tuple:
+        """
+        Returns the static part of the rendered chat template that precedes the text.
+        The chat template is rendered once with a placeholder instead of the text and
+        split around it. The prefix is tokenized once per tokenizer and cached.
+        Args:
+            tokenizer (AutoTokenizer): The tokenizer used to render and tokenize the prompt.
+        Returns:
+            tuple: The prefix token ids and the template text that follows the text.
+        """
+        self.refresh()
+        key = tokenizer.name_or_path
+        if key not in self._prefix_cache:
+            rendered = tokenizer.apply_chat_template(
+                conversation=self.get_message(TEXT_PLACEHOLDER),
+                add_generation_prompt=True,
+                tokenize=False,
+            )
+            prefix, suffix = rendered.split(TEXT_PLACEHOLDER, 1)
+            prefix_ids = tokenizer(prefix, add_special_tokens=False).input_ids
+            self._prefix_cache[key] = (prefix_ids, suffix)
+        return self._prefix_cache[key]
+
+    def get_input_ids(self, tokenizer, text: str) -> List[int]:
+        """
+        Tokenizes the full prompt for the given text, reusing the pre-tokenized prefix.
+        The prefix ends with a newline, which is a pre-tokenizer boundary, so only
+        the text and the short template suffix have to be tokenized per request.
+        Args:
+            tokenizer (AutoTokenizer): The tokenizer used to tokenize the prompt.
+            text (str): The text to be summarized.
+        Returns:
+            List[int]: The token ids of the rendered prompt.
+        """
+        prefix_ids, suffix = self.get_prefix(tokenizer)
+        return prefix_ids + tokenizer(text.strip() + suffix, add_special_tokens=False).input_ids
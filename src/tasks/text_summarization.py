@@ -1,6 +1,9 @@
 """ functions for text summarization task """
-import json
-from src.pydantic_models.text_summarization import TextSummarization
+from typing import List
+from src.tasks.prompt_builder import PromptBuilder
+
+# the template and schema are loaded once and shared by every request
+PROMPT_BUILDER = PromptBuilder(template_path=r'src/tasks/text_summarization.json')
 
 def get_message(text: str):
     """Get the message for text summarization task
@@ -9,26 +12,24 @@ def get_message(text: str):
     Returns:
         list: A list containing the message structure for sentiment analysis.
     """
-    with open(
-        file=r'src/tasks/text_summarization.json',
-        mode='r',
-        encoding='utf-8'
-    ) as f:
-        message = json.load(f)
-
-    message[1]['content'] = "\n".join([
-                "## Text:",
-                text.strip(),
-                "",
-
-                "## Pydantic Details:",
-                json.dumps(
-                    TextSummarization.model_json_schema(), ensure_ascii=False
-                ),
-                "",
+    return PROMPT_BUILDER.get_message(text)
 
-                "## Summary Result:",
-                "```json"
-            ])
+def get_input_ids(tokenizer, text: str) -> List[int]:
+    """Get the prompt token ids for text summarization task
+    Args:
+        tokenizer (AutoTokenizer): The tokenizer of the model.
+        text (str): The text to be summarized.
+    Returns:
+        list: The token ids of the chat-templated message, with the static
+        prefix tokenized only once.
+    """
+    return PROMPT_BUILDER.get_input_ids(tokenizer, text)
 
-    return message
+def get_prefix_ids(tokenizer) -> List[int]:
+    """Get the token ids of the static prompt prefix shared by every request
+    Args:
+        tokenizer (AutoTokenizer): The tokenizer of the model.
+    Returns:
+        list: The token ids of the system message and schema preceding the text.
+    """
+    return PROMPT_BUILDER.get_prefix(tokenizer)[0]
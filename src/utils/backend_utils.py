@@ -0,0 +1,131 @@
+"""functions for selecting the inference backend of transformer models."""
+
+import os
+from typing import Optional
+
+# torch is imported in the functions that use it, so that the process helpers
+# below can be used without paying for the torch import, e.g. by the server parent
+
+# "default" keeps the original behaviour: full precision with device_map="auto"
+BACKENDS = ("default", "cpu_fp32", "cpu_bf16", "cpu_int8")
+
+
+def cpu_supports_bf16() -> bool:
+    """Returns True if the CPU has native bfloat16 instructions (AVX512-BF16 or AMX)."""
+    import torch
+
+    if not torch.backends.mkldnn.is_available():
+        return False
+    try:
+        with open("/proc/cpuinfo", mode="r", encoding="utf-8") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def configure_threads(num_threads: Optional[int] = None, num_interop_threads: Optional[int] = None):
+    """
+    Sets the number of intra-op and inter-op threads used by torch.
+    Args:
+        num_threads (Optional[int]): The number of threads used inside an operator,
+            e.g. a matmul. Defaults to the torch default (all physical cores).
+        num_interop_threads (Optional[int]): The number of threads used to run
+            independent operators in parallel. It can only be set once, before any
+            parallel work has started. Defaults to the torch default.
+    """
+    import torch
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+        os.environ["OMP_NUM_THREADS"] = str(num_threads)
+    if num_interop_threads:
+        try:
+            torch.set_num_interop_threads(num_interop_threads)
+        except RuntimeError:
+            print("[WARNING] Inter-op threads can only be set before any parallel work, ignoring.")
+
+
+def resolve_backend(backend: str) -> str:
+    """Validates the backend name and falls back to fp32 if bf16 is not supported."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend}, expected one of {BACKENDS}")
+    if backend == "cpu_bf16" and not cpu_supports_bf16():
+        print("[WARNING] CPU has no native bfloat16 support, using cpu_fp32 instead.")
+        return "cpu_fp32"
+    return backend
+
+
+def get_load_kwargs(backend: str) -> dict:
+    """Returns the `from_pretrained` keyword arguments of the given backend."""
+    import torch
+
+    if backend == "default":
+        return {"device_map": "auto"}
+    if backend == "cpu_bf16":
+        return {"device_map": "cpu", "dtype": torch.bfloat16}
+    return {"device_map": "cpu", "dtype": torch.float32}
+
+
+def apply_backend(model, backend: str):
+    """
+    Applies the post-loading transformations of the given backend.
+    For "cpu_int8" the weights of every `nn.Linear` layer are quantized to int8
+    and the activations are quantized dynamically at runtime.
+    Args:
+        model (AutoModelForCausalLM): The loaded model.
+        backend (str): The backend name.
+    Returns:
+        AutoModelForCausalLM: The model to be used for inference.
+    """
+    import torch
+
+    model.eval()
+    if backend == "cpu_int8":
+        model = torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return model
+
+
+def get_worker_threads(num_workers: int) -> int:
+    """
+    Returns the number of intra-op threads of every worker process when the available
+    cores are split between `num_workers` workers, so that the workers together do not
+    start more threads than there are cores.
+    """
+    try:
+        num_cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        num_cores = os.cpu_count() or 1
+    return max(1, num_cores // max(1, num_workers))
+
+
+def get_rss_mb(pid: Optional[int] = None) -> float:
+    """Returns the resident set size of a process in MiB (Linux only, 0.0 elsewhere)."""
+    path = f"/proc/{pid or 'self'}/status"
+    try:
+        with open(path, mode="r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def get_pss_mb(pid: Optional[int] = None) -> float:
+    """
+    Returns the proportional set size of a process in MiB (Linux only, 0.0 elsewhere).
+    Unlike the RSS, the pages shared by several processes, e.g. memory-mapped weights,
+    are divided between them, so the PSS of all workers adds up to their real memory use.
+    """
+    path = f"/proc/{pid or 'self'}/smaps_rollup"
+    try:
+        with open(path, mode="r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
@@ -0,0 +1,155 @@
+"""Content-addressed cache of generated summaries."""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalizes the unicode form and collapses whitespace so trivial resends share a key."""
+    return WHITESPACE_PATTERN.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def get_cache_key(text: str, config: Dict) -> str:
+    """
+    Returns the cache key of a text generated with a given model configuration.
+    Args:
+        text (str): The input text.
+        config (dict): Everything that changes the output for the same text, e.g. the
+            model id, adapter path and generation parameters.
+    Returns:
+        str: The SHA-256 hex digest of the normalized text and the configuration.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(config, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SummaryCache:
+    """
+    A two-tier cache of generated summaries.
+    The memory tier is an LRU with a maximum number of entries and a time-to-live.
+    The optional disk tier is a SQLite database that survives restarts; entries
+    found on disk are promoted to the memory tier.
+    """
+
+    def __init__(
+            self, max_entries: int = 1024, ttl: Optional[float] = 86400.0,
+            db_path: Optional[str] = None
+    ) -> None:
+        """
+        Initializes the cache.
+        Args:
+            max_entries (int, optional): The maximum number of entries in memory.
+                Defaults to 1024.
+            ttl (Optional[float]): The number of seconds an entry stays valid,
+                None to never expire. Defaults to one day.
+            db_path (Optional[str]): The path of the SQLite database of the disk tier.
+                If None, only the memory tier is used. Defaults to None.
+        Attributes:
+            memory_hits (int): The number of lookups served from memory.
+            disk_hits (int): The number of lookups served from disk.
+            misses (int): The number of lookups not found in any tier.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        self.db = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS summaries "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self.db.commit()
+
+    def _is_expired(self, created: float) -> bool:
+        """Returns True if an entry created at `created` is older than the TTL."""
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _put_memory(self, key: str, value: str, created: float):
+        """Inserts an entry in the memory tier and evicts the least recently used ones."""
+        self.memory[key] = (value, created)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Looks up a key in the memory tier, then in the disk tier.
+        Args:
+            key (str): The cache key, see `get_cache_key`.
+        Returns:
+            Optional[str]: The cached summary, or None on a miss.
+        """
+        with self._lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if not self._is_expired(entry[1]):
+                    self.memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[0]
+                del self.memory[key]
+
+            if self.db is not None:
+                row = self.db.execute(
+                    "SELECT value, created FROM summaries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if not self._is_expired(row[1]):
+                        self._put_memory(key, row[0], row[1])
+                        self.disk_hits += 1
+                        return row[0]
+                    self.db.execute("DELETE FROM summaries WHERE key = ?", (key,))
+                    self.db.commit()
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: str):
+        """
+        Stores a summary in every tier.
+        Args:
+            key (str): The cache key, see `get_cache_key`.
+            value (str): The generated summary.
+        """
+        created = time.time()
+        with self._lock:
+            self._put_memory(key, value, created)
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO summaries (key, value, created) VALUES (?, ?, ?)",
+                    (key, value, created),
+                )
+                self.db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the hit/miss counters and the current size of the memory tier."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "memory_entries": len(self.memory),
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
@@ -1,58 +1,387 @@
 """functions for reading and writing files in various formats."""
 
 import os
-from typing import List, Dict
+import gzip
+import itertools
+import tempfile
+from typing import List, Dict, Iterable, Iterator, Optional
 import json
 import random
 import pandas as pd
 
+try:
+    import orjson
 
-def read_file(path: str, print_log: bool = False) -> pd.DataFrame:
-    """Reads a file and returns a pandas DataFrame."""
+    def json_dumps(obj) -> bytes:
+        """Serializes an object to UTF-8 JSON bytes."""
+        return orjson.dumps(obj, default=str)
+
+    json_loads = orjson.loads
+except ImportError:
+    def json_dumps(obj) -> bytes:
+        """Serializes an object to UTF-8 JSON bytes."""
+        return json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8")
+
+    json_loads = json.loads
+
+
+# the header line of a compact JSON lines file holds the fields shared by its records,
+# and every compact record names its group of shared fields with `SHARED_REF_KEY`
+SHARED_KEY = "__shared__"
+SHARED_REF_KEY = "__shared_ref__"
+
+# file extension of every supported table format
+FILE_FORMATS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+# zstd compresses long article text well and decompresses fast, Arrow files are
+# kept uncompressed by default so that they can be memory-mapped without a copy
+DEFAULT_COMPRESSION = {"csv": None, "parquet": "zstd", "arrow": None}
+
+
+def get_file_format(path: str) -> str:
+    """Returns the table format of a file from its extension, CSV by default."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".parquet", ".pq"):
+        return "parquet"
+    if extension in (".arrow", ".feather", ".ipc"):
+        return "arrow"
+    return "csv"
+
+def read_file(path: str, print_log: bool = False, memory_map: bool = False) -> pd.DataFrame:
+    """
+    Reads a CSV, Parquet or Arrow IPC file and returns a pandas DataFrame.
+    With `memory_map=True` an uncompressed Arrow file is read without copying it
+    into memory first, the pages are loaded by the OS when they are accessed.
+    """
     if print_log:
         print(f"[INFO] Reading file {path}...")
     df = None
     if path:
-        df = pd.read_csv(path)
+        file_format = get_file_format(path)
+        if file_format == "parquet":
+            df = pd.read_parquet(path, memory_map=memory_map)
+        elif file_format == "arrow":
+            # imported here so that pyarrow is only needed for the Arrow format
+            import pyarrow as pa  # pylint: disable=import-outside-toplevel
+            source = pa.memory_map(path, "r") if memory_map else pa.OSFile(path, "rb")
+            with source:
+                df = pa.ipc.open_file(source).read_pandas()
+        else:
+            df = pd.read_csv(path)
     return df
 
-def save_to_file(save_dir, save_file_name: str, df: pd.DataFrame, print_log: bool = True):
-    """Saves a pandas DataFrame to a CSV file in the 'data/processed' directory."""
+def read_file_chunks(path: str, chunksize: int = 10000, print_log: bool = False) -> Iterator[pd.DataFrame]:
+    """Reads a CSV, Parquet or Arrow IPC file lazily and yields DataFrames of at most `chunksize` rows."""
+    if print_log:
+        print(f"[INFO] Reading file {path} in chunks of {chunksize} rows...")
+    file_format = get_file_format(path)
+    if file_format == "csv":
+        with pd.read_csv(path, chunksize=chunksize) as reader:
+            yield from reader
+        return
+
+    import pyarrow as pa  # pylint: disable=import-outside-toplevel
+    import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+    if file_format == "parquet":
+        batches = pq.ParquetFile(path).iter_batches(batch_size=chunksize)
+        yield from (batch.to_pandas() for batch in batches)
+        return
+    with pa.memory_map(path, "r") as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            for offset in range(0, batch.num_rows, chunksize):
+                yield batch.slice(offset, chunksize).to_pandas()
+
+
+class TableWriter:
+    """
+    Writes a DataFrame one chunk at a time to a CSV, Parquet or Arrow IPC file.
+    The schema of the columnar formats is taken from the first non-empty chunk, since
+    the object columns of an empty chunk have no type.
+    """
+
+    def __init__(self, path: str, file_format: str = "", compression: str = "default") -> None:
+        """
+        Initializes the writer, the file is created by the first `write` call.
+        Args:
+            path (str): The path of the output file.
+            file_format (str, optional): "csv", "parquet" or "arrow". Defaults to the
+                format of the file extension.
+            compression (str, optional): The compression codec of the columnar formats,
+                e.g. "zstd", "lz4" or None. Defaults to `DEFAULT_COMPRESSION`.
+        """
+        self.path = path
+        self.file_format = file_format or get_file_format(path)
+        if self.file_format not in FILE_FORMATS:
+            raise ValueError(f"Unknown file format {self.file_format}, expected one of {tuple(FILE_FORMATS)}")
+        self.compression = DEFAULT_COMPRESSION[self.file_format] if compression == "default" else compression
+        self.writer = None
+        self.schema = None
+        self.empty_table = None
+        self.num_rows = 0
+
+    def write(self, df: pd.DataFrame):
+        """Appends the rows of a DataFrame to the file."""
+        if self.file_format == "csv":
+            df.to_csv(path_or_buf=self.path, mode='a' if self.num_rows else 'w', header=not self.num_rows)
+            self.num_rows += len(df)
+            return
+
+        import pyarrow as pa  # pylint: disable=import-outside-toplevel
+        table = pa.Table.from_pandas(df)
+        if self.writer is None:
+            if not len(table):
+                # kept to write an empty file if no chunk has rows
+                self.empty_table = table
+                return
+            self.open(table.schema)
+        self.writer.write_table(table.cast(self.schema))
+        self.num_rows += len(df)
+
+    def open(self, schema):
+        """Creates the columnar file with the given `pyarrow.Schema`."""
+        import pyarrow as pa  # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+        self.schema = schema
+        if self.file_format == "parquet":
+            self.writer = pq.ParquetWriter(self.path, schema, compression=self.compression or "none")
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=self.compression)
+            self.writer = pa.ipc.new_file(self.path, schema, options=options)
+
+    def close(self):
+        """Closes the file, created empty if every chunk was empty."""
+        if self.writer is None and self.empty_table is not None:
+            self.open(self.empty_table.schema)
+            self.writer.write_table(self.empty_table)
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def get_save_path(save_file_name: str, file_format: str = "csv") -> str:
+    """Returns the path of a processed file in the 'Data/processed' directory."""
+    return os.path.join('Data', 'processed', f"{save_file_name}{FILE_FORMATS[file_format]}")
+
+def save_to_file(
+        save_dir, save_file_name: str, df: pd.DataFrame, print_log: bool = True,
+        append: bool = False, file_format: str = "csv", compression: str = "default"
+) -> str:
+    """
+    Saves a pandas DataFrame to a CSV, Parquet or Arrow IPC file in the 'data/processed' directory.
+    With `append=True` the rows are appended to a CSV file without repeating the header,
+    use a `TableWriter` to write the columnar formats one chunk at a time.
+    """
     if print_log:
         print(f"[INFO] Saving DataFrame to file {save_file_name}...")
 
     os.makedirs(os.path.join('Data', save_dir), exist_ok=True)
-    _save_path = os.path.join('Data', 'processed', f"{save_file_name}.csv")
-    df.to_csv(
-        path_or_buf=_save_path
-    )
+    _save_path = get_save_path(save_file_name, file_format)
+    if file_format == "csv":
+        df.to_csv(
+            path_or_buf=_save_path,
+            mode='a' if append else 'w',
+            header=not append,
+        )
+        return _save_path
+
+    if append:
+        raise ValueError(f"Appending is only supported for csv files, use a TableWriter for {file_format}")
+    with TableWriter(_save_path, file_format, compression) as writer:
+        writer.write(df)
+    return _save_path
+
+
+def open_file(path: str, mode: str = "rb"):
+    """
+    Opens a file in binary mode, decompressing or compressing it by extension:
+    ".gz" with gzip and ".zst" with zstandard (if installed).
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    if path.endswith(".zst"):
+        try:
+            import zstandard  # pylint: disable=import-outside-toplevel
+        except ImportError as e:
+            raise ImportError("Reading or writing .zst files requires `pip install zstandard`") from e
+        return zstandard.open(path, mode)
+    return open(path, mode)
+
+
+def expand_record(record: Dict, shared: Dict[str, Dict]) -> Dict:
+    """
+    Returns a compact record with its shared fields filled in.
+    The shared values are referenced, not copied, so expanded records of the
+    same group share one copy of e.g. the output scheme string in memory.
+    Args:
+        record (dict): A record, compact if it has a `SHARED_REF_KEY` key.
+        shared (dict): The shared fields of every group, see `write_json_lines`.
+    Returns:
+        dict: The expanded record, or the record itself if it is not compact or
+        its group is not defined in `shared`.
+    """
+    name = record.get(SHARED_REF_KEY)
+    if not isinstance(name, str) or not isinstance(shared, dict) or not isinstance(shared.get(name), dict):
+        return record
+    expanded = dict(shared[name])
+    expanded.update((key, value) for key, value in record.items() if key != SHARED_REF_KEY)
+    return expanded
+
+
+def iter_json_lines(path: str, expand: bool = True) -> Iterator[Dict]:
+    """
+    Yields the records of a (optionally compressed) JSON lines file one at a time.
+    If the file starts with a `SHARED_KEY` header, the compact records are expanded
+    with their shared fields as they are read, unless `expand` is False.
+    """
+    shared = {}
+    with open_file(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                record = json_loads(line)
+                if SHARED_KEY in record:
+                    shared = record[SHARED_KEY]
+                    continue
+                yield expand_record(record, shared) if expand else record
+
+
+def read_shared_fields(path: str) -> Dict[str, Dict]:
+    """Returns the shared fields of a compact JSON lines file, empty for a regular file."""
+    with open_file(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                return json_loads(line).get(SHARED_KEY, {})
+    return {}
+
 
+def write_json_lines(
+        path: str, records: Iterable[Dict], buffer_size: int = 1000,
+        shared: Optional[Dict[str, Dict]] = None
+) -> int:
+    """
+    Writes records to a (optionally compressed) JSON lines file as they are produced.
+    Args:
+        path (str): The path of the output file, ".gz" or ".zst" to compress it.
+        records (Iterable[Dict]): The records, e.g. a generator.
+        buffer_size (int, optional): The number of lines written at once. Defaults to 1000.
+        shared (Dict[str, Dict], optional): The fields shared by groups of compact records,
+            by group name. They are written once in a header line, and every compact
+            record names its group with the `SHARED_REF_KEY` key. Defaults to None.
+    Returns:
+        int: The number of records written.
+    """
+    count = 0
+    buffer = []
+    with open_file(path, "wb") as f:
+        if shared:
+            f.write(json_dumps({SHARED_KEY: shared}) + b"\n")
+        for record in records:
+            buffer.append(json_dumps(record) + b"\n")
+            if len(buffer) >= buffer_size:
+                f.writelines(buffer)
+                count += len(buffer)
+                buffer = []
+        f.writelines(buffer)
+        count += len(buffer)
+    return count
 
-def save_json_file(save_file_name: str, obj: List[Dict]):
-    """Saves a list of dictionaries to a JSON lines file."""
+
+def write_json_array(path: str, records: Iterable[Dict]) -> int:
+    """Writes records as one JSON array without holding them all in memory, returns their number."""
+    count = 0
+    with open_file(path, "wb") as f:
+        f.write(b"[")
+        for record in records:
+            f.write((b"," if count else b"") + json_dumps(record))
+            count += 1
+        f.write(b"]")
+    return count
+
+
+def reservoir_sample(records: Iterable[Dict], size: int, seed: int = 42) -> List[Dict]:
+    """Returns `size` records chosen uniformly at random from a stream of unknown length."""
+    rng = random.Random(seed)
+    sample = []
+    for i, record in enumerate(records):
+        if i < size:
+            sample.append(record)
+        else:
+            j = rng.randint(0, i)
+            if j < size:
+                sample[j] = record
+    return sample
+
+
+def shuffle_json_lines(
+        records: Iterable[Dict], seed: int = 42, buffer_size: int = 100000,
+        num_buckets: int = 64, tmp_dir: str = None
+) -> Iterator[Dict]:
+    """
+    Shuffles a stream of records with bounded memory.
+    If the stream fits in `buffer_size` records it is shuffled in memory. Otherwise
+    every record is appended to a random temporary bucket file, then the buckets
+    are shuffled one at a time, so only about `len(records) / num_buckets` records
+    are in memory at once.
+    Args:
+        records (Iterable[Dict]): The records, e.g. a generator.
+        seed (int, optional): The seed of the shuffle. Defaults to 42.
+        buffer_size (int, optional): The number of records shuffled in memory. Defaults to 100000.
+        num_buckets (int, optional): The number of temporary files. Defaults to 64.
+        tmp_dir (str, optional): The directory of the temporary files. Defaults to the system one.
+    Yields:
+        dict: The records in a random order.
+    """
+    rng = random.Random(seed)
+    records = iter(records)
+    buffer = list(itertools.islice(records, buffer_size))
+    if len(buffer) < buffer_size:
+        rng.shuffle(buffer)
+        yield from buffer
+        return
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as bucket_dir:
+        paths = [os.path.join(bucket_dir, f"{i}.jsonl") for i in range(num_buckets)]
+        buckets = [open(path, "wb") for path in paths]  # pylint: disable=consider-using-with
+        try:
+            for record in itertools.chain(buffer, records):
+                buckets[rng.randrange(num_buckets)].write(json_dumps(record) + b"\n")
+        finally:
+            for bucket in buckets:
+                bucket.close()
+        del buffer
+
+        for path in paths:
+            bucket = list(iter_json_lines(path))
+            rng.shuffle(bucket)
+            yield from bucket
+
+
+def save_json_file(save_file_name: str, obj: Iterable[Dict], shared: Optional[Dict[str, Dict]] = None) -> str:
+    """
+    Saves a list (or any iterable) of dictionaries to a JSON lines file and returns its path.
+    `shared` holds the fields of compact records, see `write_json_lines`.
+    """
 
     save_dir = os.path.join('Data', 'annotations')
     os.makedirs(save_dir, exist_ok=True)
 
     save_path = os.path.join(save_dir, f"{save_file_name}.jsonl")
 
-    with open(file=save_path, mode='w', encoding='utf-8') as f:
-        for line in obj:
-            json_string = json.dumps(line)
-            f.write(json_string + '\n')
-    print(f"[INFO] Saved to file {save_path}...")
+    count = write_json_lines(save_path, obj, shared=shared)
+    print(f"[INFO] Saved {count} records to file {save_path}...")
+    return save_path
 
 
 def read_json_lines(path: str, shuffle: bool = True):
     """Reads a JSON lines file and returns a list of dictionaries. """
     print(f"\n[INFO] READING JSON line from file {path}...")
-    raw_data = []
-    with open(file=path, mode='r', encoding='utf-8') as f:
-        for line in f.readlines():
-            if line.strip() == "":
-                continue
-
-            raw_data.append(json.loads(line.strip()))
+    raw_data = list(iter_json_lines(path))
     if shuffle:
         random.Random(42).shuffle(raw_data)
     return raw_data
@@ -0,0 +1,204 @@
+"""Generation budgets, stopping criteria for the JSON summary answers and generation timing."""
+
+import math
+import time
+import threading
+from functools import lru_cache
+from typing import List, Optional
+import torch
+from transformers import StoppingCriteria
+from src.pydantic_models.text_summarization import TextSummarization
+
+# tokens of the JSON wrapper around the summary: fences, key, quotes and braces
+JSON_OVERHEAD_TOKENS = 32
+# a conservative lower bound of characters per token for English text
+MIN_CHARS_PER_TOKEN = 2
+
+
+@lru_cache(maxsize=None)
+def get_schema_max_length(field: str = "summarized_text") -> int:
+    """Returns the `max_length` of a `TextSummarization` field in characters, computed once."""
+    return TextSummarization.model_json_schema()["properties"][field]["maxLength"]
+
+
+def get_generation_budget(
+        text_tokens: int, max_summary_chars: int, budget_ratio: float = 0.5,
+        min_new_tokens: int = 64, max_new_tokens: int = 2000
+) -> int:
+    """
+    Computes the number of new tokens allowed for a summary.
+    A summary can neither be longer than the schema allows nor, for a sensible
+    summary, longer than a fraction of the source text, so both bounds are used.
+    Args:
+        text_tokens (int): The number of tokens of the text to be summarized.
+        max_summary_chars (int): The schema `max_length` of the summary.
+        budget_ratio (float, optional): The maximum summary length as a fraction
+            of the text length. Defaults to 0.5.
+        min_new_tokens (int, optional): The smallest budget, for very short texts.
+            Defaults to 64.
+        max_new_tokens (int, optional): The hard upper limit, applied last. Defaults to 2000.
+    Returns:
+        int: The generation budget in tokens.
+    """
+    schema_budget = math.ceil(max_summary_chars / MIN_CHARS_PER_TOKEN) + JSON_OVERHEAD_TOKENS
+    text_budget = math.ceil(text_tokens * budget_ratio) + JSON_OVERHEAD_TOKENS
+    # the hard limit wins over `min_new_tokens`
+    return min(max(min_new_tokens, min(schema_budget, text_budget)), max_new_tokens)
+
+
+class JsonBlockStoppingCriteria(StoppingCriteria):
+    """
+    Stops a sequence as soon as its JSON answer is complete.
+    The prompt ends with an opening ```json fence, so a sequence is complete when
+    the top-level JSON object is closed by a balanced brace, or when a closing
+    ``` fence is produced. Only the newly generated tokens are decoded at every
+    step and the brace depth is tracked incrementally, ignoring braces in strings.
+    """
+
+    def __init__(self, tokenizer, prompt_length: int) -> None:
+        """
+        Initializes the stopping criteria for one `generate` call.
+        Args:
+            tokenizer (AutoTokenizer): The tokenizer used to decode the new tokens.
+            prompt_length (int): The (padded) length of the prompts.
+        """
+        self.tokenizer = tokenizer
+        self.processed = prompt_length
+        self.states: List[dict] = []
+
+    @staticmethod
+    def new_state() -> dict:
+        """Returns the parsing state of a sequence that has not generated anything."""
+        return {
+            "text": "", "depth": 0, "in_string": False, "escape": False,
+            "opened": False, "done": False,
+        }
+
+    @staticmethod
+    def update(state: dict, text: str) -> bool:
+        """
+        Feeds newly generated text to the parsing state of a sequence.
+        Args:
+            state (dict): The state created by `new_state`.
+            text (str): The decoded new tokens.
+        Returns:
+            bool: True if the JSON answer is complete.
+        """
+        if state["done"]:
+            return True
+        start = len(state["text"])
+        state["text"] += text
+
+        for char in text:
+            if state["in_string"]:
+                if state["escape"]:
+                    state["escape"] = False
+                elif char == "\\":
+                    state["escape"] = True
+                elif char == '"':
+                    state["in_string"] = False
+            elif char == '"' and state["opened"]:
+                state["in_string"] = True
+            elif char == "{":
+                state["depth"] += 1
+                state["opened"] = True
+            elif char == "}" and state["opened"]:
+                state["depth"] -= 1
+                if state["depth"] == 0:
+                    state["done"] = True
+                    return True
+
+        if state["opened"]:
+            return False
+
+        # no JSON object yet: a closing fence ends a raw answer, ignoring
+        # a repeated opening ```json at the very beginning
+        body = state["text"].lstrip()
+        if "```json".startswith(body):
+            return False
+        offset = len(state["text"]) - len(body)
+        if body.startswith("```json"):
+            offset += len("```json")
+        if state["text"].find("```", max(offset, start - 2)) != -1:
+            state["done"] = True
+        return state["done"]
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        """Returns, for every sequence of the batch, whether it should stop."""
+        if not self.states:
+            self.states = [self.new_state() for _ in range(input_ids.size(0))]
+
+        new_ids = input_ids[:, self.processed:]
+        self.processed = input_ids.size(-1)
+        texts = self.tokenizer.batch_decode(new_ids, skip_special_tokens=True)
+
+        return torch.tensor(
+            [self.update(state, text) for state, text in zip(self.states, texts)],
+            dtype=torch.bool, device=input_ids.device,
+        )
+
+
+class GenerationTimer(StoppingCriteria):
+    """
+    Records when the tokens of a `generate` call are produced, without ever stopping it.
+    Stopping criteria run right after every decoding step, so the first call marks
+    the first token (the end of the prefill) and the last call the last token.
+    """
+
+    def __init__(self, prompt_length: int) -> None:
+        """
+        Initializes the timer right before the `generate` call.
+        Args:
+            prompt_length (int): The (padded) length of the prompts.
+        """
+        self.prompt_length = prompt_length
+        self.start = time.perf_counter()
+        self.first_token_at = None
+        self.last_token_at = None
+        self.new_tokens = 0
+
+    def get_time_to_first_token(self) -> Optional[float]:
+        """Returns the seconds from the start to the first token, None if nothing was generated."""
+        return self.first_token_at - self.start if self.first_token_at is not None else None
+
+    def get_decode_rate(self, num_tokens: int, batch_size: int = 1) -> Optional[float]:
+        """
+        Returns the decoding speed after the first token, in tokens per second.
+        Args:
+            num_tokens (int): The number of tokens generated for all sequences.
+            batch_size (int, optional): The number of sequences. Defaults to 1.
+        Returns:
+            Optional[float]: The tokens per second, None if there was a single step.
+        """
+        if self.first_token_at is None or self.last_token_at <= self.first_token_at:
+            return None
+        return max(num_tokens - batch_size, 0) / (self.last_token_at - self.first_token_at)
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        """Records the time of the step and never stops a sequence."""
+        self.last_token_at = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = self.last_token_at
+        self.new_tokens = input_ids.size(-1) - self.prompt_length
+        return torch.zeros(input_ids.size(0), dtype=torch.bool, device=input_ids.device)
+
+
+class CancelStoppingCriteria(StoppingCriteria):
+    """
+    Stops every sequence once `cancel` is called, e.g. from another thread when
+    the consumer of a streamed generation goes away.
+    """
+
+    def __init__(self) -> None:
+        """Initializes the criteria, not cancelled."""
+        self.cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """Makes the generation stop after its current decoding step."""
+        self.cancelled.set()
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        """Returns True for every sequence once cancelled."""
+        return torch.full(
+            (input_ids.size(0),), self.cancelled.is_set(), dtype=torch.bool, device=input_ids.device
+        )
@@ -0,0 +1,49 @@
+"""functions for reading the LLaMA-Factory formatted datasets."""
+
+import json
+from typing import List, Dict, Optional
+
+
+def get_instruction_text(instruction: str) -> str:
+    """Extracts the source text from a formatted `instruction` string.
+    The instruction is built by `DataFormatting.format_data` as
+    "# Text:\\n<text>\\n# Task:\\n..." so the text is everything between
+    the two headers.
+    """
+    text = instruction.split("# Text:\n", 1)[-1]
+    return text.split("\n# Task:", 1)[0].strip()
+
+
+def parse_output_summary(output: str) -> Optional[str]:
+    """Returns the summary of a formatted `output` string, or None if it is not valid JSON."""
+    body = output.replace("```json", "").replace("```", "").strip()
+    try:
+        return json.loads(body)["summarized_text"]
+    except (json.JSONDecodeError, KeyError, TypeError):
+        return None
+
+
+def get_output_summary(output: str) -> str:
+    """Extracts the reference summary from a formatted `output` string."""
+    summary = parse_output_summary(output)
+    if summary is None:
+        return output.replace("```json", "").replace("```", "").strip()
+    return summary
+
+
+def read_finetune_records(path: str, limit: int = 0) -> List[Dict]:
+    """Reads a LLaMA-Factory JSON file and returns `{id, text, summary}` records."""
+    print(f"[INFO] Reading records from {path}...")
+    with open(file=path, mode='r', encoding='utf-8') as f:
+        data = json.load(f)
+    if limit:
+        data = data[:limit]
+
+    return [
+        {
+            "id": i,
+            "text": get_instruction_text(rec["instruction"]),
+            "summary": get_output_summary(rec["output"]),
+        }
+        for i, rec in enumerate(data)
+    ]
@@ -0,0 +1,144 @@
+"""Logits processors used to constrain the generation of transformer models."""
+
+import os
+import json
+import hashlib
+from typing import Optional, Sequence, Tuple
+import numpy as np
+import torch
+from transformers import LogitsProcessor
+
+# CJK Unified Ideographs, CJK Extension A and CJK Compatibility Ideographs
+CJK_RANGES = (
+    (0x4E00, 0x9FFF),
+    (0x3400, 0x4DBF),
+    (0xF900, 0xFAFF),
+)
+
+
+# the files that define the vocabulary of a local tokenizer
+TOKENIZER_FILES = ("tokenizer.json", "vocab.json", "merges.txt", "tokenizer.model", "added_tokens.json")
+
+
+def get_tokenizer_hash(tokenizer, banned_ranges: Sequence[Tuple[int, int]], vocab_size: int) -> str:
+    """
+    Returns a hash identifying the tokenizer, the banned ranges and the vocab size.
+    The tokenizer is identified by its name or path and its length, and for a local
+    directory by the size and modification time of its vocabulary files, which is
+    much cheaper than serializing the whole vocabulary at every startup.
+    """
+    key = [tokenizer.name_or_path, len(tokenizer), [list(r) for r in banned_ranges], vocab_size]
+    if os.path.isdir(tokenizer.name_or_path):
+        for name in TOKENIZER_FILES:
+            path = os.path.join(tokenizer.name_or_path, name)
+            if os.path.exists(path):
+                stat = os.stat(path)
+                key.append([name, stat.st_size, stat.st_mtime_ns])
+    return hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()[:16]
+
+
+def build_banned_mask(
+        tokenizer, vocab_size: int, banned_ranges: Sequence[Tuple[int, int]]
+) -> torch.Tensor:
+    """
+    Builds a boolean mask over the vocabulary marking every token that decodes
+    to at least one character inside the banned Unicode ranges.
+    All tokens are decoded with a single `batch_decode` call, then the decoded
+    strings are concatenated and their code points are checked at once with NumPy
+    instead of looping over every character in Python.
+    Args:
+        tokenizer (AutoTokenizer): The tokenizer whose vocabulary is checked.
+        vocab_size (int): The size of the model output layer; ids beyond the
+            tokenizer vocabulary are never banned.
+        banned_ranges (Sequence[Tuple[int, int]]): Inclusive code point ranges to ban.
+    Returns:
+        torch.Tensor: A boolean tensor of shape `(vocab_size,)`.
+    """
+    decoded_tokens = tokenizer.batch_decode(
+        [[token_id] for token_id in range(min(len(tokenizer), vocab_size))],
+        skip_special_tokens=True,
+    )
+
+    code_points = np.frombuffer("".join(decoded_tokens).encode("utf-32-le"), dtype=np.uint32)
+    banned_chars = np.zeros(len(code_points), dtype=bool)
+    for low, high in banned_ranges:
+        banned_chars |= (code_points >= low) & (code_points <= high)
+
+    # number of banned characters inside each token, using the token boundaries
+    # in the concatenated string so that empty tokens are handled correctly
+    lengths = np.fromiter((len(token) for token in decoded_tokens), dtype=np.int64)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    banned_cumsum = np.concatenate([[0], np.cumsum(banned_chars)])
+
+    mask = np.zeros(vocab_size, dtype=bool)
+    mask[:len(decoded_tokens)] = (banned_cumsum[ends] - banned_cumsum[starts]) > 0
+    return torch.from_numpy(mask)
+
+
+class BannedUnicodeLogitsProcessor(LogitsProcessor):
+    """
+    A logits processor that bans every token containing characters from
+    configurable Unicode ranges (by default the CJK ideograph blocks).
+    The mask is computed once when the processor is created and persisted in
+    `cache_dir`, keyed by the tokenizer hash, so later processes load it from disk.
+    """
+
+    def __init__(
+            self, tokenizer, vocab_size: Optional[int] = None,
+            banned_ranges: Optional[Sequence[Tuple[int, int]]] = None,
+            cache_dir: Optional[str] = r"models/cache", print_logs: bool = False
+    ) -> None:
+        """
+        Initializes the processor and builds or loads the banned token mask.
+        Args:
+            tokenizer (AutoTokenizer): The tokenizer of the model to be constrained.
+            vocab_size (Optional[int]): The size of the model output layer.
+                Defaults to the tokenizer length.
+            banned_ranges (Optional[Sequence[Tuple[int, int]]]): Inclusive code point
+                ranges to ban. Defaults to `CJK_RANGES`.
+            cache_dir (Optional[str]): The directory where the mask is persisted.
+                If None, the mask is never written to disk. Defaults to "models/cache".
+            print_logs (bool, optional): Flag to enable or disable logging. Defaults to False.
+        Attributes:
+            mask (torch.Tensor): A boolean tensor, True for every banned token id.
+        """
+        self.banned_ranges = tuple(tuple(r) for r in (banned_ranges or CJK_RANGES))
+        self.vocab_size = vocab_size or len(tokenizer)
+        self.print_logs = print_logs
+        self._device_masks = {}
+
+        cache_path = None
+        if cache_dir:
+            tokenizer_hash = get_tokenizer_hash(tokenizer, self.banned_ranges, self.vocab_size)
+            cache_path = os.path.join(cache_dir, "logits_masks", f"{tokenizer_hash}.pt")
+
+        if cache_path and os.path.exists(cache_path):
+            if self.print_logs:
+                print(f"[INFO] Loading banned token mask from {cache_path}...")
+            self.mask = torch.load(cache_path, weights_only=True)
+        else:
+            if self.print_logs:
+                print("[INFO] Building banned token mask...")
+            self.mask = build_banned_mask(tokenizer, self.vocab_size, self.banned_ranges)
+            if cache_path:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                # written then renamed, so that concurrent workers never load a partial file
+                tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+                torch.save(self.mask, tmp_path)
+                os.replace(tmp_path, cache_path)
+
+    def get_mask(self, device) -> torch.Tensor:
+        """Returns the mask on the given device, copying it there only once."""
+        if device not in self._device_masks:
+            self._device_masks[device] = self.mask.to(device)
+        return self._device_masks[device]
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        """Sets the score of every banned token to -inf."""
+        mask = self.get_mask(scores.device)
+        if mask.size(0) != scores.size(-1):
+            mask = mask[:scores.size(-1)] if mask.size(0) > scores.size(-1) else torch.cat([
+                mask, torch.zeros(scores.size(-1) - mask.size(0), dtype=torch.bool, device=mask.device)
+            ])
+        return scores.masked_fill(mask, -float("inf"))
@@ -0,0 +1,206 @@
+"""Histograms of the request measurements in the Prometheus text format."""
+
+import json
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+METRICS_PREFIX = "summarizer"
+# the request body key of the arrival time, added by `ReceivedAtMiddleware`
+RECEIVED_AT_KEY = "_received_at"
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKENS_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+# name: (help text, buckets, label name or "" for an unlabeled histogram)
+HISTOGRAMS = {
+    "stage_seconds": ("Duration of a stage of a request.", SECONDS_BUCKETS, "stage"),
+    "queue_wait_seconds": ("Time from the arrival of a request to the start of its batch.", SECONDS_BUCKETS, ""),
+    "time_to_first_token_seconds": ("Time from the start of generate to the first token.", SECONDS_BUCKETS, ""),
+    "decode_tokens_per_second": ("Tokens per second after the first token, per generate call.", RATE_BUCKETS, ""),
+    "input_tokens": ("Number of prompt tokens of a request.", TOKENS_BUCKETS, ""),
+    "output_tokens": ("Number of generated tokens of a request.", TOKENS_BUCKETS, ""),
+    "batch_size": ("Number of requests of a predict call, cache hits included.", BATCH_BUCKETS, ""),
+}
+
+
+class Histogram:
+    """A cumulative histogram with fixed upper bounds, as exported to Prometheus."""
+
+    def __init__(self, buckets: Iterable[float]) -> None:
+        """
+        Initializes an empty histogram.
+        Args:
+            buckets (Iterable[float]): The increasing upper bounds, without +Inf.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Adds a value to the first bucket whose upper bound is not smaller."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self) -> dict:
+        """Returns the state of the histogram as a JSON serializable dictionary."""
+        return {"counts": self.counts, "sum": self.sum, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, buckets: Iterable[float], state: dict) -> "Histogram":
+        """Restores a histogram from the state returned by `to_dict`."""
+        histogram = cls(buckets)
+        histogram.counts = list(state["counts"])
+        histogram.sum = state["sum"]
+        histogram.count = state["count"]
+        return histogram
+
+
+class MetricsRegistry:
+    """The histograms of `HISTOGRAMS`, one per metric and label value."""
+
+    def __init__(self) -> None:
+        """Initializes the registry with no observations."""
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+
+    def observe(self, name: str, value: float, label: str = "") -> None:
+        """
+        Adds a value to a histogram.
+        Args:
+            name (str): A key of `HISTOGRAMS`.
+            value (float): The observed value.
+            label (str, optional): The label value of a labeled histogram, e.g. the
+                stage of "stage_seconds". Defaults to "".
+        """
+        key = (name, label)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram(HISTOGRAMS[name][1])
+        self.histograms[key].observe(value)
+
+    def observe_all(self, observations: Iterable[List]) -> None:
+        """Adds a list of `[name, label, value]` observations, as sent by the workers."""
+        for name, label, value in observations:
+            self.observe(name, value, label)
+
+    def to_dict(self) -> dict:
+        """Returns the state of all histograms as a JSON serializable dictionary."""
+        return {
+            f"{name}|{label}": histogram.to_dict()
+            for (name, label), histogram in self.histograms.items()
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "MetricsRegistry":
+        """Restores a registry from the state returned by `to_dict`."""
+        registry = cls()
+        for key, histogram in state.items():
+            name, label = key.split("|", 1)
+            registry.histograms[(name, label)] = Histogram.from_dict(HISTOGRAMS[name][1], histogram)
+        return registry
+
+    def render(self) -> str:
+        """Returns all histograms in the Prometheus text exposition format."""
+        lines = []
+        for name, (help_text, buckets, label_name) in HISTOGRAMS.items():
+            series = sorted(
+                (label, histogram) for (key, label), histogram in self.histograms.items() if key == name
+            )
+            if not series:
+                continue
+            metric = f"{METRICS_PREFIX}_{name}"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for label, histogram in series:
+                labels = f'{label_name}="{label}",' if label_name else ""
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{labels}le="{bound}"}} {cumulative}')
+                labels = f'{{{labels.rstrip(",")}}}' if labels else ""
+                lines.append(f"{metric}_sum{labels} {histogram.sum}")
+                lines.append(f"{metric}_count{labels} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def get_observations(timer, queue_waits: Optional[List[float]] = None) -> List[List]:
+    """
+    Converts the measurements of a `RequestTimer` to `[name, label, value]` observations.
+    Args:
+        timer (RequestTimer): The timer of a request or of a batch of requests.
+        queue_waits (Optional[List[float]]): The queue wait of every request of the batch.
+    Returns:
+        List[List]: The phases as "stage_seconds" and the values under their own name.
+    """
+    observations = [["stage_seconds", stage, elapsed] for stage, elapsed in timer.phases.items()]
+    for name, values in timer.values.items():
+        observations.extend([name, "", value] for value in values)
+    observations.extend(["queue_wait_seconds", "", wait] for wait in queue_waits or [])
+    return observations
+
+
+class ReceivedAtMiddleware:
+    """
+    ASGI middleware that adds the arrival time of a JSON request to its body.
+    LitServe only hands the request body to the inference workers, so this is how
+    a worker knows how long a request waited in the queue before its batch started.
+    """
+
+    def __init__(self, app, paths: Iterable[str] = ("/predict",)) -> None:
+        """
+        Initializes the middleware.
+        Args:
+            app (ASGIApp): The wrapped application.
+            paths (Iterable[str], optional): The paths whose requests are stamped.
+                Defaults to ("/predict",).
+        """
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        """Stamps POST requests to `paths` with `RECEIVED_AT_KEY` and forwards them."""
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        # the wall clock, the API server and the workers are separate processes
+        received_at = time.time()
+        body, more_body = b"", True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                # the client disconnected, let the application handle it
+                await self.app(scope, receive, send)
+                return
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        try:
+            payload = json.loads(body) if body else None
+        except ValueError:
+            payload = None
+        if isinstance(payload, dict):
+            payload[RECEIVED_AT_KEY] = received_at
+            body = json.dumps(payload).encode("utf-8")
+            scope = {
+                **scope,
+                "headers": [
+                    (key, str(len(body)).encode("latin-1") if key == b"content-length" else value)
+                    for key, value in scope["headers"]
+                ],
+            }
+
+        replayed = False
+
+        async def replay():
+            """Returns the (stamped) body once, then the following messages."""
+            nonlocal replayed
+            if replayed:
+                return await receive()
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await self.app(scope, replay, send)
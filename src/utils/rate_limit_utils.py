@@ -0,0 +1,67 @@
+"""Rate limiting and retry helpers of concurrent API clients."""
+
+import time
+import random
+import asyncio
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    An asyncio token bucket.
+    Tokens are added at `rate` per second up to `capacity`, and every request takes
+    one token, so bursts of up to `capacity` requests are allowed while the mean
+    rate stays below `rate` requests per second.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        """
+        Initializes a full bucket.
+        Args:
+            rate (float): The number of tokens added per second, 0 for no limit.
+            capacity (Optional[float]): The maximum number of tokens. Defaults to `rate`
+                (at least 1), i.e. one second of burst.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Waits until a token is available and takes it."""
+        if not self.rate:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                # the lock is held while waiting, so the waiters are served in order
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def get_backoff_delay(
+        attempt: int, base_delay: float = 1.0, max_delay: float = 60.0,
+        retry_after: Optional[float] = None
+) -> float:
+    """
+    Returns the number of seconds to wait before retrying a failed request.
+    The delay grows exponentially with full jitter, so that concurrent clients
+    that failed together do not retry together.
+    Args:
+        attempt (int): The number of failed attempts so far, from 0.
+        base_delay (float, optional): The delay of the first retry. Defaults to 1.0.
+        max_delay (float, optional): The maximum delay. Defaults to 60.0.
+        retry_after (Optional[float]): The delay requested by the server, e.g. the
+            `Retry-After` header of a 429 response, used as a lower bound.
+    Returns:
+        float: The delay in seconds.
+    """
+    delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, max_delay))
+    return delay
@@ -0,0 +1,47 @@
+"""Resolution of Hub model ids to local snapshot directories."""
+
+import os
+
+# the files needed to load a model and its tokenizer, the PyTorch .bin weights are skipped
+SNAPSHOT_PATTERNS = ["*.json", "*.safetensors", "*.txt", "*.model", "*.jinja", "*.tiktoken"]
+
+
+def resolve_snapshot(model_id: str, cache_dir: str = r"models/cache", allow_download: bool = True) -> str:
+    """
+    Returns the local directory of a model, so that it loads without Hub requests.
+    `from_pretrained` with a Hub id checks the Hub for a newer revision of every file,
+    while a local directory is read directly. An already downloaded snapshot is
+    found from the cache alone; otherwise it is downloaded once, safetensors only.
+    Args:
+        model_id (str): A Hub model id or a local directory.
+        cache_dir (str, optional): The Hub cache directory. Defaults to "models/cache".
+        allow_download (bool, optional): If False, a model that is not in the cache
+            raises instead of being downloaded. Defaults to True.
+    Returns:
+        str: The local directory of the model.
+    """
+    if os.path.isdir(model_id):
+        return model_id
+    # imported here, the Hub client is only needed for Hub ids
+    from huggingface_hub import snapshot_download
+    from huggingface_hub.errors import LocalEntryNotFoundError
+
+    try:
+        return snapshot_download(model_id, cache_dir=cache_dir, local_files_only=True)
+    except LocalEntryNotFoundError:
+        if not allow_download:
+            raise
+        print(f"[INFO] Downloading snapshot of {model_id}...")
+        return snapshot_download(model_id, cache_dir=cache_dir, allow_patterns=SNAPSHOT_PATTERNS)
+
+
+def main():
+    """Downloads the snapshot of the base model, e.g. when building the serving image."""
+    model_id = os.getenv("QWEN_ID", "Qwen/Qwen2.5-0.5B-Instruct")
+    print(f"[INFO] Snapshot of {model_id}: {resolve_snapshot(model_id)}")
+
+
+if __name__ == "__main__":
+    main()
+
+# To run this file : python -m src.utils.snapshot_utils
@@ -0,0 +1,117 @@
+"""functions for streaming the generated text."""
+
+import re
+import json
+from typing import Iterable, Iterator
+
+# JSON escape sequences and the characters they stand for
+JSON_ESCAPES = {
+    '"': '"', '\\': '\\', '/': '/',
+    'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t',
+}
+
+
+class JsonFieldStreamExtractor:
+    """
+    Extracts the value of a string field from a JSON object generated chunk by chunk.
+    The model answers with a fenced ```json block, so the field value is only
+    complete once the whole object has been generated. This extractor decodes the
+    value incrementally, returning the new characters as soon as they are produced
+    and waiting only when a chunk ends in the middle of an escape sequence.
+    """
+
+    def __init__(self, field: str = "summarized_text") -> None:
+        """
+        Initializes the extractor.
+        Args:
+            field (str, optional): The name of the string field to extract.
+                Defaults to "summarized_text".
+        Attributes:
+            in_value (bool): True once the opening quote of the value was found.
+            done (bool): True once the closing quote of the value was found.
+        """
+        self.key_pattern = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self.buffer = ""
+        self.pos = 0
+        self.in_value = False
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        """
+        Consumes a chunk of generated text.
+        Args:
+            chunk (str): The newly generated text.
+        Returns:
+            str: The newly decoded characters of the field value, possibly empty.
+        """
+        if self.done:
+            return ""
+        self.buffer += chunk
+
+        if not self.in_value:
+            match = self.key_pattern.search(self.buffer)
+            if not match:
+                return ""
+            self.in_value = True
+            self.pos = match.end()
+
+        buf = self.buffer
+        i = self.pos
+        decoded = []
+        while i < len(buf):
+            char = buf[i]
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            if char != '\\':
+                decoded.append(char)
+                i += 1
+                continue
+
+            # escape sequence, wait for the next chunk if it is incomplete
+            if i + 1 >= len(buf):
+                break
+            if buf[i + 1] != 'u':
+                decoded.append(JSON_ESCAPES.get(buf[i + 1], buf[i + 1]))
+                i += 2
+                continue
+            seq = buf[i:i + 6]
+            if len(seq) < 6:
+                break
+            try:
+                if 0xD800 <= int(seq[2:], 16) <= 0xDBFF:
+                    # high surrogate, the low surrogate must follow
+                    seq = buf[i:i + 12]
+                    if len(seq) < 12:
+                        break
+                decoded.append(json.loads(f'"{seq}"'))
+            except ValueError:
+                decoded.append(seq)
+            i += len(seq)
+
+        self.pos = i
+        return "".join(decoded)
+
+
+def stream_json_field(chunks: Iterable[str], field: str = "summarized_text") -> Iterator[str]:
+    """
+    Yields the value of a JSON string field incrementally from a stream of text chunks.
+    If the stream ends without the field being found, the raw text without the
+    markdown code fences is yielded instead so that no output is lost.
+    Args:
+        chunks (Iterable[str]): The generated text chunks, e.g. from `TransformersModel.create_stream`.
+        field (str, optional): The name of the field to extract. Defaults to "summarized_text".
+    Yields:
+        str: The newly decoded characters of the field value.
+    """
+    extractor = JsonFieldStreamExtractor(field)
+    for chunk in chunks:
+        delta = extractor.feed(chunk)
+        if delta:
+            yield delta
+
+    if not extractor.in_value:
+        raw = extractor.buffer.replace("```json", "").replace("```", "").strip()
+        if raw:
+            yield raw
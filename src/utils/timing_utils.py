@@ -0,0 +1,71 @@
+"""Wall-clock timing of named phases, e.g. of the server startup or of a request."""
+
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, List, Optional
+
+# reusable, so that disabled timing allocates nothing per phase
+NULL_PHASE = nullcontext()
+
+
+class PhaseTimer:
+    """
+    Accumulates the time spent in named phases, in the order they first ran.
+    A phase that runs several times accumulates its durations.
+    """
+
+    def __init__(self) -> None:
+        """Initializes the timer with no phases."""
+        self.phases: Dict[str, float] = {}
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Times the code of a `with` block as the phase `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def total(self) -> float:
+        """Returns the number of seconds since the timer was created."""
+        return time.perf_counter() - self.start
+
+    def report(self, title: str = "Startup") -> str:
+        """Returns the duration of every phase, the untimed rest and the total as text."""
+        total = self.total()
+        lines = [f"[INFO] {title} phases:"]
+        for name, elapsed in self.phases.items():
+            lines.append(f"  {name:<10} {elapsed:8.2f}s")
+        lines.append(f"  {'other':<10} {max(total - sum(self.phases.values()), 0.0):8.2f}s")
+        lines.append(f"  {'total':<10} {total:8.2f}s")
+        return "\n".join(lines)
+
+
+class RequestTimer(PhaseTimer):
+    """
+    Times the stages of one request, or of one batch of requests, and records
+    its other measurements, e.g. token counts, as lists of values.
+    """
+
+    def __init__(self) -> None:
+        """Initializes the timer with no phases and no values."""
+        super().__init__()
+        self.values: Dict[str, List[float]] = {}
+
+    def record(self, name: str, value: float) -> None:
+        """Appends a value to the measurement `name`."""
+        self.values.setdefault(name, []).append(value)
+
+
+def get_phase(timer: Optional[PhaseTimer], name: str):
+    """
+    Returns the context manager timing the phase `name` of a timer.
+    Args:
+        timer (Optional[PhaseTimer]): The timer, None when timing is disabled.
+        name (str): The name of the phase.
+    Returns:
+        ContextManager: `timer.phase(name)`, or a shared no-op context without a timer.
+    """
+    return timer.phase(name) if timer is not None else NULL_PHASE